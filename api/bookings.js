@@ -1,5 +1,48 @@
+import { createHash } from 'crypto';
 import { loadStore, newDraft } from './utils.js';
 
+const MAX_PAGE_SIZE = 100;
+
+const encodeCursor = (index, bookingId) =>
+  Buffer.from(JSON.stringify([index, bookingId])).toString('base64url');
+
+const decodeCursor = (cursor) => {
+  try {
+    const [index, bookingId] = JSON.parse(Buffer.from(cursor, 'base64url').toString('utf-8'));
+    if (Number.isInteger(index)) return [index, String(bookingId)];
+  } catch (e) {
+    // fall through
+  }
+  return null;
+};
+
+// Same contract as backend/pagination.py: the cursor names the last booking
+// returned, so deleting an earlier one does not skip or repeat items.
+const pageBookings = (bookings, limit, cursor) => {
+  let start = 0;
+  if (cursor) {
+    const [index, bookingId] = decodeCursor(cursor);
+    if (bookings[index] && bookings[index].id === bookingId) {
+      start = index + 1;
+    } else {
+      const at = bookings.findIndex((b) => b.id === bookingId);
+      start = at >= 0 ? at + 1 : Math.min(Math.max(index, 0), bookings.length);
+    }
+  }
+  if (!limit) return [bookings.slice(start), null];
+  const size = Math.max(1, Math.min(limit, MAX_PAGE_SIZE));
+  const page = bookings.slice(start, start + size);
+  const end = start + page.length;
+  if (end >= bookings.length || !page.length) return [page, null];
+  return [page, encodeCursor(end - 1, page[page.length - 1].id || '')];
+};
+
+const etagMatches = (ifNoneMatch, etag) => {
+  if (!ifNoneMatch) return false;
+  const tags = ifNoneMatch.split(',').map((t) => t.trim());
+  return tags.includes('*') || tags.includes(etag) || tags.includes(`W/${etag}`);
+};
+
 export default async function handler(req, res) {
   res.setHeader('Access-Control-Allow-Origin', '*');
   res.setHeader(
@@ -8,8 +51,9 @@ export default async function handler(req, res) {
   );
   res.setHeader(
     'Access-Control-Allow-Headers',
-    'Content-Type,X-Session-Id'
+    'Content-Type,X-Session-Id,If-None-Match'
   );
+  res.setHeader('Access-Control-Expose-Headers', 'ETag');
 
   if (req.method === 'OPTIONS') {
     return res.status(200).json({ ok: true });
@@ -31,5 +75,29 @@ export default async function handler(req, res) {
     history: [],
   };
 
-  return res.status(200).json({ bookings: session.bookings || [] });
+  const limit = req.query.limit ? parseInt(req.query.limit, 10) : null;
+  if (req.query.limit && Number.isNaN(limit)) {
+    return res.status(400).json({ error: 'invalid limit' });
+  }
+  const cursor = req.query.cursor || '';
+  if (cursor && !decodeCursor(cursor)) {
+    return res.status(400).json({ error: 'invalid cursor' });
+  }
+
+  // The /tmp store keeps no version counter, so the tag hashes the bookings
+  // themselves together with the page parameters.
+  const bookings = session.bookings || [];
+  const digest = createHash('sha1')
+    .update(JSON.stringify([bookings, limit || 0, cursor]))
+    .digest('hex')
+    .slice(0, 16);
+  const etag = `"${digest}"`;
+  res.setHeader('ETag', etag);
+  res.setHeader('Cache-Control', 'private, no-cache');
+  if (etagMatches(req.headers['if-none-match'], etag)) {
+    return res.status(304).end();
+  }
+
+  const [page, nextCursor] = pageBookings(bookings, limit, cursor);
+  return res.status(200).json({ bookings: page, next_cursor: nextCursor });
 }
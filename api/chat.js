@@ -19,6 +19,34 @@ const client = new OpenAI({
 
 const REQUIRED_FIELDS = ['service', 'date', 'time', 'location', 'contact'];
 
+// Same bound as the Python backends: the last N turns stay in the session and
+// older ones are folded into history_summary (as backend/history.py does).
+const HISTORY_MAX_TURNS = parseInt(process.env.HISTORY_MAX_TURNS || '20', 10);
+const SUMMARY_TOPICS = 8;
+const TOPIC_CHARS = 80;
+
+const recordTurn = (session, turn) => {
+  session.history = session.history || [];
+  session.history.push(turn);
+  const overflow = session.history.length - Math.max(HISTORY_MAX_TURNS, 1);
+  if (overflow <= 0) return;
+  const dropped = session.history.splice(0, overflow);
+  const summary = session.history_summary || {};
+  const topics = (summary.topics || []).concat(
+    dropped
+      .map((t) => String(t.user || '').split(/\s+/).filter(Boolean).join(' '))
+      .filter(Boolean)
+      .map((t) => (t.length <= TOPIC_CHARS ? t : t.slice(0, TOPIC_CHARS - 3) + '...'))
+  );
+  session.history_summary = {
+    ...summary,
+    topics: topics.slice(-SUMMARY_TOPICS),
+    turns: (summary.turns || 0) + dropped.length,
+    first_at: summary.first_at || dropped[0].at || null,
+    last_at: dropped[dropped.length - 1].at || null,
+  };
+};
+
 const formatBooking = (booking) => {
   if (!booking) return 'No booking found yet.';
   const lines = [];
@@ -441,7 +469,7 @@ const handleChat = (sessionId, body) => {
       })
       .then((resp) => {
         const reply = resp.choices[0].message.content || 'Sorry, I do not have that.';
-        session.history.push({
+        recordTurn(session, {
           at: nowIso(),
           user: userMsg,
           assistant: reply,
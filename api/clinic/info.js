@@ -1,5 +1,12 @@
+import { createHash } from 'crypto';
 import { CLINIC_KB } from '../utils.js';
 
+// The KB is a module constant, so the body and its ETag are built once per
+// function instance.
+const BODY = JSON.stringify({ clinic: CLINIC_KB });
+const ETAG = `"${createHash('sha1').update(BODY).digest('hex').slice(0, 16)}"`;
+const CACHE_CONTROL = `public, max-age=${parseInt(process.env.CLINIC_INFO_MAX_AGE || '300', 10)}`;
+
 export default async function handler(req, res) {
   res.setHeader('Access-Control-Allow-Origin', '*');
   res.setHeader(
@@ -8,8 +15,9 @@ export default async function handler(req, res) {
   );
   res.setHeader(
     'Access-Control-Allow-Headers',
-    'Content-Type'
+    'Content-Type,If-None-Match'
   );
+  res.setHeader('Access-Control-Expose-Headers', 'ETag');
 
   if (req.method === 'OPTIONS') {
     return res.status(200).json({ ok: true });
@@ -19,5 +27,13 @@ export default async function handler(req, res) {
     return res.status(405).json({ error: 'Method not allowed. Use GET.' });
   }
 
-  return res.status(200).json({ clinic: CLINIC_KB });
+  res.setHeader('ETag', ETAG);
+  res.setHeader('Cache-Control', CACHE_CONTROL);
+  const ifNoneMatch = req.headers['if-none-match'] || '';
+  const tags = ifNoneMatch.split(',').map((t) => t.trim());
+  if (tags.includes('*') || tags.includes(ETAG) || tags.includes(`W/${ETAG}`)) {
+    return res.status(304).end();
+  }
+  res.setHeader('Content-Type', 'application/json; charset=utf-8');
+  return res.status(200).send(BODY);
 }
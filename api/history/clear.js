@@ -32,6 +32,7 @@ export default async function handler(req, res) {
 
   // Clear history but keep bookings and draft
   session.history = [];
+  delete session.history_summary;
   store[sessionId] = session;
   saveStore(store);
 
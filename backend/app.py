@@ -1,21 +1,61 @@
 import os
 import json
-import re
-from difflib import SequenceMatcher
+import time
+from contextlib import asynccontextmanager
 from uuid import uuid4
 from datetime import datetime, timezone
 from pathlib import Path
+import httpx
 from fastapi import FastAPI
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from fastapi import Header
 from pydantic import BaseModel
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import AsyncOpenAI
+from session_store import SlotTaken, VersionConflict, open_store
+from kb_provider import KBProvider
+from kb_index import compile_kb
+from fuzzy import best_fuzzy_match
+from intents import classify
+from response_cache import ResponseCache
+from unit_of_work import WRITE_STATS, UnitOfWork, current_unit_of_work, unit_of_work
+from availability import AvailabilityIndex
+from dates import horizon_days, normalize_date, parse_date
+from pagination import InvalidCursor, bookings_etag, etag_matches, page_bookings
+from slots import REQUIRED_FIELDS, extract_slots, extract_time_text, hours_error, is_time_within_hours
+from history import HistoryRollup, record_turn, summary_text
+from session_gc import SessionSweeper
+from metrics import CONTENT_TYPE, REGISTRY, chat_turn, llm_call, mark_branch, observe_store, record_kb_load, record_usage
+from tracing import TraceMiddleware, Tracer, set_session, span, traced
 
 load_dotenv()
-client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
 
-app = FastAPI()
+# One pooled HTTP client for all model calls; keep-alive connections are
+# reused across requests instead of paying a TLS handshake per chat turn.
+http_client = httpx.AsyncClient(
+    limits=httpx.Limits(
+        max_connections=int(os.environ.get("OPENAI_MAX_CONNECTIONS", "200")),
+        max_keepalive_connections=int(os.environ.get("OPENAI_MAX_KEEPALIVE", "50")),
+        keepalive_expiry=30.0,
+    ),
+    timeout=httpx.Timeout(60.0, connect=5.0),
+)
+client = AsyncOpenAI(api_key=os.environ["OPENAI_API_KEY"], http_client=http_client)
+
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    SWEEPER.start()
+    yield
+    await run_in_threadpool(SWEEPER.stop)
+    await client.close()
+    # Finish queued history rollups, then write out anything a group/async
+    # store still holds.
+    await run_in_threadpool(HISTORY.drain)
+    await run_in_threadpool(STORE.close)
+
+app = FastAPI(lifespan=_lifespan)
 
 # Allow frontend (localhost) to call backend
 app.add_middleware(
@@ -24,33 +64,107 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Trace-Id"],
 )
 
+# Every request gets a span tree; the last TRACE_BUFFER_SIZE are kept for
+# /debug/traces and those over TRACE_SLOW_MS are logged in full.
+TRACER = Tracer(
+    buffer_size=int(os.environ.get("TRACE_BUFFER_SIZE", "200")),
+    slow_ms=float(os.environ.get("TRACE_SLOW_MS", "1000")),
+    slow_log=os.environ.get("TRACE_SLOW_LOG") or None,
+)
+# Traces name session ids, which are enough to read a session's bookings.
+TRACE_DEBUG = os.environ.get("TRACE_DEBUG", "").strip().lower() in ("1", "true", "yes")
+app.add_middleware(TraceMiddleware, tracer=TRACER, exclude=("/metrics", "/debug/traces"))
+
 class ChatIn(BaseModel):
     message: str
     session_id: str | None = None
 
-STORE_PATH = Path(__file__).resolve().parent / "booking_store.json"
+STORE_PATH = Path(os.environ.get("BOOKING_STORE_PATH") or Path(__file__).resolve().parent / "booking_store.json")
 KB_PATH = Path(__file__).resolve().parent / "clinic_kb.json"
 
-def _load_store() -> dict:
-    if not STORE_PATH.exists():
-        return {}
-    try:
-        return json.loads(STORE_PATH.read_text(encoding="utf-8"))
-    except Exception:
-        return {}
+STORE = open_store(STORE_PATH)
+
+def _load_session(session_id: str) -> dict:
+    started = time.perf_counter()
+    with span("store.load"):
+        session = STORE.get(session_id)
+    observe_store("load", time.perf_counter() - started, STORE.last_size())
+    return session or {"draft": _new_draft(), "bookings": [], "history": []}
+
+def _save_session(session_id: str, session: dict) -> None:
+    # Conditional on the version we loaded; raises VersionConflict if another
+    # request or worker saved this session in between.
+    started = time.perf_counter()
+    with span("store.save"):
+        STORE.put(session_id, session, expected_version=session.get("version", 0))
+    observe_store("save", time.perf_counter() - started, STORE.last_size())
+
+# Store engines do blocking file/db I/O; keep it off the event loop.
+async def _load_session_async(session_id: str) -> dict:
+    return await run_in_threadpool(_load_session, session_id)
+
+async def _save_session_async(session_id: str, session: dict) -> None:
+    # Inside a chat turn this only marks the session; the turn flushes once.
+    uow = current_unit_of_work()
+    if uow is not None:
+        uow.mark(session_id, session)
+        return
+    await run_in_threadpool(_save_session, session_id, session)
+
+KB = KBProvider(KB_PATH)
+REGISTRY.add_collector("kb_file_loads_total", "counter", "Clinic KB file parses.", lambda: KB.loads)
+# Browsers reuse /clinic/info for max-age seconds, then revalidate with the
+# ETag, so a KB edit shows up within that window.
+CLINIC_INFO_CACHE_CONTROL = f"public, max-age={int(os.environ.get('CLINIC_INFO_MAX_AGE', '300'))}"
+
+RESPONSE_CACHE = ResponseCache(
+    max_entries=int(os.environ.get("RESPONSE_CACHE_SIZE", "512")),
+    ttl=float(os.environ.get("RESPONSE_CACHE_TTL", "3600")),
+    disk_path=os.environ.get("RESPONSE_CACHE_DISK") or None,
+)
 
-def _save_store(store: dict) -> None:
-    STORE_PATH.write_text(json.dumps(store, indent=2, ensure_ascii=True), encoding="utf-8")
+# Slot occupancy across every session, kept current by the store's change feed.
+AVAILABILITY = AvailabilityIndex(KB.snapshot())
+_initial_sessions = STORE.load_all()
+AVAILABILITY.rebuild(_initial_sessions)
+STORE.add_listener(AVAILABILITY.sync_session)
+# The index only sees this worker; the store makes each claim stick.
+STORE.set_claims(AVAILABILITY.claim_keys)
+
+# Sessions keep the last HISTORY_MAX_TURNS turns; older ones are folded into
+# a summary (and optionally archived) off the request path.
+HISTORY_MAX_TURNS = int(os.environ.get("HISTORY_MAX_TURNS", "20"))
+HISTORY = HistoryRollup(
+    STORE,
+    archive_dir=os.environ.get("HISTORY_ARCHIVE_DIR") or None,
+    batch=int(os.environ.get("HISTORY_ROLLUP_BATCH", "10")),
+)
+STORE.add_listener(HISTORY.on_change)
+
+# Sessions without bookings expire after SESSION_DRAFT_TTL (booking in
+# progress) or SESSION_EMPTY_TTL (chat only) seconds idle; 0 disables.
+SWEEPER = SessionSweeper(
+    STORE,
+    draft_ttl=float(os.environ.get("SESSION_DRAFT_TTL", str(7 * 24 * 3600))),
+    empty_ttl=float(os.environ.get("SESSION_EMPTY_TTL", str(24 * 3600))),
+    batch=int(os.environ.get("SESSION_GC_BATCH", "100")),
+    interval=float(os.environ.get("SESSION_GC_INTERVAL", "60")),
+    on_evict=HISTORY.forget,
+)
+SWEEPER.seed(_initial_sessions)
+STORE.add_listener(SWEEPER.on_change)
+del _initial_sessions
+
+def _record_turn(session: dict, user_msg: str, reply: str) -> None:
+    record_turn(session, {"at": _now_iso(), "user": user_msg, "assistant": reply}, HISTORY_MAX_TURNS)
 
 def _load_kb() -> dict:
-    if not KB_PATH.exists():
-        return {}
-    try:
-        return json.loads(KB_PATH.read_text(encoding="utf-8"))
-    except Exception:
-        return {}
+    record_kb_load()
+    with span("kb.load"):
+        return KB.snapshot()
 
 def _now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
@@ -70,7 +184,6 @@ def _format_booking(booking: dict) -> str:
         lines.append(f"**status:** {status}")
     return "\n".join(lines)
 
-REQUIRED_FIELDS = ["service", "date", "time", "location", "contact"]
 
 def _new_draft() -> dict:
     return {
@@ -91,25 +204,39 @@ def _missing_fields(draft: dict) -> list:
     details = draft.get("details") or {}
     return [f for f in REQUIRED_FIELDS if not str(details.get(f, "")).strip()]
 
-def _question_for(field: str, kb: dict) -> str:
+def _question_for(field: str, kb: dict, details: dict | None = None) -> str:
     if field == "service":
-        services = [s.get("name") for s in (kb.get("services") or []) if s.get("name")]
+        services = compile_kb(kb).service_names
         if services:
             return "What service would you like to book? Options: " + ", ".join(services)
         return "What service would you like to book?"
     if field == "location":
-        locations = [l.get("name") for l in (kb.get("locations") or []) if l.get("name")]
+        locations = compile_kb(kb).location_names
         if locations:
             return "Which location do you prefer? Options: " + ", ".join(locations)
         return "Which location do you prefer?"
     if field == "date":
-        return "What date would you like? (e.g., 21 Dec)"
+        return "What date would you like? (e.g., tomorrow, next Tue or 21 Dec)"
     if field == "time":
+        offers = _time_offers(details or {}, kb)
+        if offers:
+            return "What time works for you? Free slots: " + ", ".join(offers)
         return "What time works for you? (e.g., 10:30 AM)"
     if field == "contact":
         return "What contact should we use? (name and phone/email)"
     return "Please provide " + field + "."
 
+# Offer times once the date is known, so the user picks one that fits
+# instead of being told afterwards that it doesn't.
+def _time_offers(details: dict, kb: dict) -> list[str]:
+    day = parse_date(str(details.get("date") or ""))
+    if day is None:
+        return []
+    AVAILABILITY.set_kb(kb)
+    location = details.get("location")
+    locations = [location] if location else compile_kb(kb).location_names
+    return AVAILABILITY.suggest(details.get("service") or "", locations, day)
+
 def _kb_summary(kb: dict) -> str:
     services = kb.get("services") or []
     locations = kb.get("locations") or []
@@ -151,107 +278,38 @@ def _service_options(kb: dict) -> str:
         return ""
     return " Available services: " + ", ".join(services)
 
-def _is_info_request(text: str) -> bool:
-    return re.search(r"\b(services|service list|opening hours|hours|locations|price|pricing|clinic info|clinic information)\b", text.lower()) is not None
-
-def _is_booking_related(text: str) -> bool:
-    return re.search(r"\b(book|booking|appointment|schedule|reschedule|cancel|change|edit)\b", text.lower()) is not None
-
-def _is_confirm_intent(text: str) -> bool:
-    return re.search(r"\b(confirm|confirmed|yes|okay|ok|sure)\b", text.lower()) is not None
-
+@traced("match.service")
 def _find_service(name: str, kb: dict) -> str | None:
-    name = name.strip().lower()
-    for s in kb.get("services") or []:
-        n = (s.get("name") or "").strip()
-        if n.lower() == name:
-            return n
-    return None
+    return compile_kb(kb).find_service(name)
 
 def _best_fuzzy_match(value: str, options: list[str], threshold: float = 0.78) -> str | None:
-    best = None
-    best_score = 0.0
-    for opt in options:
-        score = SequenceMatcher(None, value.lower(), opt.lower()).ratio()
-        if score > best_score:
-            best_score = score
-            best = opt
-    if best_score >= threshold:
-        return best
-    return None
-
-def _extract_service_from_text(text: str, kb: dict) -> str | None:
-    t = text.lower()
-    services = [s.get("name") for s in (kb.get("services") or []) if s.get("name")]
-    for n in services:
-        if n and n.lower() in t:
-            return n
-    return _best_fuzzy_match(text, services)
+    return best_fuzzy_match(value, options, threshold)
 
+@traced("match.location")
 def _find_location(name: str, kb: dict) -> str | None:
-    name = name.strip().lower()
-    for l in kb.get("locations") or []:
-        n = (l.get("name") or "").strip()
-        if n.lower() == name:
-            return n
-    return None
+    return compile_kb(kb).find_location(name)
 
+@traced("match.fuzzy_service")
 def _fuzzy_service(value: str, kb: dict) -> str | None:
-    services = [s.get("name") for s in (kb.get("services") or []) if s.get("name")]
-    return _best_fuzzy_match(value, services)
+    return _best_fuzzy_match(value, compile_kb(kb).service_names)
 
+@traced("match.fuzzy_location")
 def _fuzzy_location(value: str, kb: dict) -> str | None:
-    locations = [l.get("name") for l in (kb.get("locations") or []) if l.get("name")]
-    return _best_fuzzy_match(value, locations)
-
-def _valid_time(value: str) -> bool:
-    v = value.strip().lower()
-    return re.search(r"\b([01]?\d|2[0-3]):[0-5]\d\b", v) is not None or re.search(r"\b\d{1,2}(:\d{2})?\s*(am|pm)\b", v) is not None
-
-def _valid_date(value: str) -> bool:
-    v = value.strip().lower()
-    return re.search(r"\b\d{4}-\d{2}-\d{2}\b", v) is not None or re.search(r"\b\d{1,2}\s*[a-z]{3,9}\b", v) is not None
-
-def _parse_time_to_minutes(value: str) -> int | None:
-    v = value.strip().lower()
-    m = re.search(r"\b([01]?\d|2[0-3]):([0-5]\d)\b", v)
-    if m:
-        return int(m.group(1)) * 60 + int(m.group(2))
-    m = re.search(r"\b(\d{1,2})(?::([0-5]\d))?\s*(am|pm)\b", v)
-    if m:
-        hour = int(m.group(1)) % 12
-        minute = int(m.group(2) or 0)
-        if m.group(3) == "pm":
-            hour += 12
-        return hour * 60 + minute
-    return None
-
-def _extract_time_text(value: str) -> str | None:
-    v = value.strip().lower()
-    m = re.search(r"\b([01]?\d|2[0-3]):[0-5]\d\b", v)
-    if m:
-        return m.group(0)
-    m = re.search(r"\b\d{1,2}(:\d{2})?\s*(am|pm)\b", v)
-    if m:
-        return m.group(0)
-    return None
-
-def _is_time_within_hours(time_value: str, location_name: str, kb: dict) -> bool:
-    minutes = _parse_time_to_minutes(time_value)
-    if minutes is None:
-        return False
-    for loc in kb.get("locations") or []:
-        if (loc.get("name") or "").strip().lower() == location_name.strip().lower():
-            hours = loc.get("hours") or {}
-            # Use mon_fri as default window for validation.
-            window = hours.get("mon_fri") or ""
-            m = re.search(r"(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})", window)
-            if not m:
-                return True
-            start = int(m.group(1)) * 60 + int(m.group(2))
-            end = int(m.group(3)) * 60 + int(m.group(4))
-            return start <= minutes <= end
-    return True
+    return _best_fuzzy_match(value, compile_kb(kb).location_names)
+
+# (ISO date, None) for a bookable date, else (None, reply explaining why).
+def _normalize_date(value: str, kb: dict) -> tuple[str | None, str | None]:
+    return normalize_date(value, horizon_days(kb))
+
+# Copy extracted fields the draft doesn't have yet; return the ones added.
+def _merge_slots(draft: dict, slots: dict) -> dict:
+    details = draft.setdefault("details", {})
+    added = {}
+    for field, value in slots.items():
+        if not str(details.get(field, "")).strip():
+            details[field] = value
+            added[field] = value
+    return added
 
 def _finalize_booking(draft: dict, confirmation_summary: str) -> dict:
     booking = {
@@ -265,35 +323,182 @@ def _finalize_booking(draft: dict, confirmation_summary: str) -> dict:
     }
     return booking
 
+@traced("availability.reserve")
+def _reserve_slot(session_id: str, booking: dict) -> str | None:
+    # Catch up on other workers' bookings first; the claim itself is atomic
+    # in this process, and the booking write claims the slot in the store,
+    # raising SlotTaken if another worker got there first.
+    STORE.refresh()
+    AVAILABILITY.set_kb(_load_kb())
+    return AVAILABILITY.reserve(session_id, booking)
+
+def _resync_availability(*session_ids: str) -> None:
+    # After a refused write: drop what the attempt claimed in the index and
+    # learn whichever booking beat it to the slot.
+    for sid in dict.fromkeys(sid for sid in session_ids if sid):
+        AVAILABILITY.sync_session(sid, STORE.get(sid))
+
+async def _book_draft(session_id: str, session: dict, draft: dict, summary: str, user_msg: str) -> dict:
+    booking = _finalize_booking(draft, summary)
+    reason = await run_in_threadpool(_reserve_slot, session_id, booking)
+    if reason:
+        draft["details"]["time"] = ""
+        draft["awaiting_confirmation"] = False
+        draft["confirmation_summary"] = ""
+        draft["last_field"] = "time"
+        draft["updated_at"] = _now_iso()
+        session["draft"] = draft
+        await _save_session_async(session_id, session)
+        return {"reply": f"{reason} " + _question_for("time", _load_kb(), draft["details"]), "session_id": session_id}
+    session["bookings"].append(booking)
+    session["draft"] = _new_draft()
+    _record_turn(session, user_msg, "Successfully booked.")
+    await _save_session_async(session_id, session)
+    return {"reply": "Successfully booked.", "session_id": session_id}
+
+class _FreeChatStream:
+    """Free-chat turn whose model reply is streamed instead of awaited."""
+
+    def __init__(self, session_id: str, session: dict, user_msg: str, messages: list, cache_key: str | None = None):
+        self.session_id = session_id
+        self.session = session
+        self.user_msg = user_msg
+        self.messages = messages
+        self.cache_key = cache_key
+        self.uow = None
+        self.turn = None
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _sse_events(result):
+    if not isinstance(result, _FreeChatStream):
+        yield _sse("done", result)
+        return
+    parts = []
+    try:
+        with llm_call("free_chat_stream"), span("llm.chat", call="free_chat_stream"):
+            stream = await client.chat.completions.create(
+                model="gpt-4o-mini",
+                temperature=0.3,
+                messages=result.messages,
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+            async for chunk in stream:
+                # The usage chunk comes last, with no choices.
+                record_usage("free_chat_stream", getattr(chunk, "usage", None))
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    parts.append(delta)
+                    yield _sse("token", {"delta": delta})
+    except Exception as e:
+        error = str(e)
+    else:
+        error = None
+    # Persist once the full reply is known, together with whatever the
+    # turn marked before streaming started.
+    uow = result.uow or UnitOfWork(STORE)
+    reply = "".join(parts) or "Sorry, I don't have that."
+    if error is None:
+        if result.cache_key and parts:
+            RESPONSE_CACHE.put(result.cache_key, reply)
+        session = result.session
+        _record_turn(session, result.user_msg, reply)
+        uow.mark(result.session_id, session)
+    try:
+        await run_in_threadpool(uow.flush)
+    except (VersionConflict, SlotTaken):
+        error = error or CONFLICT_REPLY
+    if result.turn is not None:
+        result.turn.finish()
+    if error is not None:
+        yield _sse("error", {"error": error, "session_id": result.session_id})
+        return
+    yield _sse("done", {"reply": reply, "session_id": result.session_id})
+
+CHAT_CONFLICT_RETRIES = 3
+CONFLICT_REPLY = "This conversation was just updated somewhere else. Please send that again."
+
+async def _chat_turn_retrying(body: ChatIn, x_session_id: str | None, stream: bool = False):
+    # A conflict means another request saved the same session mid-turn;
+    # replay the turn against the fresh state instead of overwriting it.
+    # Saves during the turn only mark the session, so nothing has been
+    # written when a conflict surfaces at flush time.
+    with chat_turn() as turn:
+        for _ in range(CHAT_CONFLICT_RETRIES):
+            try:
+                with unit_of_work(STORE) as uow, span("chat.attempt"):
+                    result = await _chat_turn(body, x_session_id, stream)
+                if isinstance(result, _FreeChatStream):
+                    # Timed until the stream ends.
+                    result.uow = uow
+                    result.turn = turn
+                    turn.deferred = True
+                else:
+                    await run_in_threadpool(uow.flush)
+                return result
+            except VersionConflict as e:
+                # Drop any slot the failed attempt claimed but never wrote.
+                await run_in_threadpool(_resync_availability, e.session_id)
+                continue
+            except SlotTaken as e:
+                # Another worker booked the slot; the replay finds it taken.
+                await run_in_threadpool(_resync_availability, e.session_id, e.holder)
+                continue
+        mark_branch("conflict")
+        return {"reply": CONFLICT_REPLY, "session_id": body.session_id or x_session_id}
+
 @app.post("/chat")
-def chat(body: ChatIn, x_session_id: str | None = Header(default=None)):
+async def chat(body: ChatIn, x_session_id: str | None = Header(default=None)):
+    return await _chat_turn_retrying(body, x_session_id)
+
+@app.post("/chat/stream")
+async def chat_stream(body: ChatIn, x_session_id: str | None = Header(default=None)):
+    result = await _chat_turn_retrying(body, x_session_id, stream=True)
+    return StreamingResponse(
+        _sse_events(result),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+async def _chat_turn(body: ChatIn, x_session_id: str | None, stream: bool = False):
     user_msg = body.message.strip()
     if not user_msg:
+        mark_branch("empty_message")
         return {"reply": "Please type something."}
 
     session_id = body.session_id or x_session_id or str(uuid4())
-    store = _load_store()
-    session = store.get(session_id) or {"draft": _new_draft(), "bookings": [], "history": []}
+    set_session(session_id)
+    session = await _load_session_async(session_id)
     kb = _load_kb()
+    with span("match.intents"):
+        intents = classify(user_msg)
 
     draft = session.get("draft") or _new_draft()
 
-    # If user mentions a service in free text, capture it (smart inference).
+    # If user mentions a service in free text, capture it (smart inference),
+    # along with any other field the same message settles.
     if not (draft.get("details") or {}).get("service"):
-        kb = _load_kb()
-        inferred = _extract_service_from_text(user_msg, kb)
+        slots = extract_slots(user_msg, kb, AVAILABILITY)
+        inferred = slots.pop("service", None)
         if inferred:
+            mark_branch("service_inference")
+            noted = _merge_slots(draft, slots)
             draft["pending_field"] = "service"
             draft["pending_value"] = inferred
             draft["last_field"] = ""
             session["draft"] = draft
-            store[session_id] = session
-            _save_store(store)
-            return {"reply": f"Did you want to book **{inferred}**? (yes/no)", "session_id": session_id}
+            await _save_session_async(session_id, session)
+            reply = f"Did you want to book **{inferred}**? (yes/no)"
+            if noted:
+                reply += "\nI also noted " + ", ".join(f"{k}: {v}" for k, v in noted.items()) + "."
+            return {"reply": reply, "session_id": session_id}
 
     # Handle per-field confirmation (early)
     if draft.get("pending_field"):
-        if re.search(r"\b(yes|confirm|ok|okay|sure)\b", user_msg.lower()):
+        if "yes" in intents:
+            mark_branch("pending_confirm")
             field = draft["pending_field"]
             value = draft["pending_value"]
             draft["details"][field] = value
@@ -302,40 +507,37 @@ def chat(body: ChatIn, x_session_id: str | None = Header(default=None)):
             draft["updated_at"] = _now_iso()
             draft["missing_fields"] = _missing_fields(draft)
             session["draft"] = draft
-            store[session_id] = session
-            _save_store(store)
+            await _save_session_async(session_id, session)
             # ask next field
             missing = _missing_fields(draft)
             if missing:
                 draft["last_field"] = missing[0]
                 session["draft"] = draft
-                store[session_id] = session
-                _save_store(store)
-                return {"reply": _question_for(missing[0], _load_kb()), "session_id": session_id}
+                await _save_session_async(session_id, session)
+                return {"reply": _question_for(missing[0], kb, draft.get("details")), "session_id": session_id}
             # all fields done -> ask final confirmation
             draft["awaiting_confirmation"] = True
             draft["confirmation_summary"] = _format_booking(draft)
             session["draft"] = draft
-            store[session_id] = session
-            _save_store(store)
+            await _save_session_async(session_id, session)
             return {
                 "reply": "Please confirm your booking details (yes/no):\n" + draft["confirmation_summary"],
                 "session_id": session_id
             }
-        if re.search(r"\b(no|change|edit|wrong)\b", user_msg.lower()):
+        if "no" in intents:
+            mark_branch("pending_reject")
             field = draft["pending_field"]
             draft["pending_field"] = ""
             draft["pending_value"] = ""
             draft["last_field"] = field
             session["draft"] = draft
-            store[session_id] = session
-            _save_store(store)
-            return {"reply": _question_for(field, _load_kb()), "session_id": session_id}
+            await _save_session_async(session_id, session)
+            return {"reply": _question_for(field, kb, draft.get("details")), "session_id": session_id}
 
     # If the assistant asked for a specific field last turn, treat this user reply as the value.
     last_field = (draft.get("last_field") or "").strip()
-    if last_field and not re.search(r"\b(my booking|booking details|booking status|what did i book)\b", user_msg.lower()) and not _is_info_request(user_msg):
-        kb = _load_kb()
+    if last_field and "status" not in intents and "info" not in intents:
+        mark_branch("field_capture")
         value = user_msg.strip()
         # validate + normalize, but don't commit until user confirms
         if last_field == "service":
@@ -347,8 +549,7 @@ def chat(body: ChatIn, x_session_id: str | None = Header(default=None)):
                     draft["pending_value"] = suggestion
                     draft["last_field"] = ""
                     session["draft"] = draft
-                    store[session_id] = session
-                    _save_store(store)
+                    await _save_session_async(session_id, session)
                     return {"reply": f"Did you mean {suggestion}? (yes/no)", "session_id": session_id}
                 return {"reply": "Invalid service. Please re-enter a valid service from the list." + _service_options(kb), "session_id": session_id}
             value = match
@@ -361,22 +562,23 @@ def chat(body: ChatIn, x_session_id: str | None = Header(default=None)):
                     draft["pending_value"] = suggestion
                     draft["last_field"] = ""
                     session["draft"] = draft
-                    store[session_id] = session
-                    _save_store(store)
+                    await _save_session_async(session_id, session)
                     return {"reply": f"Did you mean {suggestion}? (yes/no)", "session_id": session_id}
                 return {"reply": "Invalid location. Please re-enter a valid location from the list.", "session_id": session_id}
             value = match
         elif last_field == "time":
-            time_text = _extract_time_text(value)
+            time_text = extract_time_text(value)
             if not time_text:
                 return {"reply": "Invalid time format. Please re-enter (e.g., 10:30 AM).", "session_id": session_id}
             loc = (draft.get("details") or {}).get("location", "")
-            if loc and not _is_time_within_hours(time_text, loc, kb):
-                return {"reply": "That time is outside the location’s operating hours. Please enter a time within hours.", "session_id": session_id}
+            reason = hours_error(time_text, draft.get("details") or {}, kb, AVAILABILITY) if loc else None
+            if reason:
+                return {"reply": f"{reason} Please enter another time.", "session_id": session_id}
             value = time_text
         elif last_field == "date":
-            if not _valid_date(value):
-                return {"reply": "Invalid date format. Please re-enter (e.g., 21 Dec or 2026-02-10).", "session_id": session_id}
+            value, error = _normalize_date(value, kb)
+            if error:
+                return {"reply": error, "session_id": session_id}
         elif last_field == "contact":
             if len(value) < 3:
                 return {"reply": "Invalid contact. Please re-enter your name and phone/email.", "session_id": session_id}
@@ -386,65 +588,54 @@ def chat(body: ChatIn, x_session_id: str | None = Header(default=None)):
         draft["last_field"] = ""
         draft["updated_at"] = _now_iso()
         session["draft"] = draft
-        store[session_id] = session
-        _save_store(store)
+        await _save_session_async(session_id, session)
         return {"reply": f"Got it. Please confirm {last_field}: {value} (yes/no)", "session_id": session_id}
 
     # Handle confirmation
     if draft.get("awaiting_confirmation"):
         # If user provides a time (e.g., "yes 12pm"), treat it as time edit.
-        time_text = _extract_time_text(user_msg)
+        time_text = extract_time_text(user_msg)
         if time_text:
+            mark_branch("time_edit")
             loc = (draft.get("details") or {}).get("location", "")
-            kb = _load_kb()
-            if loc and not _is_time_within_hours(time_text, loc, kb):
-                return {"reply": "That time is outside the location’s operating hours. Please enter a time within hours.", "session_id": session_id}
+            reason = hours_error(time_text, draft.get("details") or {}, kb, AVAILABILITY) if loc else None
+            if reason:
+                return {"reply": f"{reason} Please enter another time.", "session_id": session_id}
             draft["details"]["time"] = time_text
             draft["awaiting_confirmation"] = False
             draft["confirmation_summary"] = ""
             draft["updated_at"] = _now_iso()
             session["draft"] = draft
-            store[session_id] = session
-            _save_store(store)
+            await _save_session_async(session_id, session)
             return {"reply": "Got it. Updated the time. Please confirm the booking details again.", "session_id": session_id}
 
-        if re.search(r"\b(yes|confirm|looks good|ok|okay|sure|correct)\b", user_msg.lower()):
-            booking = _finalize_booking(draft, draft.get("confirmation_summary") or "")
-            session["bookings"].append(booking)
-            session["draft"] = _new_draft()
-            session["history"].append({"at": _now_iso(), "user": user_msg, "assistant": "Successfully booked."})
-            store[session_id] = session
-            _save_store(store)
-            return {"reply": "Successfully booked.", "session_id": session_id}
-        if re.search(r"\b(no|change|edit|not correct|wrong)\b", user_msg.lower()):
+        if "final_yes" in intents:
+            mark_branch("final_confirm")
+            return await _book_draft(session_id, session, draft, draft.get("confirmation_summary") or "", user_msg)
+        if "final_no" in intents:
+            mark_branch("final_reject")
             draft["awaiting_confirmation"] = False
             draft["confirmation_summary"] = ""
             draft["updated_at"] = _now_iso()
             session["draft"] = draft
-            store[session_id] = session
-            _save_store(store)
+            await _save_session_async(session_id, session)
             return {"reply": "Okay, tell me what you want to change.", "session_id": session_id}
 
     # If user explicitly confirms and draft is complete, finalize immediately
-    if _is_confirm_intent(user_msg):
+    if "confirm" in intents:
+        mark_branch("confirm")
         if not _missing_fields(draft):
-            booking = _finalize_booking(draft, _format_booking(draft))
-            session["bookings"].append(booking)
-            session["draft"] = _new_draft()
-            session["history"].append({"at": _now_iso(), "user": user_msg, "assistant": "Successfully booked."})
-            store[session_id] = session
-            _save_store(store)
-            return {"reply": "Successfully booked.", "session_id": session_id}
+            return await _book_draft(session_id, session, draft, _format_booking(draft), user_msg)
         else:
             missing = _missing_fields(draft)
             draft["last_field"] = missing[0]
             session["draft"] = draft
-            store[session_id] = session
-            _save_store(store)
-            return {"reply": _question_for(missing[0], _load_kb()), "session_id": session_id}
+            await _save_session_async(session_id, session)
+            return {"reply": _question_for(missing[0], kb, draft.get("details")), "session_id": session_id}
 
     # Quick status lookup without calling the model
-    if re.search(r"\b(my booking|booking details|booking status|what did i book)\b", user_msg.lower()):
+    if "status" in intents:
+        mark_branch("status")
         bookings = session.get("bookings") or []
         if not bookings:
             return {"reply": "No bookings yet. Want to make one?", "session_id": session_id}
@@ -453,44 +644,67 @@ def chat(body: ChatIn, x_session_id: str | None = Header(default=None)):
         return {"reply": summary, "session_id": session_id}
 
     # Clinic info lookup
-    if _is_info_request(user_msg):
+    if "info" in intents:
+        mark_branch("info")
         info = _kb_summary(kb)
         return {"reply": info, "session_id": session_id}
 
     # Free chat: not about booking flow or clinic info
-    if not _is_booking_related(user_msg) and not draft.get("last_field") and not draft.get("awaiting_confirmation") and not _is_confirm_intent(user_msg):
+    if "booking" not in intents and not draft.get("last_field") and not draft.get("awaiting_confirmation") and "confirm" not in intents:
+        mark_branch("free_chat")
         free_prompt = (
             "You are a friendly, conversational assistant. "
             "Answer the user's question in a warm, natural tone. "
             "If they ask about the clinic or booking data, use the provided JSON.\n"
             "Keep responses short and helpful, and ask one follow-up question when it makes sense."
         )
-        resp = client.chat.completions.create(
-            model="gpt-4o-mini",
-            temperature=0.3,
-            messages=[
-                {"role": "system", "content": free_prompt},
-                {"role": "user", "content": json.dumps({
-                    "user_message": user_msg,
-                    "clinic_kb": kb,
-                    "current_booking": draft,
-                    "bookings_count": len(session.get("bookings") or [])
-                })}
-            ]
-        )
+        # Only general questions are cached; answers about a booking in
+        # progress depend on the draft. The prompt carries the session's
+        # booking count, so the cache is shared only between sessions with
+        # the same count.
+        bookings_count = len(session.get("bookings") or [])
+        cache_key = None
+        if not draft.get("details"):
+            cache_key = ResponseCache.key(user_msg, kb.version, bookings_count)
+            cached = RESPONSE_CACHE.get(cache_key)
+            if cached is not None:
+                mark_branch("free_chat_cached")
+                _record_turn(session, user_msg, cached)
+                await _save_session_async(session_id, session)
+                return {"reply": cached, "session_id": session_id}
+        messages = [
+            {"role": "system", "content": free_prompt},
+            {"role": "user", "content": json.dumps({
+                "user_message": user_msg,
+                "clinic_kb": kb,
+                "current_booking": draft,
+                "bookings_count": bookings_count
+            })}
+        ]
+        if stream:
+            mark_branch("free_chat_stream")
+            return _FreeChatStream(session_id, session, user_msg, messages, cache_key)
+        with llm_call("free_chat"), span("llm.chat", call="free_chat"):
+            resp = await client.chat.completions.create(
+                model="gpt-4o-mini",
+                temperature=0.3,
+                messages=messages
+            )
+        record_usage("free_chat", resp.usage)
         reply = resp.choices[0].message.content or "Sorry, I don't have that."
-        session["history"].append({"at": _now_iso(), "user": user_msg, "assistant": reply})
-        store[session_id] = session
-        _save_store(store)
+        if cache_key and resp.choices[0].message.content:
+            RESPONSE_CACHE.put(cache_key, reply)
+        _record_turn(session, user_msg, reply)
+        await _save_session_async(session_id, session)
         return {"reply": reply, "session_id": session_id}
 
     # If all required fields are present, ask for confirmation (server-side)
     if not _missing_fields(draft) and not draft.get("awaiting_confirmation"):
+        mark_branch("confirm_prompt")
         draft["awaiting_confirmation"] = True
         draft["confirmation_summary"] = _format_booking(draft)
         session["draft"] = draft
-        store[session_id] = session
-        _save_store(store)
+        await _save_session_async(session_id, session)
         return {
             "reply": "Please confirm your booking details (yes/no):\n" + draft["confirmation_summary"],
             "session_id": session_id
@@ -501,11 +715,34 @@ def chat(body: ChatIn, x_session_id: str | None = Header(default=None)):
         missing = _missing_fields(draft)
         draft["missing_fields"] = missing
         if missing:
+            mark_branch("next_question")
             draft["last_field"] = missing[0]
             session["draft"] = draft
-            store[session_id] = session
-            _save_store(store)
-            return {"reply": _question_for(missing[0], _load_kb()), "session_id": session_id}
+            await _save_session_async(session_id, session)
+            return {"reply": _question_for(missing[0], kb, draft.get("details")), "session_id": session_id}
+
+    # Take whatever the message settles locally and ask for the rest with the
+    # per-field questions; the model is only needed when nothing parses.
+    slots = extract_slots(user_msg, kb, AVAILABILITY)
+    if slots:
+        mark_branch("slot_capture")
+        _merge_slots(draft, slots)
+        draft["updated_at"] = _now_iso()
+        missing = _missing_fields(draft)
+        draft["missing_fields"] = missing
+        if missing:
+            draft["last_field"] = missing[0]
+            session["draft"] = draft
+            await _save_session_async(session_id, session)
+            return {"reply": "Got it. " + _question_for(missing[0], kb, draft.get("details")), "session_id": session_id}
+        draft["awaiting_confirmation"] = True
+        draft["confirmation_summary"] = _format_booking(draft)
+        session["draft"] = draft
+        await _save_session_async(session_id, session)
+        return {
+            "reply": "Please confirm your booking details (yes/no):\n" + draft["confirmation_summary"],
+            "session_id": session_id
+        }
 
     system_prompt = (
         "You are a professional booking assistant for APPOINTMENTS ONLY. "
@@ -539,20 +776,24 @@ def chat(body: ChatIn, x_session_id: str | None = Header(default=None)):
         "- Be conversational, friendly, and helpful."
     )
 
-    resp = client.chat.completions.create(
-        model="gpt-4o-mini",
-        temperature=0.2,
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": json.dumps({
-                "user_message": user_msg,
-                "current_booking": draft,
-                "completed_bookings_count": len(session.get("bookings") or []),
-                "recent_history": session.get("history")[-6:],
-                "clinic_kb": kb
-            })}
-        ]
-    )
+    mark_branch("llm_collect")
+    with llm_call("collect"), span("llm.chat", call="collect"):
+        resp = await client.chat.completions.create(
+            model="gpt-4o-mini",
+            temperature=0.2,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": json.dumps({
+                    "user_message": user_msg,
+                    "current_booking": draft,
+                    "completed_bookings_count": len(session.get("bookings") or []),
+                    "recent_history": session.get("history")[-6:],
+                    "earlier_conversation": summary_text(session),
+                    "clinic_kb": kb
+                })}
+            ]
+        )
+    record_usage("collect", resp.usage)
     raw = resp.choices[0].message.content or ""
 
     try:
@@ -573,7 +814,6 @@ def chat(body: ChatIn, x_session_id: str | None = Header(default=None)):
             draft["booking_type"] = parsed["booking_type"]
         details = parsed.get("details") or {}
         # Validate model-suggested details before accepting
-        kb = _load_kb()
         for k, v in details.items():
             if k == "service":
                 match = _find_service(str(v), kb)
@@ -583,8 +823,7 @@ def chat(body: ChatIn, x_session_id: str | None = Header(default=None)):
                         draft["pending_field"] = "service"
                         draft["pending_value"] = suggestion
                         session["draft"] = draft
-                        store[session_id] = session
-                        _save_store(store)
+                        await _save_session_async(session_id, session)
                         return {"reply": f"Did you mean {suggestion}? (yes/no)", "session_id": session_id}
                     return {"reply": "Invalid service. Please re-enter a valid service from the list." + _service_options(kb), "session_id": session_id}
                 draft["details"][k] = match
@@ -596,23 +835,24 @@ def chat(body: ChatIn, x_session_id: str | None = Header(default=None)):
                         draft["pending_field"] = "location"
                         draft["pending_value"] = suggestion
                         session["draft"] = draft
-                        store[session_id] = session
-                        _save_store(store)
+                        await _save_session_async(session_id, session)
                         return {"reply": f"Did you mean {suggestion}? (yes/no)", "session_id": session_id}
                     return {"reply": "Invalid location. Please re-enter a valid location from the list.", "session_id": session_id}
                 draft["details"][k] = match
             elif k == "time":
-                time_text = _extract_time_text(str(v))
+                time_text = extract_time_text(str(v))
                 if not time_text:
                     return {"reply": "Invalid time format. Please re-enter (e.g., 10:30 AM).", "session_id": session_id}
                 loc = (draft.get("details") or {}).get("location", "")
-                if loc and not _is_time_within_hours(time_text, loc, kb):
-                    return {"reply": "That time is outside the location’s operating hours. Please enter a time within hours.", "session_id": session_id}
+                reason = hours_error(time_text, draft.get("details") or {}, kb, AVAILABILITY) if loc else None
+                if reason:
+                    return {"reply": f"{reason} Please enter another time.", "session_id": session_id}
                 draft["details"][k] = time_text
             elif k == "date":
-                if not _valid_date(str(v)):
-                    return {"reply": "Invalid date format. Please re-enter (e.g., 21 Dec or 2026-02-10).", "session_id": session_id}
-                draft["details"][k] = str(v).strip()
+                iso, error = _normalize_date(str(v), kb)
+                if error:
+                    return {"reply": error, "session_id": session_id}
+                draft["details"][k] = iso
             elif k == "contact":
                 if len(str(v).strip()) < 3:
                     return {"reply": "Invalid contact. Please re-enter your name and phone/email.", "session_id": session_id}
@@ -628,9 +868,10 @@ def chat(body: ChatIn, x_session_id: str | None = Header(default=None)):
         if parsed.get("is_complete") and not _missing_fields(draft):
             loc = (draft.get("details") or {}).get("location", "")
             time_val = (draft.get("details") or {}).get("time", "")
-            if loc and time_val and not _is_time_within_hours(time_val, loc, _load_kb()):
+            reason = hours_error(time_val, draft.get("details") or {}, kb, AVAILABILITY) if loc and time_val else None
+            if reason:
                 draft["last_field"] = "time"
-                reply = "That time is outside the location’s operating hours. Please enter a time within hours."
+                reply = f"{reason} Please enter another time."
             else:
                 draft["awaiting_confirmation"] = True
                 draft["confirmation_summary"] = parsed.get("confirmation_summary") or ""
@@ -642,108 +883,159 @@ def chat(body: ChatIn, x_session_id: str | None = Header(default=None)):
             missing = _missing_fields(draft)
             if missing:
                 draft["last_field"] = missing[0]
-                reply = _question_for(missing[0], _load_kb())
+                reply = _question_for(missing[0], kb, draft.get("details"))
             else:
                 reply = parsed.get("reply") or "What would you like to book?"
     else:
         reply = parsed.get("reply") or "Want to make a booking?"
 
     session["draft"] = draft
-    session["history"].append({"at": _now_iso(), "user": user_msg, "assistant": reply})
-    store[session_id] = session
-    _save_store(store)
+    _record_turn(session, user_msg, reply)
+    await _save_session_async(session_id, session)
 
     return {"reply": reply, "session_id": session_id}
 
 @app.get("/bookings")
-def list_bookings(session_id: str):
-    store = _load_store()
-    session = store.get(session_id) or {"draft": _new_draft(), "bookings": [], "history": []}
-    return {"bookings": session.get("bookings") or []}
+def list_bookings(
+    session_id: str,
+    limit: int | None = None,
+    cursor: str | None = None,
+    if_none_match: str | None = Header(default=None),
+):
+    # The version is one index lookup; only read and serialise the bookings
+    # when the client's copy is stale.
+    etag = bookings_etag(session_id, STORE.version(session_id), limit, cursor)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    try:
+        page, next_cursor = page_bookings(STORE.list_bookings(session_id), limit, cursor)
+    except InvalidCursor as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    return JSONResponse({"bookings": page, "next_cursor": next_cursor}, headers=headers)
 
 @app.get("/bookings/{booking_id}")
 def get_booking(booking_id: str, session_id: str):
-    store = _load_store()
-    session = store.get(session_id) or {"draft": _new_draft(), "bookings": [], "history": []}
-    for b in session.get("bookings") or []:
-        if b.get("id") == booking_id:
-            return {"booking": b}
+    b = STORE.get_booking(session_id, booking_id)
+    if b:
+        return {"booking": b}
     return {"error": "booking not found"}
 
 @app.patch("/bookings/{booking_id}")
 def update_booking(booking_id: str, session_id: str, body: dict):
-    store = _load_store()
-    session = store.get(session_id)
-    if not session:
-        return {"ok": False, "error": "session not found"}
-    bookings = session.get("bookings") or []
+    # Read, validate and write under the session lock so two edits of the
+    # same booking can't overwrite each other.
+    with STORE.lock(session_id):
+        return _update_booking(booking_id, session_id, body)
+
+def _update_booking(booking_id: str, session_id: str, body: dict):
+    b = STORE.get_booking(session_id, booking_id)
+    if not b:
+        if not STORE.exists(session_id):
+            return {"ok": False, "error": "session not found"}
+        return {"ok": False, "error": "booking not found"}
     kb = _load_kb()
-    for b in bookings:
-        if b.get("id") == booking_id:
-            details = b.get("details") or {}
-            updates = body.get("details") or {}
-            # validate updates
-            if "service" in updates and str(updates["service"]).strip():
-                match = _find_service(str(updates["service"]), kb)
-                if not match:
-                    return {"ok": False, "error": "invalid service"}
-                details["service"] = match
-            if "location" in updates and str(updates["location"]).strip():
-                match = _find_location(str(updates["location"]), kb)
-                if not match:
-                    return {"ok": False, "error": "invalid location"}
-                details["location"] = match
-            if "date" in updates and str(updates["date"]).strip():
-                if not _valid_date(str(updates["date"])):
-                    return {"ok": False, "error": "invalid date"}
-                details["date"] = str(updates["date"]).strip()
-            if "time" in updates and str(updates["time"]).strip():
-                time_text = _extract_time_text(str(updates["time"]))
-                if not time_text:
-                    return {"ok": False, "error": "invalid time"}
-                loc = details.get("location", "")
-                if loc and not _is_time_within_hours(time_text, loc, kb):
-                    return {"ok": False, "error": "time outside hours"}
-                details["time"] = time_text
-            if "contact" in updates and str(updates["contact"]).strip():
-                if len(str(updates["contact"]).strip()) < 3:
-                    return {"ok": False, "error": "invalid contact"}
-                details["contact"] = str(updates["contact"]).strip()
-
-            b["details"] = details
-            b["updated_at"] = _now_iso()
-            store[session_id] = session
-            _save_store(store)
-            return {"ok": True, "booking": b}
-    return {"ok": False, "error": "booking not found"}
+    details = b.get("details") or {}
+    updates = body.get("details") or {}
+    # validate updates
+    if "service" in updates and str(updates["service"]).strip():
+        match = _find_service(str(updates["service"]), kb)
+        if not match:
+            return {"ok": False, "error": "invalid service"}
+        details["service"] = match
+    if "location" in updates and str(updates["location"]).strip():
+        match = _find_location(str(updates["location"]), kb)
+        if not match:
+            return {"ok": False, "error": "invalid location"}
+        details["location"] = match
+    if "date" in updates and str(updates["date"]).strip():
+        iso, error = _normalize_date(str(updates["date"]), kb)
+        if error:
+            if parse_date(str(updates["date"])) is None:
+                return {"ok": False, "error": "invalid date"}
+            return {"ok": False, "error": "date outside booking window"}
+        details["date"] = iso
+    if "time" in updates and str(updates["time"]).strip():
+        time_text = extract_time_text(str(updates["time"]))
+        if not time_text:
+            return {"ok": False, "error": "invalid time"}
+        loc = details.get("location", "")
+        if loc and not is_time_within_hours(time_text, details, kb, AVAILABILITY):
+            return {"ok": False, "error": "time outside hours"}
+        details["time"] = time_text
+    if "contact" in updates and str(updates["contact"]).strip():
+        if len(str(updates["contact"]).strip()) < 3:
+            return {"ok": False, "error": "invalid contact"}
+        details["contact"] = str(updates["contact"]).strip()
+
+    if _reserve_slot(session_id, {**b, "details": details}):
+        return {"ok": False, "error": "slot unavailable"}
+    b["details"] = details
+    b["updated_at"] = _now_iso()
+    try:
+        stored = STORE.put_booking(session_id, b)
+    except SlotTaken as e:
+        _resync_availability(session_id, e.holder)
+        return {"ok": False, "error": "slot unavailable"}
+    if not stored:
+        # The booking went away after the claim; give back what it took.
+        _resync_availability(session_id)
+        return {"ok": False, "error": "booking not found"}
+    return {"ok": True, "booking": b}
 
 @app.delete("/bookings/{booking_id}")
 def delete_booking(booking_id: str, session_id: str):
-    store = _load_store()
-    session = store.get(session_id)
-    if not session:
-        return {"ok": False, "error": "session not found"}
-    bookings = session.get("bookings") or []
-    new_bookings = [b for b in bookings if b.get("id") != booking_id]
-    if len(new_bookings) == len(bookings):
+    if not STORE.delete_booking(session_id, booking_id):
+        if not STORE.exists(session_id):
+            return {"ok": False, "error": "session not found"}
         return {"ok": False, "error": "booking not found"}
-    session["bookings"] = new_bookings
-    store[session_id] = session
-    _save_store(store)
     return {"ok": True}
 
 @app.post("/history/clear")
 def clear_history(session_id: str):
-    store = _load_store()
-    session = store.get(session_id)
-    if not session:
+    if not STORE.clear_history(session_id):
         return {"ok": False, "error": "session not found"}
-    session["history"] = []
-    store[session_id] = session
-    _save_store(store)
+    HISTORY.forget(session_id)
     return {"ok": True}
 
+@app.get("/cache/stats")
+def cache_stats():
+    return {"response_cache": RESPONSE_CACHE.stats()}
+
+@app.get("/store/stats")
+def store_stats():
+    return {
+        "unit_of_work": WRITE_STATS.snapshot(),
+        "store": STORE.stats(),
+        "availability": AVAILABILITY.stats(),
+        "history": HISTORY.stats(),
+        "gc": SWEEPER.stats(),
+        "tracing": TRACER.stats(),
+    }
+
+@app.get("/availability")
+def availability(service: str, location: str | None = None, date_from: str | None = None, date_to: str | None = None):
+    STORE.refresh()
+    AVAILABILITY.set_kb(_load_kb())
+    try:
+        return AVAILABILITY.search(service, location, date_from, date_to)
+    except ValueError as e:
+        return {"error": str(e)}
+
 @app.get("/clinic/info")
-def clinic_info():
-    kb = _load_kb()
-    return {"clinic": kb}
+def clinic_info(if_none_match: str | None = Header(default=None)):
+    body, etag = _load_kb().info_payload()
+    headers = {"ETag": etag, "Cache-Control": CLINIC_INFO_CACHE_CONTROL}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
+
+@app.get("/metrics")
+def metrics():
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+@app.get("/debug/traces")
+def debug_traces(limit: int = 50, min_ms: float = 0.0, session_id: str | None = None):
+    if not TRACE_DEBUG:
+        return JSONResponse({"error": "not found"}, status_code=404)
+    return {"traces": TRACER.recent(max(1, min(limit, 500)), min_ms, session_id), "stats": TRACER.stats()}
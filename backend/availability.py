@@ -0,0 +1,355 @@
+"""Clinic-wide slot occupancy as integer bitmaps.
+
+Every (location, date) pair owns one int whose bit ``i`` means the
+``i``-th slot of the day (``slot_minutes`` long, 15 by default from the
+KB time policy) is taken. A booking of ``duration_minutes`` covers a run
+of bits, so checking it against opening hours and other bookings is two
+AND operations whatever the number of bookings.
+"""
+import re
+import threading
+from datetime import date, datetime, timedelta
+
+from dates import clinic_now, horizon_days, parse_date
+from kb_index import compile_kb, day_type
+
+DEFAULT_SLOT_MINUTES = 15
+DEFAULT_RANGE_DAYS = 7
+TIMES_CACHE_SIZE = 4096
+SLOTS_PER_DAY_MINUTES = 24 * 60
+
+_POLICY_RE = re.compile(r"(\d+)\s*-?\s*minute", re.I)
+_TIME_RE = re.compile(r"\b([01]?\d|2[0-3]):([0-5]\d)\b")
+_AMPM_RE = re.compile(r"\b(\d{1,2})(?::([0-5]\d))?\s*(am|pm)\b", re.I)
+
+
+def slot_minutes(kb: dict) -> int:
+    m = _POLICY_RE.search(kb.get("time_policy") or "")
+    return int(m.group(1)) if m and int(m.group(1)) > 0 else DEFAULT_SLOT_MINUTES
+
+
+def parse_minutes(text: str) -> int | None:
+    m = _TIME_RE.search(text or "")
+    if m:
+        return int(m.group(1)) * 60 + int(m.group(2))
+    m = _AMPM_RE.search(text or "")
+    if m:
+        hour = int(m.group(1)) % 12 + (12 if m.group(3).lower() == "pm" else 0)
+        return hour * 60 + int(m.group(2) or 0)
+    return None
+
+
+def run_mask(start: int, count: int) -> int:
+    return ((1 << count) - 1) << start
+
+
+def run_starts(free: int, count: int) -> int:
+    """Bits ``i`` of ``free`` that begin a run of ``count`` set bits.
+
+    Doubles the checked run length each step, so a 60-minute service in
+    15-minute slots takes two shifts rather than three.
+    """
+    starts, span = free, 1
+    while span < count:
+        step = min(span, count - span)
+        starts &= starts >> step
+        span += step
+    return starts
+
+
+class AvailabilityIndex:
+    """Occupied slots for every location and date, across all sessions.
+
+    Bookings are indexed by id, so create/PATCH/delete only touch the bits
+    of the booking that changed. ``sync_session`` replaces one session's
+    bookings with what the store holds; stores call it through their change
+    listener, and ``reserve`` claims a slot before the booking is written.
+    One appointment per location at a time.
+    """
+
+    def __init__(self, kb: dict):
+        self._lock = threading.RLock()
+        self._occupied: dict[tuple[str, date], int] = {}
+        self._entries: dict[str, tuple[str, tuple[str, date], int, dict]] = {}
+        self._by_session: dict[str, set[str]] = {}
+        self._kb_version = None
+        self.set_kb(kb)
+
+    def set_kb(self, kb: dict) -> None:
+        """Adopt a new KB version: slot size, opening masks, durations."""
+        version = getattr(kb, "version", None)
+        with self._lock:
+            if version is not None and version == self._kb_version:
+                return
+            self._kb = kb
+            self._kb_version = version
+            self.compiled = compile_kb(kb)
+            self.slot = slot_minutes(kb)
+            self.slots_per_day = SLOTS_PER_DAY_MINUTES // self.slot
+            self._labels = tuple(f"{i * self.slot // 60:02d}:{i * self.slot % 60:02d}" for i in range(self.slots_per_day))
+            self._times_cache = {}
+            self._open = {}
+            for loc, windows in self.compiled.hours.items():
+                for day, window in windows.items():
+                    mask = 0
+                    if window:
+                        first = -(-window[0] // self.slot)
+                        last = window[1] // self.slot
+                        if last > first:
+                            mask = run_mask(first, last - first)
+                    self._open[(loc, day)] = mask
+            # Durations may have changed; re-derive every booking's run.
+            entries = list(self._entries.items())
+            self._occupied.clear()
+            self._entries.clear()
+            self._by_session.clear()
+            for booking_id, (session_id, _, _, details) in entries:
+                self._add(session_id, booking_id, details)
+
+    def open_mask(self, location: str, day: date) -> int:
+        return self._open.get((location.strip().casefold(), day_type(day.weekday())), 0)
+
+    def occupied_mask(self, location: str, day: date) -> int:
+        with self._lock:
+            return self._occupied.get((location.strip().casefold(), day), 0)
+
+    def slots_for(self, service: str) -> int:
+        duration = self.compiled.durations.get((service or "").strip().casefold()) or self.slot
+        return -(-duration // self.slot)
+
+    def _locate(self, details: dict, today: date | None = None) -> tuple[tuple[str, date], int] | None:
+        location = (details.get("location") or "").strip().casefold()
+        day = parse_date(str(details.get("date") or ""), today)
+        minutes = parse_minutes(str(details.get("time") or ""))
+        if not location or day is None or minutes is None or minutes % self.slot:
+            return None
+        start = minutes // self.slot
+        count = self.slots_for(details.get("service") or "")
+        if start + count > self.slots_per_day:
+            return None
+        return (location, day), run_mask(start, count)
+
+    def hours_error(self, details: dict, today: date | None = None) -> str | None:
+        """Why ``details`` is off the slot grid or outside opening hours, or None.
+
+        Without a date only the grid can be checked.
+        """
+        minutes = parse_minutes(str(details.get("time") or ""))
+        if minutes is not None and minutes % self.slot:
+            return f"Appointments start every {self.slot} minutes."
+        located = self._locate(details, today)
+        if located is not None:
+            key, mask = located
+            if mask & ~self._open.get((key[0], day_type(key[1].weekday())), 0):
+                return "That slot is outside the location's operating hours."
+        return None
+
+    def check(self, details: dict, ignore: str | None = None, today: date | None = None) -> str | None:
+        """Why ``details`` can't be booked, or None if the slot is free."""
+        reason = self.hours_error(details, today)
+        if reason is not None:
+            return reason
+        located = self._locate(details, today)
+        if located is None:
+            return None
+        key, mask = located
+        with self._lock:
+            taken = self._occupied.get(key, 0)
+            if ignore in self._entries and self._entries[ignore][1] == key:
+                taken &= ~self._entries[ignore][2]
+            if taken & mask:
+                return "That time is already booked."
+        return None
+
+    def reserve(self, session_id: str, booking: dict, today: date | None = None) -> str | None:
+        """Check and claim the booking's slot in one step; returns the reason on failure."""
+        with self._lock:
+            reason = self.check(booking.get("details") or {}, ignore=booking.get("id"), today=today)
+            if reason is None:
+                self._remove(booking.get("id"))
+                self._add(session_id, booking.get("id"), booking.get("details") or {})
+            return reason
+
+    def claim_keys(self, booking: dict) -> list[tuple[str, str, int]]:
+        """``(location, iso_date, minute)`` of every slot ``booking`` holds.
+
+        Passed to ``SessionStore.set_claims`` so the store can refuse to give
+        a slot to two bookings, whichever worker or container writes them.
+        """
+        if (booking.get("status") or "booked") != "booked":
+            return []
+        with self._lock:
+            located = self._locate(booking.get("details") or {})
+            slot = self.slot
+        if located is None:
+            return []
+        (location, day), mask = located
+        return [(location, day.isoformat(), i * slot) for i in range(mask.bit_length()) if mask >> i & 1]
+
+    def _add(self, session_id: str, booking_id: str, details: dict) -> None:
+        located = self._locate(details)
+        if located is None or not booking_id:
+            return
+        key, mask = located
+        self._occupied[key] = self._occupied.get(key, 0) | mask
+        self._entries[booking_id] = (session_id, key, mask, dict(details))
+        self._by_session.setdefault(session_id, set()).add(booking_id)
+
+    def _remove(self, booking_id: str | None) -> None:
+        entry = self._entries.pop(booking_id, None) if booking_id else None
+        if entry is None:
+            return
+        session_id, key, mask, _ = entry
+        remaining = self._occupied.get(key, 0) & ~mask
+        if remaining:
+            self._occupied[key] = remaining
+        else:
+            self._occupied.pop(key, None)
+        ids = self._by_session.get(session_id)
+        if ids is not None:
+            ids.discard(booking_id)
+            if not ids:
+                del self._by_session[session_id]
+
+    def sync_session(self, session_id: str, session: dict | None) -> None:
+        """Make the index match ``session``'s bookings (None = session deleted)."""
+        bookings = [
+            b for b in ((session or {}).get("bookings") or [])
+            if b.get("id") and (b.get("status") or "booked") == "booked"
+        ]
+        with self._lock:
+            keep = {b["id"] for b in bookings}
+            for booking_id in list(self._by_session.get(session_id, ())):
+                if booking_id not in keep:
+                    self._remove(booking_id)
+            for b in bookings:
+                entry = self._entries.get(b["id"])
+                if entry is not None and entry[0] == session_id and entry[3] == (b.get("details") or {}):
+                    continue
+                self._remove(b["id"])
+                self._add(session_id, b["id"], b.get("details") or {})
+
+    def rebuild(self, sessions: dict) -> None:
+        with self._lock:
+            self._occupied.clear()
+            self._entries.clear()
+            self._by_session.clear()
+            for session_id, session in sessions.items():
+                self.sync_session(session_id, session)
+
+    def free_starts(self, location: str, day: date, service: str, after_minutes: int | None = None) -> int:
+        """Slot bitmap of times ``service`` could start at ``location`` on ``day``."""
+        with self._lock:
+            free = self.open_mask(location, day) & ~self._occupied.get((location.strip().casefold(), day), 0)
+        starts = run_starts(free, self.slots_for(service))
+        if after_minutes is not None:
+            starts &= ~((1 << -(-after_minutes // self.slot)) - 1)
+        return starts
+
+    def times(self, mask: int) -> list[str]:
+        # Most days share the same few masks (untouched opening hours), so
+        # the decoded labels are cached per mask.
+        cached = self._times_cache.get(mask)
+        if cached is None:
+            labels = self._labels
+            cached = tuple(labels[i] for i in range(mask.bit_length()) if mask >> i & 1)
+            if len(self._times_cache) >= TIMES_CACHE_SIZE:
+                self._times_cache.clear()
+            self._times_cache[mask] = cached
+        return list(cached)
+
+    def query(
+        self,
+        service: str,
+        locations,
+        start: date,
+        end: date,
+        today: date,
+        now_minutes: int | None = None,
+    ) -> list[dict]:
+        """Free start times per location and day, clamped to the booking horizon.
+
+        Days before ``today`` are skipped and on ``today`` only times after
+        ``now_minutes`` are offered.
+        """
+        start = max(start, today)
+        end = min(end, today + timedelta(days=horizon_days(self._kb)))
+        out = []
+        day = start
+        while day <= end:
+            for location in locations:
+                after = now_minutes if day == today else None
+                out.append({
+                    "location": location,
+                    "date": day.isoformat(),
+                    "times": self.times(self.free_starts(location, day, service, after)),
+                })
+            day += timedelta(days=1)
+        return out
+
+    def search(
+        self,
+        service: str,
+        location: str | None = None,
+        date_from: str | None = None,
+        date_to: str | None = None,
+        now: datetime | None = None,
+    ) -> dict:
+        """Resolve request parameters and run ``query``; ValueError on bad input.
+
+        ``location`` is a comma-separated list (default: every location);
+        the range defaults to ``DEFAULT_RANGE_DAYS`` days from ``date_from``.
+        """
+        now = now or clinic_now()
+        today = now.date()
+        compiled = self.compiled
+        name = compiled.find_service(service or "") or compiled.service_alias((service or "").strip())
+        if not name:
+            raise ValueError("invalid service")
+        if location:
+            locations = []
+            for part in location.split(","):
+                loc = compiled.find_location(part) or compiled.location_alias(part.strip())
+                if not loc:
+                    raise ValueError("invalid location")
+                locations.append(loc)
+        else:
+            locations = list(compiled.location_names)
+        start = parse_date(date_from, today) if date_from else today
+        if start is None:
+            raise ValueError("invalid date range")
+        end = parse_date(date_to, today) if date_to else start + timedelta(days=DEFAULT_RANGE_DAYS - 1)
+        if end is None or end < start:
+            raise ValueError("invalid date range")
+        return {
+            "service": name,
+            "duration_minutes": compiled.durations.get(name.casefold()) or self.slot,
+            "slot_minutes": self.slot,
+            "availability": self.query(name, locations, start, end, today, now.hour * 60 + now.minute),
+        }
+
+    def suggest(self, service: str, locations, day: date, now: datetime | None = None, limit: int = 6) -> list[str]:
+        """Earliest free start in each hour of ``day`` at any of ``locations``."""
+        now = now or clinic_now()
+        if day < now.date() or day > now.date() + timedelta(days=horizon_days(self._kb)):
+            return []
+        after = now.hour * 60 + now.minute if day == now.date() else None
+        mask = 0
+        for location in locations:
+            mask |= self.free_starts(location, day, service, after)
+        out, hours = [], set()
+        for t in self.times(mask):
+            if t[:2] not in hours:
+                hours.add(t[:2])
+                out.append(t)
+                if len(out) == limit:
+                    break
+        return out
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "bookings": len(self._entries),
+                "location_days": len(self._occupied),
+                "slot_minutes": self.slot,
+            }
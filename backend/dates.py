@@ -0,0 +1,187 @@
+"""Booking-date parsing in the clinic's timezone.
+
+``parse_date`` understands what patients type ("tomorrow", "next Tue",
+"in 3 days", "21/12", "21st Dec", "2026-12-21") and returns a ``date``;
+``normalize_date`` adds the booking-horizon check and returns the ISO form
+that bookings store. Results are memoized per (normalized text, today).
+"""
+import os
+import re
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
+
+try:
+    from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+except ImportError:  # pragma: no cover - Python < 3.9
+    ZoneInfo = None
+    ZoneInfoNotFoundError = Exception
+
+DEFAULT_TIMEZONE = "Asia/Singapore"
+DEFAULT_HORIZON_DAYS = 60
+PARSE_CACHE_SIZE = 2048
+
+_MONTHS = ("jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec")
+_WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+_MONTH = (
+    r"(?:jan|january|feb|february|mar|march|apr|april|may|jun|june|jul|july|aug|august"
+    r"|sep|sept|september|oct|october|nov|november|dec|december)"
+)
+# Whole words only, so "friend" or "money" never read as a weekday.
+_WEEKDAY = (
+    r"(?:mon|monday|tue|tues|tuesday|wed|weds|wednesday|thu|thur|thurs|thursday"
+    r"|fri|friday|sat|saturday|sun|sunday)"
+)
+_ORD = r"(?:st|nd|rd|th)?"
+
+# One alternative per form; the first match in the text wins.
+DATE_RE = re.compile(
+    r"\b(?:"
+    r"(?P<iso>(?P<iy>\d{4})[-/](?P<im>\d{1,2})[-/](?P<id>\d{1,2}))"
+    r"|(?P<dmy>(?P<nd>\d{1,2})[/.-](?P<nm>\d{1,2})[/.-](?P<ny>\d{4}|\d{2}))"
+    r"|(?P<dm>(?P<sd>\d{1,2})/(?P<sm>\d{1,2}))"
+    rf"|(?P<dmon>(?P<td>\d{{1,2}}){_ORD}\s*(?:of\s+)?(?P<tm>{_MONTH})\.?(?:,?\s*(?P<ty>\d{{4}}))?)"
+    rf"|(?P<mond>(?P<um>{_MONTH})\.?\s*(?P<ud>\d{{1,2}}){_ORD}(?:,?\s*(?P<uy>\d{{4}}))?)"
+    r"|(?P<rel>today|tdy|tomorrow|tmrw?|tmr|day after tomorrow)"
+    r"|(?P<in>in\s+(?P<n>\d{1,3})\s+(?P<unit>days?|weeks?))"
+    rf"|(?P<wd>(?:(?P<wmod>this|next|coming)\s+)?(?P<wday>{_WEEKDAY}))"
+    r")\b",
+    re.I,
+)
+
+
+def _clinic_tz():
+    name = os.environ.get("CLINIC_TIMEZONE") or DEFAULT_TIMEZONE
+    if ZoneInfo is not None:
+        try:
+            return ZoneInfo(name)
+        except (ZoneInfoNotFoundError, ValueError):
+            pass
+    # No tz database (e.g. Windows without tzdata): Singapore has no DST.
+    return timezone(timedelta(hours=8), "SGT")
+
+
+CLINIC_TZ = _clinic_tz()
+
+
+def clinic_now() -> datetime:
+    return datetime.now(CLINIC_TZ)
+
+
+def clinic_today() -> date:
+    return clinic_now().date()
+
+
+def horizon_days(kb: dict) -> int:
+    m = re.search(r"(\d+)\s*days?", kb.get("date_policy") or "", re.I)
+    return int(m.group(1)) if m else DEFAULT_HORIZON_DAYS
+
+
+def _normalize(text: str) -> str:
+    return " ".join((text or "").lower().replace(",", " ").split())
+
+
+def _year(text: str | None) -> int | None:
+    if not text:
+        return None
+    y = int(text)
+    return y + 2000 if y < 100 else y
+
+
+def _safe_date(year: int, month: int, day: int) -> date | None:
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+def _next_occurrence(month: int, day: int, today: date) -> date | None:
+    # A yearless date means the next time it comes round, today included.
+    for year in (today.year, today.year + 1):
+        d = _safe_date(year, month, day)
+        if d is not None and d >= today:
+            return d
+    return None
+
+
+def _resolve(m: re.Match, today: date) -> date | None:
+    if m.group("iso"):
+        return _safe_date(int(m.group("iy")), int(m.group("im")), int(m.group("id")))
+    if m.group("dmy"):
+        # Day first, as written in Singapore.
+        return _safe_date(_year(m.group("ny")), int(m.group("nm")), int(m.group("nd")))
+    if m.group("dm"):
+        month = int(m.group("sm"))
+        return _next_occurrence(month, int(m.group("sd")), today) if 1 <= month <= 12 else None
+    if m.group("dmon") or m.group("mond"):
+        day, mon, year = (m.group("td"), m.group("tm"), m.group("ty")) if m.group("dmon") else (
+            m.group("ud"), m.group("um"), m.group("uy")
+        )
+        month = _MONTHS.index(mon[:3].lower()) + 1
+        if year:
+            return _safe_date(int(year), month, int(day))
+        return _next_occurrence(month, int(day), today)
+    if m.group("rel"):
+        word = m.group("rel").lower()
+        if word in ("today", "tdy"):
+            return today
+        if word == "day after tomorrow":
+            return today + timedelta(days=2)
+        return today + timedelta(days=1)
+    if m.group("in"):
+        n = int(m.group("n"))
+        return today + timedelta(days=n * 7 if m.group("unit").lower().startswith("week") else n)
+    if m.group("wd"):
+        target = _WEEKDAYS.index(m.group("wday")[:3].lower())
+        ahead = (target - today.weekday()) % 7
+        if ahead == 0 and (m.group("wmod") or "").lower() in ("next", "coming"):
+            # "next Tue" said on a Tuesday means a week out, not today.
+            ahead = 7
+        return today + timedelta(days=ahead)
+    return None
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse_cached(text: str, today: date) -> date | None:
+    m = DATE_RE.search(text)
+    return _resolve(m, today) if m else None
+
+
+def find_date(text: str, today: date | None = None) -> tuple[date, int, int] | None:
+    """First date in ``text`` and its span, for picking dates out of a sentence."""
+    today = today or clinic_today()
+    m = DATE_RE.search(text or "")
+    if not m:
+        return None
+    day = _resolve(m, today)
+    return (day, m.start(), m.end()) if day is not None else None
+
+
+def parse_date(text: str, today: date | None = None) -> date | None:
+    """Resolve the first date expression in ``text``; None if there is none."""
+    return _parse_cached(_normalize(text), today or clinic_today())
+
+
+def policy_error(day: date, horizon: int = DEFAULT_HORIZON_DAYS, today: date | None = None) -> str | None:
+    today = today or clinic_today()
+    if day < today:
+        return "That date has already passed."
+    if day > today + timedelta(days=horizon):
+        return f"Bookings are allowed up to {horizon} days in advance."
+    return None
+
+
+def normalize_date(text: str, horizon: int = DEFAULT_HORIZON_DAYS, today: date | None = None) -> tuple[str | None, str | None]:
+    """Return ``(iso_date, None)`` or ``(None, reason)`` for user input."""
+    today = today or clinic_today()
+    day = parse_date(text, today)
+    if day is None:
+        return None, "Invalid date format. Please re-enter (e.g., tomorrow, next Tue, 21 Dec or 2026-02-10)."
+    reason = policy_error(day, horizon, today)
+    if reason:
+        return None, reason + " Please choose another date."
+    return day.isoformat(), None
+
+
+def cache_info() -> dict:
+    info = _parse_cached.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "entries": info.currsize}
@@ -0,0 +1,89 @@
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from difflib import SequenceMatcher
+from functools import lru_cache
+
+DEFAULT_THRESHOLD = 0.78
+
+
+def _trigrams(text: str) -> set[str]:
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class FuzzyIndex:
+    """Preprocessed option list answering "best SequenceMatcher match" queries.
+
+    Returns exactly what a full ``SequenceMatcher(None, value.lower(),
+    option.lower()).ratio()`` scan would (first option wins ties), but only
+    scores options that can still reach the threshold:
+
+    * options are bucketed by length, and ``2 * min(la, lb) / (la + lb)``
+      bounds the ratio, so a bisect drops everything too short or too long;
+    * the shared character multiset bounds the ratio further (difflib's
+      ``quick_ratio``), using counts computed once per option;
+    * survivors are scored in order of trigram overlap so the best score
+      rises early and later candidates are cut by their bound.
+    """
+
+    def __init__(self, options):
+        self.options = tuple(options)
+        entries = []
+        for idx, opt in enumerate(self.options):
+            low = opt.lower()
+            entries.append((len(low), idx, low, dict(Counter(low)), _trigrams(low)))
+        entries.sort(key=lambda e: (e[0], e[1]))
+        self._entries = entries
+        self._lengths = [e[0] for e in entries]
+
+    def best(self, value: str, threshold: float = DEFAULT_THRESHOLD) -> str | None:
+        if not self._entries:
+            return None
+        q = value.lower()
+        la = len(q)
+        if threshold <= 0:
+            lo, hi = 0, len(self._entries)
+        else:
+            # 2*min(la, lb)/(la + lb) >= threshold  <=>  lb within [la*t/(2-t), la*(2-t)/t]
+            lo = bisect_left(self._lengths, la * threshold / (2 - threshold) - 1e-9)
+            hi = bisect_right(self._lengths, la * (2 - threshold) / threshold + 1e-9)
+        if lo >= hi:
+            return None
+
+        q_counts = Counter(q).items()
+        q_grams = _trigrams(q)
+        candidates = []
+        for lb, idx, low, counts, grams in self._entries[lo:hi]:
+            total = la + lb
+            shared = 0
+            for ch, n in q_counts:
+                m = counts.get(ch)
+                if m:
+                    shared += n if n < m else m
+            bound = 2.0 * shared / total if total else 1.0
+            if bound < threshold:
+                continue
+            candidates.append((-len(q_grams & grams), idx, bound, low))
+        candidates.sort()
+
+        best_idx = None
+        best_score = 0.0
+        for _, idx, bound, low in candidates:
+            if bound < best_score:
+                continue
+            score = SequenceMatcher(None, q, low).ratio()
+            if score > best_score or (score == best_score and best_idx is not None and idx < best_idx):
+                best_score = score
+                best_idx = idx
+        if best_idx is not None and best_score >= threshold:
+            return self.options[best_idx]
+        return None
+
+
+@lru_cache(maxsize=64)
+def fuzzy_index(options: tuple) -> FuzzyIndex:
+    return FuzzyIndex(options)
+
+
+def best_fuzzy_match(value: str, options, threshold: float = DEFAULT_THRESHOLD) -> str | None:
+    return fuzzy_index(tuple(options)).best(value, threshold)
@@ -0,0 +1,216 @@
+"""Bounded conversation history.
+
+A session keeps its last ``max_turns`` turns in ``history``, used as a ring:
+``record_turn`` appends and moves whatever falls off the front to
+``history_rollup``. ``HistoryRollup`` is a background worker, fed by the
+store's change listener, that folds those turns into a compact
+``history_summary`` once ``batch`` of them have piled up and, when given an
+archive directory, appends them to a per-session gzip transcript. A session
+record therefore holds at most ``max_turns + batch`` turns however long the
+conversation runs.
+"""
+import gzip
+import hashlib
+import json
+import os
+import queue
+import re
+import threading
+import traceback
+from pathlib import Path
+
+from session_store import ROLLUP_FIELD, SUMMARY_FIELD, VersionConflict
+
+DEFAULT_MAX_TURNS = 20
+DEFAULT_ROLLUP_BATCH = 10
+ROLLUP_RETRIES = 5
+SUMMARY_TOPICS = 8
+TOPIC_CHARS = 80
+
+_SAFE_ID_RE = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+
+def record_turn(session: dict, turn: dict, max_turns: int = DEFAULT_MAX_TURNS) -> None:
+    history = session.setdefault("history", [])
+    history.append(turn)
+    overflow = len(history) - max(max_turns, 1)
+    if overflow > 0:
+        session.setdefault(ROLLUP_FIELD, []).extend(history[:overflow])
+        del history[:overflow]
+
+
+def _topic(turn: dict) -> str:
+    text = " ".join(str(turn.get("user") or "").split())
+    return text if len(text) <= TOPIC_CHARS else text[: TOPIC_CHARS - 3] + "..."
+
+
+def fold_summary(summary: dict | None, turns: list) -> dict:
+    """Default summarizer: turn count, time span and the latest user topics.
+
+    Local and constant-size, so rollups never call the model; the topics are
+    the last ``SUMMARY_TOPICS`` user messages, shortened.
+    """
+    summary = dict(summary or {})
+    topics = list(summary.get("topics") or [])
+    topics += [t for t in map(_topic, turns) if t]
+    summary["topics"] = topics[-SUMMARY_TOPICS:]
+    summary["turns"] = int(summary.get("turns") or 0) + len(turns)
+    summary.setdefault("first_at", turns[0].get("at") if turns else None)
+    if turns:
+        summary["last_at"] = turns[-1].get("at")
+    return summary
+
+
+def fold_rollup(session: dict, batch: int = 1, summarize=fold_summary) -> list:
+    """Fold the waiting turns into the summary in place once ``batch`` are due.
+
+    Returns the folded turns (empty if nothing was due).
+    """
+    turns = session.get(ROLLUP_FIELD) or []
+    if not turns or len(turns) < batch:
+        return []
+    session[SUMMARY_FIELD] = summarize(session.get(SUMMARY_FIELD), turns)
+    del session[ROLLUP_FIELD]
+    return turns
+
+
+def summary_text(session: dict) -> str:
+    """One line for prompts describing the turns no longer in ``history``."""
+    summary = session.get(SUMMARY_FIELD) or {}
+    pending = len(session.get(ROLLUP_FIELD) or [])
+    turns = int(summary.get("turns") or 0) + pending
+    if not turns:
+        return ""
+    text = f"{turns} earlier turns"
+    topics = list(summary.get("topics") or [])
+    topics += [t for t in map(_topic, session.get(ROLLUP_FIELD) or []) if t]
+    if topics:
+        text += "; the user asked about: " + "; ".join(topics[-SUMMARY_TOPICS:])
+    return text
+
+
+def archive_path(directory: Path | str, session_id: str) -> Path:
+    # Session ids come from clients: only plain ones become file names.
+    name = session_id if _SAFE_ID_RE.fullmatch(session_id) else hashlib.sha1(session_id.encode("utf-8")).hexdigest()
+    return Path(directory) / f"{name}.jsonl.gz"
+
+
+def archive_turns(directory: Path | str, session_id: str, turns: list) -> None:
+    # Each call appends one gzip member; readers see the concatenation.
+    path = archive_path(directory, session_id)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = "".join(json.dumps(t, ensure_ascii=False, separators=(",", ":")) + "\n" for t in turns)
+    with gzip.open(path, "at", encoding="utf-8") as f:
+        f.write(data)
+
+
+def read_archive(directory: Path | str, session_id: str) -> list:
+    path = archive_path(directory, session_id)
+    if not path.exists():
+        return []
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class HistoryRollup:
+    """Background worker that folds rolled-off turns into the summary.
+
+    Register ``on_change`` as a store listener: it only queues the session
+    id, and the worker re-reads the session and writes it back with a
+    version check, retrying on conflict. Several processes sharing a store
+    may all queue the same session; the conditional write lets one of them
+    win and the others find nothing left to fold.
+    """
+
+    def __init__(
+        self,
+        store,
+        archive_dir: Path | str | None = None,
+        batch: int = DEFAULT_ROLLUP_BATCH,
+        summarize=fold_summary,
+    ):
+        self.store = store
+        self.archive_dir = Path(archive_dir) if archive_dir else None
+        self.batch = max(batch, 1)
+        self.summarize = summarize
+        self._queue: queue.Queue = queue.Queue()
+        self._queued: set[str] = set()
+        self._lock = threading.Lock()
+        self._archive_lock = threading.Lock()
+        self._thread = None
+        self.rollups = 0
+        self.turns = 0
+        self.conflicts = 0
+        self.errors = 0
+
+    def on_change(self, session_id: str, session: dict | None) -> None:
+        if session and len(session.get(ROLLUP_FIELD) or ()) >= self.batch:
+            self.submit(session_id)
+
+    def submit(self, session_id: str) -> None:
+        with self._lock:
+            if session_id in self._queued:
+                return
+            self._queued.add(session_id)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="history-rollup", daemon=True)
+                self._thread.start()
+        self._queue.put(session_id)
+
+    def _run(self) -> None:
+        while True:
+            session_id = self._queue.get()
+            with self._lock:
+                self._queued.discard(session_id)
+            try:
+                self.rollup(session_id)
+            except Exception:
+                self.errors += 1
+                traceback.print_exc()
+            finally:
+                self._queue.task_done()
+
+    def rollup(self, session_id: str) -> int:
+        """Fold ``session_id``'s rolled-off turns now; returns how many."""
+        for _ in range(ROLLUP_RETRIES):
+            session = self.store.get(session_id)
+            turns = fold_rollup(session, summarize=self.summarize) if session else []
+            if not turns:
+                return 0
+            try:
+                self.store.put(session_id, session, expected_version=session.get("version", 0))
+            except VersionConflict:
+                self.conflicts += 1
+                continue
+            # Archive only what this write removed, so a turn lands once.
+            if self.archive_dir is not None:
+                with self._archive_lock:
+                    archive_turns(self.archive_dir, session_id, turns)
+            self.rollups += 1
+            self.turns += len(turns)
+            return len(turns)
+        return 0
+
+    def forget(self, session_id: str) -> None:
+        """Drop the archived transcript, e.g. when the user clears history."""
+        if self.archive_dir is None:
+            return
+        with self._archive_lock:
+            try:
+                os.remove(archive_path(self.archive_dir, session_id))
+            except FileNotFoundError:
+                pass
+
+    def drain(self) -> None:
+        """Block until every queued rollup has run."""
+        self._queue.join()
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "rollups": self.rollups,
+            "turns": self.turns,
+            "conflicts": self.conflicts,
+            "errors": self.errors,
+            "archive": str(self.archive_dir) if self.archive_dir else None,
+        }
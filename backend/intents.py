@@ -0,0 +1,54 @@
+import re
+
+# Keyword lists for every intent check in the chat state machine.
+INTENT_KEYWORDS = {
+    "info": ("services", "service list", "opening hours", "hours", "locations", "price", "pricing",
+             "clinic info", "clinic information"),
+    "booking": ("book", "booking", "appointment", "schedule", "reschedule", "cancel", "change", "edit"),
+    "confirm": ("confirm", "confirmed", "yes", "okay", "ok", "sure"),
+    # answers to a per-field "(yes/no)" question
+    "yes": ("yes", "confirm", "ok", "okay", "sure"),
+    "no": ("no", "change", "edit", "wrong"),
+    # answers to the final booking confirmation
+    "final_yes": ("yes", "confirm", "looks good", "ok", "okay", "sure", "correct"),
+    "final_no": ("no", "change", "edit", "not correct", "wrong"),
+    "status": ("my booking", "booking details", "booking status", "what did i book"),
+}
+
+
+class IntentClassifier:
+    """Match every intent keyword in one scan of the message.
+
+    All keywords are compiled into a single alternation of named groups,
+    wrapped in a lookahead so a match is tried at every position. Each
+    keyword also carries the intents of any shorter keyword it contains
+    (e.g. "not correct" implies "correct"), so the result equals running
+    each ``\\b(...)\\b`` intent regex separately.
+    """
+
+    def __init__(self, keywords: dict[str, tuple[str, ...]]):
+        phrases = sorted({k for kws in keywords.values() for k in kws}, key=lambda k: (-len(k), k))
+        singles = {
+            intent: re.compile(r"\b(" + "|".join(re.escape(k) for k in kws) + r")\b")
+            for intent, kws in keywords.items()
+        }
+        self._intents = {}
+        alternatives = []
+        for i, phrase in enumerate(phrases):
+            group = f"k{i}"
+            self._intents[group] = frozenset(intent for intent, rx in singles.items() if rx.search(phrase))
+            alternatives.append(f"(?P<{group}>{re.escape(phrase)})")
+        self._pattern = re.compile(r"(?=\b(?:" + "|".join(alternatives) + r")\b)")
+
+    def classify(self, text: str) -> frozenset:
+        found = set()
+        for m in self._pattern.finditer(text.lower()):
+            found |= self._intents[m.lastgroup]
+        return frozenset(found)
+
+
+CLASSIFIER = IntentClassifier(INTENT_KEYWORDS)
+
+
+def classify(text: str) -> frozenset:
+    return CLASSIFIER.classify(text)
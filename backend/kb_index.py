@@ -0,0 +1,110 @@
+import re
+
+DAY_TYPES = ("mon_fri", "sat", "sun")
+
+_WINDOW_RE = re.compile(r"(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})")
+
+# Name words too generic to identify a service or location on their own.
+_ALIAS_STOPWORDS = frozenset({"place", "general", "central", "centre", "center", "clinic", "road"})
+ALIAS_MIN_LEN = 5
+
+
+def day_type(weekday: int) -> str:
+    """Map ``date.weekday()`` (Mon=0) to the KB hours key."""
+    if weekday == 5:
+        return "sat"
+    if weekday == 6:
+        return "sun"
+    return "mon_fri"
+
+
+def parse_window(text: str) -> tuple[int, int] | None:
+    """Parse "09:00-18:00" into minutes since midnight; None if closed/unparseable."""
+    m = _WINDOW_RE.search(text or "")
+    if not m:
+        return None
+    return int(m.group(1)) * 60 + int(m.group(2)), int(m.group(3)) * 60 + int(m.group(4))
+
+
+class CompiledKB:
+    """Lookup tables derived from one clinic KB version.
+
+    ``services``/``locations`` map case-folded names to canonical names.
+    ``hours`` maps a case-folded location name to ``{day_type: (start, end)}``
+    in minutes, with None for closed or unparseable windows.
+    """
+
+    def __init__(self, kb: dict):
+        services = [s for s in (kb.get("services") or []) if s.get("name")]
+        locations = [l for l in (kb.get("locations") or []) if l.get("name")]
+        self.service_names = tuple(s["name"] for s in services)
+        self.location_names = tuple(l["name"] for l in locations)
+        self.services = {}
+        for s in kb.get("services") or []:
+            n = (s.get("name") or "").strip()
+            self.services.setdefault(n.casefold(), n)
+        self.locations = {}
+        for l in kb.get("locations") or []:
+            n = (l.get("name") or "").strip()
+            self.locations.setdefault(n.casefold(), n)
+        self.service_needles = tuple((n, n.lower()) for n in self.service_names)
+        self.location_needles = tuple((n, n.lower()) for n in self.location_names)
+        self.service_words = _alias_words(self.service_names)
+        self.location_words = _alias_words(self.location_names)
+        self.durations = {
+            (s.get("name") or "").strip().casefold(): int(s.get("duration_minutes") or 0) for s in services
+        }
+        self.hours = {}
+        for l in kb.get("locations") or []:
+            key = (l.get("name") or "").strip().casefold()
+            if key in self.hours:
+                continue
+            hours = l.get("hours") or {}
+            self.hours[key] = {d: parse_window(hours.get(d) or "") for d in DAY_TYPES}
+
+    def find_service(self, name: str) -> str | None:
+        return self.services.get(name.strip().casefold())
+
+    def find_location(self, name: str) -> str | None:
+        return self.locations.get(name.strip().casefold())
+
+    def window(self, location_name: str, day: str = "mon_fri") -> tuple[int, int] | None:
+        return (self.hours.get(location_name.strip().casefold()) or {}).get(day)
+
+    def has_location(self, location_name: str) -> bool:
+        return location_name.strip().casefold() in self.hours
+
+    def service_alias(self, token: str) -> str | None:
+        return _match_alias(token, self.service_words)
+
+    def location_alias(self, token: str) -> str | None:
+        return _match_alias(token, self.location_words)
+
+
+def _alias_words(names) -> tuple[tuple[str, str], ...]:
+    return tuple(
+        (w, n) for n in names for w in n.lower().split() if len(w) >= ALIAS_MIN_LEN and w not in _ALIAS_STOPWORDS
+    )
+
+
+def _match_alias(token: str, words) -> str | None:
+    """Name with a word sharing a long prefix with ``token``, if exactly one.
+
+    "physio" -> Physiotherapy, "vaccine" -> Vaccination, "tampi" -> Tampines.
+    """
+    t = token.lower()
+    if len(t) < ALIAS_MIN_LEN:
+        return None
+    stem = t[:6]
+    hits = {n for w, n in words if w.startswith(stem)}
+    return hits.pop() if len(hits) == 1 else None
+
+
+def compile_kb(kb: dict) -> CompiledKB:
+    """Return the compiled tables for ``kb``, built once per KB snapshot."""
+    compiled = getattr(kb, "_compiled", None)
+    if compiled is None:
+        compiled = CompiledKB(kb)
+        if hasattr(kb, "__dict__"):
+            kb._compiled = compiled
+    return compiled
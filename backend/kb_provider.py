@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+
+
+class _FrozenDict(dict):
+    """dict that refuses mutation; still a dict for json.dumps and .get()."""
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("clinic KB snapshots are read-only")
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return _FrozenDict((k, _freeze(v)) for k, v in value.items())
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+class KBSnapshot(_FrozenDict):
+    """Immutable parsed clinic KB, tagged with a content hash."""
+
+    version: str = ""
+
+    def info_payload(self) -> tuple[bytes, str]:
+        """``{"clinic": kb}`` as JSON bytes and its strong ETag.
+
+        Serialized on first use and kept on the snapshot, so a KB version is
+        encoded once however many times /clinic/info is served.
+        """
+        payload = self.__dict__.get("_info_payload")
+        if payload is None:
+            body = json.dumps({"clinic": self}, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            payload = (body, f'"{hashlib.sha1(body).hexdigest()[:16]}"')
+            self.__dict__["_info_payload"] = payload
+        return payload
+
+
+def freeze_kb(data: dict, version: str | None = None) -> KBSnapshot:
+    snap = KBSnapshot((k, _freeze(v)) for k, v in (data or {}).items())
+    if version is None:
+        raw = json.dumps(data or {}, sort_keys=True, ensure_ascii=True).encode("utf-8")
+        version = hashlib.sha1(raw).hexdigest()[:12]
+    snap.version = version
+    return snap
+
+
+class KBProvider:
+    """Process-wide cache of clinic_kb.json.
+
+    The file is parsed once; each ``snapshot()`` call only stats the file and
+    re-parses when its mtime or size changed. Callers get the same immutable
+    snapshot until then, so one request can pass it to every helper.
+    """
+
+    def __init__(self, path: Path | str):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._snapshot = freeze_kb({})
+        self.loads = 0
+
+    def snapshot(self) -> KBSnapshot:
+        try:
+            st = os.stat(self.path)
+            stamp = (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            stamp = None
+        if stamp == self._stamp:
+            return self._snapshot
+        with self._lock:
+            if stamp != self._stamp:
+                self._reload(stamp)
+        return self._snapshot
+
+    def _reload(self, stamp) -> None:
+        self._stamp = stamp
+        if stamp is None:
+            self._snapshot = freeze_kb({})
+            return
+        try:
+            raw = self.path.read_bytes()
+            data = json.loads(raw.decode("utf-8"))
+        except Exception:
+            # Keep serving the last good copy while the file is being edited.
+            return
+        self._snapshot = freeze_kb(data, hashlib.sha1(raw).hexdigest()[:12])
+        self.loads += 1
@@ -0,0 +1,455 @@
+"""Session store on a DynamoDB-style key-value table.
+
+Each session is a group of items under one partition key (the session
+id): a ``session`` item with the draft, history and other fields, and one
+``booking#<id>`` item per booking. Every write touches only that
+session's items and is conditional on the session item's version, so
+any number of Lambda containers can share the table without a lock
+service. With ``set_claims``, each booked slot also gets a
+``slot#<location>#<date>#<minute>`` item, put on condition that it does
+not exist in the same transaction as the booking.
+
+Two tables implement the same small interface:
+
+* ``DynamoTable``: an AWS DynamoDB table with string keys ``pk`` (hash)
+  and ``sk`` (range). boto3 is imported on first use.
+* ``LocalTable``: a stand-in with the same semantics on SQLite, in
+  memory or in a local file, for tests and local runs.
+
+Items are ``{"data": <JSON string>, "n": <int>}``: ``n`` is the version
+of a session item and the position of a booking item. A slot item's data
+names the session and booking holding it.
+"""
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+
+from session_store import ROLLUP_FIELD, SUMMARY_FIELD, SessionLocks, SessionStore, SlotTaken, VersionConflict, _encode
+
+SESSION_SK = "session"
+BOOKING_PREFIX = "booking#"
+SLOT_PREFIX = "slot#"
+SLOT_SK = "slot"
+# DynamoDB caps a transaction at 100 items.
+MAX_TRANSACT_ITEMS = 100
+
+
+class ConditionFailed(Exception):
+    """A conditional write found the item in a different state."""
+
+    def __init__(self, pk: str):
+        super().__init__(pk)
+        self.pk = pk
+
+
+# A write is (op, pk, sk, data, n, condition):
+#   op "put" stores (data, n); "delete" removes the item; "bump" adds 1 to n.
+#   condition None, ("n", expected) -- expected 0 means "must not exist" --
+#   or ("exists",).
+
+
+class LocalTable:
+    """In-process/local-file stand-in for ``DynamoTable`` backed by SQLite.
+
+    ``path=None`` keeps the table in memory for this process only.
+    """
+
+    def __init__(self, path: Path | str | None = None):
+        self.path = str(path) if path else ":memory:"
+        self._lock = threading.RLock()
+        self._conn = None
+        self._pid = None
+        with self._lock:
+            self._db().execute(
+                "CREATE TABLE IF NOT EXISTS items (pk TEXT NOT NULL, sk TEXT NOT NULL, data TEXT NOT NULL, "
+                "n INTEGER NOT NULL, PRIMARY KEY (pk, sk))"
+            )
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None or (self._pid != os.getpid() and self.path != ":memory:"):
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            if self.path != ":memory:":
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA busy_timeout=5000")
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def get(self, pk: str, sk: str) -> tuple[str, int] | None:
+        with self._lock:
+            row = self._db().execute("SELECT data, n FROM items WHERE pk = ? AND sk = ?", (pk, sk)).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def query(self, pk: str, prefix: str = "") -> list[tuple[str, str, int]]:
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT sk, data, n FROM items WHERE pk = ? AND substr(sk, 1, ?) = ? ORDER BY sk",
+                (pk, len(prefix), prefix),
+            ).fetchall()
+        return [tuple(r) for r in rows]
+
+    def scan(self):
+        with self._lock:
+            rows = self._db().execute("SELECT pk, sk, data, n FROM items ORDER BY pk, sk").fetchall()
+        return [tuple(r) for r in rows]
+
+    def transact(self, writes: list) -> None:
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                for op, pk, sk, data, n, cond in writes:
+                    row = db.execute("SELECT n FROM items WHERE pk = ? AND sk = ?", (pk, sk)).fetchone()
+                    if cond is not None:
+                        if cond[0] == "exists" and row is None:
+                            raise ConditionFailed(pk)
+                        if cond[0] == "n" and (row[0] if row else 0) != cond[1]:
+                            raise ConditionFailed(pk)
+                    if op == "put":
+                        db.execute("INSERT OR REPLACE INTO items (pk, sk, data, n) VALUES (?, ?, ?, ?)", (pk, sk, data, n))
+                    elif op == "delete":
+                        db.execute("DELETE FROM items WHERE pk = ? AND sk = ?", (pk, sk))
+                    elif op == "bump" and row is not None:
+                        db.execute("UPDATE items SET n = n + 1 WHERE pk = ? AND sk = ?", (pk, sk))
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._db().execute("DELETE FROM items")
+
+
+class DynamoTable:
+    """DynamoDB table with ``pk``/``sk`` string keys, ``data`` (S) and ``n`` (N).
+
+    Uses the low-level client so values stay plain strings and numbers.
+    Single writes use conditional Put/Delete/Update; several writes go
+    through ``TransactWriteItems``.
+    """
+
+    def __init__(self, name: str, region: str | None = None, client=None):
+        self.name = name
+        self.region = region or os.environ.get("AWS_REGION") or os.environ.get("AWS_DEFAULT_REGION")
+        self._client = client
+
+    def _ddb(self):
+        if self._client is None:
+            import boto3
+
+            self._client = boto3.client("dynamodb", region_name=self.region)
+        return self._client
+
+    @staticmethod
+    def _key(pk: str, sk: str) -> dict:
+        return {"pk": {"S": pk}, "sk": {"S": sk}}
+
+    def get(self, pk: str, sk: str) -> tuple[str, int] | None:
+        item = self._ddb().get_item(TableName=self.name, Key=self._key(pk, sk), ConsistentRead=True).get("Item")
+        return (item["data"]["S"], int(item["n"]["N"])) if item else None
+
+    def query(self, pk: str, prefix: str = "") -> list[tuple[str, str, int]]:
+        kwargs = {
+            "TableName": self.name,
+            "KeyConditionExpression": "pk = :pk AND begins_with(sk, :p)",
+            "ExpressionAttributeValues": {":pk": {"S": pk}, ":p": {"S": prefix}},
+            "ConsistentRead": True,
+        }
+        out = []
+        for page in self._ddb().get_paginator("query").paginate(**kwargs):
+            out.extend((i["sk"]["S"], i["data"]["S"], int(i["n"]["N"])) for i in page["Items"])
+        return out
+
+    def scan(self):
+        out = []
+        for page in self._ddb().get_paginator("scan").paginate(TableName=self.name, ConsistentRead=True):
+            out.extend((i["pk"]["S"], i["sk"]["S"], i["data"]["S"], int(i["n"]["N"])) for i in page["Items"])
+        return out
+
+    def _request(self, op, pk, sk, data, n, cond) -> tuple[str, dict]:
+        req = {"TableName": self.name, "Key": self._key(pk, sk)}
+        values, names = {}, {}
+        if op == "put":
+            req = {"TableName": self.name, "Item": {**self._key(pk, sk), "data": {"S": data}, "n": {"N": str(n)}}}
+            kind = "Put"
+        elif op == "delete":
+            kind = "Delete"
+        else:
+            kind = "Update"
+            req["UpdateExpression"] = "SET #n = #n + :one"
+            names["#n"] = "n"
+            values[":one"] = {"N": "1"}
+            if cond is None:
+                cond = ("exists",)
+        if cond is not None:
+            if cond[0] == "exists":
+                req["ConditionExpression"] = "attribute_exists(pk)"
+            elif cond[1] == 0:
+                req["ConditionExpression"] = "attribute_not_exists(pk)"
+            else:
+                req["ConditionExpression"] = "#n = :expected"
+                names["#n"] = "n"
+                values[":expected"] = {"N": str(cond[1])}
+        if values:
+            req["ExpressionAttributeValues"] = values
+        if names:
+            req["ExpressionAttributeNames"] = names
+        return kind, req
+
+    def transact(self, writes: list) -> None:
+        from botocore.exceptions import ClientError
+
+        requests = [self._request(*w) for w in writes]
+        try:
+            if len(requests) == 1:
+                kind, req = requests[0]
+                getattr(self._ddb(), {"Put": "put_item", "Delete": "delete_item", "Update": "update_item"}[kind])(**req)
+            else:
+                if len(requests) > MAX_TRANSACT_ITEMS:
+                    raise ValueError(f"transaction of {len(requests)} items exceeds {MAX_TRANSACT_ITEMS}")
+                self._ddb().transact_write_items(TransactItems=[{kind: req} for kind, req in requests])
+        except ClientError as e:
+            code = e.response.get("Error", {}).get("Code")
+            reasons = [r.get("Code") for r in e.response.get("CancellationReasons") or []]
+            if code == "ConditionalCheckFailedException":
+                raise ConditionFailed(writes[0][1]) from e
+            if "ConditionalCheckFailed" in reasons:
+                raise ConditionFailed(writes[reasons.index("ConditionalCheckFailed")][1]) from e
+            raise
+
+    def clear(self) -> None:
+        for pk, sk, _, _ in self.scan():
+            self._ddb().delete_item(TableName=self.name, Key=self._key(pk, sk))
+
+
+def _slot_pk(slot: tuple) -> str:
+    return SLOT_PREFIX + "#".join(str(part) for part in slot)
+
+
+class KeyValueStore(SessionStore):
+    """``SessionStore`` over a ``LocalTable``/``DynamoTable``.
+
+    Reads are one Query (session) or one GetItem (booking, version).
+    ``put`` rewrites the session item and only the booking items that
+    changed, in one conditional transaction, together with the slot items
+    those bookings claim or release. Locks are in-process only; across
+    containers the version condition is what serialises writers, and the
+    slot items' "must not exist" condition what keeps two bookings apart.
+    """
+
+    def __init__(self, table):
+        self.table = table
+        self.locks = SessionLocks(None)
+
+    def _assemble(self, rows) -> dict | None:
+        session, bookings = None, []
+        for sk, data, n in rows:
+            if sk == SESSION_SK:
+                session = {**json.loads(data), "version": n}
+            elif sk.startswith(BOOKING_PREFIX):
+                bookings.append((n, json.loads(data)))
+        if session is None:
+            return None
+        session["bookings"] = [b for _, b in sorted(bookings, key=lambda x: x[0])]
+        return session
+
+    def get(self, session_id: str) -> dict | None:
+        rows = self.table.query(session_id)
+        self._sized(sum(len(data) for sk, data, _ in rows if sk == SESSION_SK or sk.startswith(BOOKING_PREFIX)))
+        return self._assemble(rows)
+
+    def exists(self, session_id: str) -> bool:
+        return self.table.get(session_id, SESSION_SK) is not None
+
+    def version(self, session_id: str) -> int:
+        item = self.table.get(session_id, SESSION_SK)
+        return item[1] if item else 0
+
+    def _held(self, bookings) -> dict:
+        """Slot -> id of the booking holding it, for ``bookings``."""
+        return {tuple(slot): b.get("id") or "" for b in bookings for slot in self._slots(b)}
+
+    def _claim_writes(self, session_id: str, old: dict, new: dict, strict: bool = True) -> list:
+        writes = []
+        for slot, booking_id in new.items():
+            if old.get(slot) == booking_id:
+                continue
+            data = _encode({"session_id": session_id, "booking_id": booking_id})
+            # A slot this session already held only changes hands.
+            cond = ("n", 0) if strict and slot not in old else None
+            writes.append(("put", _slot_pk(slot), SLOT_SK, data, 1, cond))
+        writes.extend(("delete", _slot_pk(slot), SLOT_SK, None, 0, None) for slot in old if slot not in new)
+        return writes
+
+    def _refused(self, session_id: str, e: ConditionFailed, expected: int | None) -> Exception:
+        if e.pk.startswith(SLOT_PREFIX):
+            item = self.table.get(e.pk, SLOT_SK)
+            holder = json.loads(item[0]).get("session_id") if item else session_id
+            location, day, minute = e.pk[len(SLOT_PREFIX):].rsplit("#", 2)
+            return SlotTaken(session_id, (location, day, int(minute)), holder)
+        return VersionConflict(session_id, expected, self.version(session_id))
+
+    def _writes(self, session_id: str, session: dict, version: int, cond, strict: bool = True) -> list:
+        body = _encode({k: v for k, v in session.items() if k not in ("bookings", "version")})
+        writes = [("put", session_id, SESSION_SK, body, version, cond)]
+        size = len(body)
+        existing = {sk: (data, n) for sk, data, n in self.table.query(session_id, BOOKING_PREFIX)}
+        old, new = {}, {}
+        for i, b in enumerate(session.get("bookings") or []):
+            sk = BOOKING_PREFIX + (b.get("id") or f"#{i}")
+            data = _encode(b)
+            size += len(data)
+            prev = existing.pop(sk, None)
+            if prev != (data, i):
+                writes.append(("put", session_id, sk, data, i, None))
+                if self._claims is not None and (prev is None or prev[0] != data):
+                    old.update(self._held([json.loads(prev[0])] if prev else []))
+                    new.update(self._held([b]))
+        writes.extend(("delete", session_id, sk, None, 0, None) for sk in existing)
+        if self._claims is not None:
+            old.update(self._held(json.loads(data) for data, _ in existing.values()))
+            writes.extend(self._claim_writes(session_id, old, new, strict))
+        self._sized(size)
+        return writes
+
+    def _transact(self, writes: list) -> None:
+        """Run ``writes`` in transactions of at most ``MAX_TRANSACT_ITEMS``.
+
+        The conditional writes (the session's version, new slot claims) all
+        go in the first one, so a refusal leaves every item untouched; the
+        rest follow unconditionally.
+        """
+        first = [w for w in writes if w[5] is not None]
+        rest = [w for w in writes if w[5] is None]
+        if len(first) > MAX_TRANSACT_ITEMS:
+            raise ValueError(f"{len(first)} conditional writes exceed one transaction of {MAX_TRANSACT_ITEMS} items")
+        room = MAX_TRANSACT_ITEMS - len(first)
+        chunks = [first + rest[:room]]
+        chunks += [rest[i:i + MAX_TRANSACT_ITEMS] for i in range(room, len(rest), MAX_TRANSACT_ITEMS)]
+        for chunk in chunks:
+            if chunk:
+                self.table.transact(chunk)
+
+    def put(self, session_id: str, session: dict, expected_version: int | None = None) -> int:
+        with self.lock(session_id):
+            current = self.version(session_id) if expected_version is None else expected_version
+            cond = ("n", current) if expected_version is not None else None
+            try:
+                self._transact(self._writes(session_id, session, current + 1, cond))
+            except ConditionFailed as e:
+                raise self._refused(session_id, e, expected_version) from None
+        session["version"] = current + 1
+        self._notify(session_id, session)
+        return current + 1
+
+    def delete(self, session_id: str, expected_version: int | None = None) -> None:
+        with self.lock(session_id):
+            rows = self.table.query(session_id)
+            cond = ("n", expected_version) if expected_version is not None else None
+            writes = [("delete", session_id, SESSION_SK, None, 0, cond)]
+            writes += [("delete", session_id, sk, None, 0, None) for sk, _, _ in rows if sk != SESSION_SK]
+            held = self._held(json.loads(data) for sk, data, _ in rows if sk.startswith(BOOKING_PREFIX))
+            writes.extend(self._claim_writes(session_id, held, {}))
+            try:
+                self._transact(writes)
+            except ConditionFailed as e:
+                raise self._refused(session_id, e, expected_version) from None
+        self._notify(session_id, None)
+
+    def write_batch(self, changes: dict[str, str | None]) -> None:
+        for session_id, raw in changes.items():
+            if raw is None:
+                self.delete(session_id)
+                continue
+            session = json.loads(raw)
+            with self.lock(session_id):
+                try:
+                    self._transact(self._writes(session_id, session, session.get("version", 0), None))
+                except ConditionFailed as e:
+                    raise self._refused(session_id, e, None) from None
+            self._notify(session_id, session)
+
+    def load_all(self) -> dict:
+        grouped: dict[str, list] = {}
+        for pk, sk, data, n in self.table.scan():
+            grouped.setdefault(pk, []).append((sk, data, n))
+        out = {}
+        for session_id, rows in grouped.items():
+            session = self._assemble(rows)
+            if session is not None:
+                out[session_id] = session
+        return out
+
+    def save_all(self, store: dict) -> None:
+        self.table.clear()
+        for session_id, session in store.items():
+            # An import keeps what was booked, overlaps included.
+            self._transact(self._writes(session_id, session, session.get("version", 0) or 1, None, strict=False))
+
+    def list_bookings(self, session_id: str) -> list:
+        rows = self.table.query(session_id, BOOKING_PREFIX)
+        return [json.loads(data) for _, data, _ in sorted(rows, key=lambda r: r[2])]
+
+    def get_booking(self, session_id: str, booking_id: str) -> dict | None:
+        item = self.table.get(session_id, BOOKING_PREFIX + booking_id)
+        return json.loads(item[0]) if item else None
+
+    def put_booking(self, session_id: str, booking: dict) -> bool:
+        sk = BOOKING_PREFIX + (booking.get("id") or "")
+        with self.lock(session_id):
+            item = self.table.get(session_id, sk)
+            if item is None:
+                return False
+            claims = self._claim_writes(session_id, self._held([json.loads(item[0])]), self._held([booking]))
+            try:
+                self.table.transact([
+                    ("put", session_id, sk, _encode(booking), item[1], ("exists",)),
+                    ("bump", session_id, SESSION_SK, None, 0, ("exists",)),
+                    *claims,
+                ])
+            except ConditionFailed as e:
+                if e.pk.startswith(SLOT_PREFIX):
+                    raise self._refused(session_id, e, None) from None
+                return False
+        self._notify_stored(session_id)
+        return True
+
+    def delete_booking(self, session_id: str, booking_id: str) -> bool:
+        sk = BOOKING_PREFIX + booking_id
+        with self.lock(session_id):
+            item = self.table.get(session_id, sk) if self._claims is not None else None
+            claims = self._claim_writes(session_id, self._held([json.loads(item[0])]) if item else {}, {})
+            try:
+                self.table.transact([
+                    ("delete", session_id, sk, None, 0, ("exists",)),
+                    ("bump", session_id, SESSION_SK, None, 0, ("exists",)),
+                    *claims,
+                ])
+            except ConditionFailed:
+                return False
+        self._notify_stored(session_id)
+        return True
+
+    def clear_history(self, session_id: str) -> bool:
+        with self.lock(session_id):
+            while True:
+                item = self.table.get(session_id, SESSION_SK)
+                if item is None:
+                    return False
+                body = {**json.loads(item[0]), "history": []}
+                body.pop(SUMMARY_FIELD, None)
+                body.pop(ROLLUP_FIELD, None)
+                try:
+                    self.table.transact([("put", session_id, SESSION_SK, _encode(body), item[1] + 1, ("n", item[1]))])
+                    break
+                except ConditionFailed:
+                    continue
+        self._notify_stored(session_id)
+        return True
+
+    def _notify_stored(self, session_id: str) -> None:
+        if self._listeners:
+            self._notify(session_id, self.get(session_id))
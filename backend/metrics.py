@@ -0,0 +1,258 @@
+"""Request metrics for the chat path.
+
+A small in-process registry of labelled counters and histograms, rendered in
+the Prometheus text format for the backend's ``/metrics``. What it records:
+
+* ``chat_branch_seconds{branch}``: whole chat turns, by the branch of the
+  turn logic that answered (``mark_branch``), including the store flush.
+* ``llm_request_seconds{call,outcome}`` and ``llm_tokens_total{call,kind}``
+  from ``resp.usage``.
+* ``store_op_seconds{op}`` and ``store_op_bytes{op}`` for session loads and
+  saves; bytes are the session's encoded size as the store engine read or
+  wrote it (``SessionStore.last_size``), not observed for engines without one.
+* ``kb_loads_total``: KB snapshots taken by requests. The backend adds
+  ``kb_file_loads_total``, the file parses, read from the provider at scrape
+  time.
+
+Inside ``chat_turn()`` the same observations are also summed on the turn, so
+the Lambda can log one CloudWatch EMF line per invocation (``ChatTurn.emf``).
+"""
+import json
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+EMF_NAMESPACE = "ClinicBookingBot"
+
+_TURN: ContextVar["ChatTurn | None"] = ContextVar("chat_turn", default=None)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: tuple, values: tuple, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_labels(self.labelnames, k)} {_num(v)}" for k, v in values]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # labels -> [per-bucket counts (last one is +Inf), sum, count]
+        self._series: dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list[str]:
+        with self._lock:
+            series = sorted((k, [list(v[0]), v[1], v[2]]) for k, v in self._series.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in series:
+            running = 0
+            for bound, n in zip((*self.buckets, float("inf")), counts):
+                running += n
+                le = 'le="%s"' % _num(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {running}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_num(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: list = []
+        self._collectors: list = []
+
+    def counter(self, name: str, help: str, labelnames: tuple = ()) -> Counter:
+        metric = Counter(name, help, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, help, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, name: str, kind: str, help: str, fn) -> None:
+        """An unlabelled value read from ``fn()`` at render time."""
+        self._collectors.append((name, kind, help, fn))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines += metric.render()
+        for name, kind, help, fn in self._collectors:
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}", f"{name} {_num(fn())}"]
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CHAT_BRANCH_SECONDS = REGISTRY.histogram("chat_branch_seconds", "Chat turn latency by the branch that answered.", ("branch",))
+LLM_SECONDS = REGISTRY.histogram("llm_request_seconds", "Model call duration.", ("call", "outcome"))
+LLM_TOKENS = REGISTRY.counter("llm_tokens_total", "Model tokens reported in resp.usage.", ("call", "kind"))
+STORE_SECONDS = REGISTRY.histogram("store_op_seconds", "Session load/save duration.", ("op",))
+STORE_BYTES = REGISTRY.histogram("store_op_bytes", "Encoded session size per load/save.", ("op",), SIZE_BUCKETS)
+KB_LOADS = REGISTRY.counter("kb_loads_total", "Clinic KB snapshots taken by requests.")
+
+
+class ChatTurn:
+    """One chat turn: the branch that answered and per-turn sums for EMF."""
+
+    def __init__(self):
+        self.branch = "unknown"
+        self.started = time.perf_counter()
+        self.seconds = None
+        # Set when the reply outlives the request handler (SSE); the stream
+        # calls finish() itself.
+        self.deferred = False
+        self.totals: dict[str, float] = {}
+
+    def add(self, key: str, amount: float) -> None:
+        self.totals[key] = self.totals.get(key, 0) + amount
+
+    def finish(self) -> None:
+        if self.seconds is not None:
+            return
+        self.seconds = time.perf_counter() - self.started
+        CHAT_BRANCH_SECONDS.observe(self.seconds, self.branch)
+
+    def emf(self, namespace: str = EMF_NAMESPACE, timestamp_ms: int | None = None) -> str:
+        """One CloudWatch Embedded Metric Format line, dimensioned by branch."""
+        values = {
+            "ChatLatency": ((self.seconds or 0.0) * 1000, "Milliseconds"),
+            "LLMCalls": (self.totals.get("llm_calls", 0), "Count"),
+            "LLMLatency": (self.totals.get("llm_seconds", 0.0) * 1000, "Milliseconds"),
+            "PromptTokens": (self.totals.get("prompt_tokens", 0), "Count"),
+            "CompletionTokens": (self.totals.get("completion_tokens", 0), "Count"),
+            "StoreLoadLatency": (self.totals.get("load_seconds", 0.0) * 1000, "Milliseconds"),
+            "StoreLoadBytes": (self.totals.get("load_bytes", 0), "Bytes"),
+            "StoreSaveLatency": (self.totals.get("save_seconds", 0.0) * 1000, "Milliseconds"),
+            "StoreSaveBytes": (self.totals.get("save_bytes", 0), "Bytes"),
+            "KBLoads": (self.totals.get("kb_loads", 0), "Count"),
+        }
+        doc = {
+            "_aws": {
+                "Timestamp": timestamp_ms if timestamp_ms is not None else int(time.time() * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace": namespace,
+                    "Dimensions": [["Branch"]],
+                    "Metrics": [{"Name": name, "Unit": unit} for name, (_, unit) in values.items()],
+                }],
+            },
+            "Branch": self.branch,
+            **{name: round(value, 3) for name, (value, _) in values.items()},
+        }
+        return json.dumps(doc, separators=(",", ":"))
+
+
+@contextmanager
+def chat_turn():
+    """Make a new ChatTurn current; its latency is recorded on exit unless deferred."""
+    turn = ChatTurn()
+    token = _TURN.set(turn)
+    try:
+        yield turn
+    finally:
+        _TURN.reset(token)
+        if not turn.deferred:
+            turn.finish()
+
+
+def mark_branch(name: str) -> None:
+    turn = _TURN.get()
+    if turn is not None:
+        turn.branch = name
+
+
+@contextmanager
+def llm_call(call: str):
+    """Time a model call; the outcome label is "error" if the block raises."""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        seconds = time.perf_counter() - started
+        LLM_SECONDS.observe(seconds, call, outcome)
+        turn = _TURN.get()
+        if turn is not None:
+            turn.add("llm_calls", 1)
+            turn.add("llm_seconds", seconds)
+
+
+def record_usage(call: str, usage) -> None:
+    if usage is None:
+        return
+    prompt = getattr(usage, "prompt_tokens", 0) or 0
+    completion = getattr(usage, "completion_tokens", 0) or 0
+    LLM_TOKENS.inc(call, "prompt", amount=prompt)
+    LLM_TOKENS.inc(call, "completion", amount=completion)
+    turn = _TURN.get()
+    if turn is not None:
+        turn.add("prompt_tokens", prompt)
+        turn.add("completion_tokens", completion)
+
+
+def observe_store(op: str, seconds: float, size: int | None) -> None:
+    STORE_SECONDS.observe(seconds, op)
+    if size is not None:
+        STORE_BYTES.observe(size, op)
+    turn = _TURN.get()
+    if turn is not None:
+        turn.add(op + "_seconds", seconds)
+        if size is not None:
+            turn.add(op + "_bytes", size)
+
+
+def record_kb_load() -> None:
+    KB_LOADS.inc()
+    turn = _TURN.get()
+    if turn is not None:
+        turn.add("kb_loads", 1)
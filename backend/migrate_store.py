@@ -0,0 +1,56 @@
+"""Import an existing booking_store.json into another store engine.
+
+Usage:
+    python migrate_store.py                      # booking_store.json -> booking_store.db
+    python migrate_store.py --engine log
+    python migrate_store.py --engine kv          # local DynamoDB stand-in
+    python migrate_store.py --engine dynamodb --target <table name>
+    python migrate_store.py --source other.json --target other.db
+"""
+import argparse
+from pathlib import Path
+
+from availability import AvailabilityIndex
+from kb_provider import KBProvider
+from kv_store import DynamoTable, KeyValueStore, LocalTable
+from session_store import AppendLogStore, JsonFileStore, SqliteStore
+
+BASE_DIR = Path(__file__).resolve().parent
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source", default=str(BASE_DIR / "booking_store.json"))
+    parser.add_argument("--engine", choices=["sqlite", "log", "kv", "dynamodb"], default="sqlite")
+    parser.add_argument("--target", default=None)
+    args = parser.parse_args()
+
+    source = Path(args.source)
+    if not source.exists():
+        raise SystemExit(f"source not found: {source}")
+    store = JsonFileStore(source).load_all()
+
+    if args.engine == "sqlite":
+        target = SqliteStore(args.target or source.with_suffix(".db"))
+        where = target.path
+    elif args.engine == "log":
+        target = AppendLogStore(args.target or source.with_suffix(".jsonl"))
+        where = target.path
+    elif args.engine == "kv":
+        where = args.target or source.with_suffix(".kv.db")
+        target = KeyValueStore(LocalTable(where))
+    else:
+        if not args.target:
+            raise SystemExit("--target must name the DynamoDB table")
+        where = f"DynamoDB table {args.target}"
+        target = KeyValueStore(DynamoTable(args.target))
+    # Claim the imported bookings' slots so later bookings can't double up.
+    target.set_claims(AvailabilityIndex(KBProvider(BASE_DIR / "clinic_kb.json").snapshot()).claim_keys)
+    target.save_all(store)
+
+    bookings = sum(len(s.get("bookings") or []) for s in store.values())
+    print(f"Imported {len(store)} sessions ({bookings} bookings) into {where}")
+
+
+if __name__ == "__main__":
+    main()
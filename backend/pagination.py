@@ -0,0 +1,67 @@
+"""Cursor pages and validators for a session's booking list.
+
+The ETag comes from the session version, which every booking change
+bumps, so an unchanged list is answered with 304 before the bookings are
+even read.
+"""
+import base64
+import json
+import zlib
+
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def bookings_etag(session_id: str, version: int, limit: int | None = None, cursor: str | None = None) -> str:
+    # The page parameters are part of the representation, so part of the tag.
+    page = f"{limit or 0}:{cursor or ''}"
+    return f'"{zlib.crc32(session_id.encode("utf-8")):08x}-{version}-{zlib.crc32(page.encode("utf-8")):08x}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    # Weak comparison, as RFC 9110 asks for If-None-Match.
+    return "*" in tags or etag in tags or ("W/" + etag) in tags
+
+
+def encode_cursor(index: int, booking_id: str) -> str:
+    raw = json.dumps([index, booking_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[int, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        index, booking_id = json.loads(raw)
+        return int(index), str(booking_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor("invalid cursor") from e
+
+
+def page_bookings(bookings: list, limit: int | None = None, cursor: str | None = None) -> tuple[list, str | None]:
+    """Slice ``bookings`` after ``cursor``; returns the page and the next cursor.
+
+    A cursor names the last booking already returned and where it was. If
+    that booking has moved (an earlier one was deleted) the page resumes
+    right after it; if it is gone, at the position it had.
+    """
+    start = 0
+    if cursor:
+        index, booking_id = decode_cursor(cursor)
+        if 0 <= index < len(bookings) and bookings[index].get("id") == booking_id:
+            start = index + 1
+        else:
+            start = next((i + 1 for i, b in enumerate(bookings) if b.get("id") == booking_id), min(index, len(bookings)))
+    if not limit:
+        return bookings[start:], None
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    page = bookings[start:start + limit]
+    end = start + len(page)
+    if end >= len(bookings) or not page:
+        return page, None
+    return page, encode_cursor(end - 1, page[-1].get("id") or "")
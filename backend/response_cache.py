@@ -0,0 +1,116 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+_PUNCT_RE = re.compile(r"[^\w\s]+")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_message(text: str) -> str:
+    """Lower-case, drop punctuation and collapse whitespace."""
+    return _SPACE_RE.sub(" ", _PUNCT_RE.sub(" ", text.lower())).strip()
+
+
+class ResponseCache:
+    """TTL + LRU cache of model replies, keyed on normalized text, KB version
+    and how many bookings the asking session holds (the prompt includes it).
+
+    The in-memory tier is an OrderedDict in LRU order. When ``disk_path`` is
+    set, entries are also written to a small SQLite table so they survive
+    restarts and are shared between workers; a memory miss falls back to it.
+    Each put drops the table's expired rows and keeps at most ``max_entries``,
+    the latest-expiring ones.
+    """
+
+    def __init__(self, max_entries: int = 512, ttl: float = 3600.0, disk_path: Path | str | None = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._mem: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._disk = None
+        if disk_path:
+            self._disk = sqlite3.connect(str(disk_path), check_same_thread=False, isolation_level=None)
+            self._disk.execute("PRAGMA journal_mode=WAL")
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._disk.execute("CREATE INDEX IF NOT EXISTS responses_by_expiry ON responses (expires_at)")
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(message: str, kb_version: str, bookings_count: int = 0) -> str:
+        raw = f"{kb_version}\x00{bookings_count}\x00{normalize_message(message)}"
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        now = time.time()
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._mem.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._mem[key]
+            if self._disk is not None:
+                row = self._disk.execute(
+                    "SELECT value, expires_at FROM responses WHERE key = ? AND expires_at > ?", (key, now)
+                ).fetchone()
+                if row is not None:
+                    self._remember(key, row[1], row[0])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return row[0]
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: str) -> None:
+        now = time.time()
+        expires_at = now + self.ttl
+        with self._lock:
+            self._remember(key, expires_at, value)
+            if self._disk is not None:
+                with self._disk:
+                    self._disk.execute("BEGIN")
+                    self._disk.execute(
+                        "INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)",
+                        (key, value, expires_at),
+                    )
+                    self._disk.execute("DELETE FROM responses WHERE expires_at <= ?", (now,))
+                    self._disk.execute(
+                        "DELETE FROM responses WHERE key IN "
+                        "(SELECT key FROM responses ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                        (self.max_entries,),
+                    )
+
+    def _remember(self, key: str, expires_at: float, value: str) -> None:
+        self._mem[key] = (expires_at, value)
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._mem.clear()
+            if self._disk is not None:
+                self._disk.execute("DELETE FROM responses")
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": len(self._mem),
+                "evictions": self.evictions,
+            }
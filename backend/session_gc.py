@@ -0,0 +1,214 @@
+"""Expiry of abandoned sessions.
+
+A session with no bookings expires ``draft_ttl`` seconds after its last
+activity if it holds a booking in progress, or ``empty_ttl`` seconds after
+it if it holds nothing but chat. Sessions with bookings never expire.
+
+Last activity is read from the record itself (the draft's ``updated_at``
+and the latest history turn), so every worker agrees on it. ``SessionSweeper``
+keeps the expiry deadlines in a min-heap fed by the store's change
+listener; each ``tick`` pops at most ``batch`` due sessions, re-checks
+them under the session lock and deletes those still expired. The delete
+is conditional on the version that re-check read, so a save from another
+worker in between keeps the session.
+"""
+import heapq
+import threading
+import time
+import traceback
+from datetime import datetime
+
+from session_store import SUMMARY_FIELD, VersionConflict
+
+DEFAULT_DRAFT_TTL = 7 * 24 * 3600
+DEFAULT_EMPTY_TTL = 24 * 3600
+DEFAULT_INTERVAL = 60.0
+DEFAULT_BATCH = 100
+
+
+def _epoch(value) -> float | None:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+    except ValueError:
+        return None
+
+
+def last_activity(session: dict) -> float | None:
+    draft = session.get("draft") or {}
+    history = session.get("history") or []
+    stamps = (
+        draft.get("updated_at"),
+        draft.get("created_at"),
+        history[-1].get("at") if history else None,
+        (session.get(SUMMARY_FIELD) or {}).get("last_at"),
+    )
+    times = [t for t in map(_epoch, stamps) if t is not None]
+    return max(times) if times else None
+
+
+def expiry_kind(session: dict) -> str | None:
+    """"draft", "empty", or None for sessions that never expire."""
+    if session.get("bookings"):
+        return None
+    details = (session.get("draft") or {}).get("details") or {}
+    return "draft" if any(details.values()) else "empty"
+
+
+class SessionSweeper:
+    """Incremental TTL eviction driven by a heap of deadlines.
+
+    The heap may hold stale entries for sessions written since they were
+    pushed; ``_deadlines`` has the live one and stale pops are skipped. It
+    is rebuilt when stale entries outnumber live ones.
+    """
+
+    def __init__(
+        self,
+        store,
+        draft_ttl: float = DEFAULT_DRAFT_TTL,
+        empty_ttl: float = DEFAULT_EMPTY_TTL,
+        batch: int = DEFAULT_BATCH,
+        interval: float = DEFAULT_INTERVAL,
+        on_evict=None,
+    ):
+        self.store = store
+        self.ttls = {"draft": draft_ttl, "empty": empty_ttl}
+        self.batch = max(batch, 1)
+        self.interval = interval
+        self.on_evict = on_evict
+        self._lock = threading.Lock()
+        self._heap: list[tuple[float, str]] = []
+        self._deadlines: dict[str, float] = {}
+        self._live: set[str] = set()
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_tick = 0.0
+        self.evictions = {"draft": 0, "empty": 0}
+        self.ticks = 0
+        self.last_tick_ms = 0.0
+
+    def deadline(self, session: dict, now: float | None = None) -> tuple[str | None, float | None]:
+        kind = expiry_kind(session)
+        ttl = self.ttls.get(kind) if kind else None
+        if not ttl:
+            return kind, None
+        return kind, (last_activity(session) or now or time.time()) + ttl
+
+    def seed(self, sessions: dict) -> None:
+        now = time.time()
+        with self._lock:
+            for session_id, session in sessions.items():
+                self._live.add(session_id)
+                self._schedule(session_id, self.deadline(session, now)[1])
+
+    def on_change(self, session_id: str, session: dict | None) -> None:
+        deadline = self.deadline(session)[1] if session is not None else None
+        with self._lock:
+            if session is None:
+                self._live.discard(session_id)
+            else:
+                self._live.add(session_id)
+            self._schedule(session_id, deadline)
+
+    def _schedule(self, session_id: str, deadline: float | None) -> None:
+        if deadline is None:
+            self._deadlines.pop(session_id, None)
+            return
+        if self._deadlines.get(session_id) == deadline:
+            return
+        self._deadlines[session_id] = deadline
+        heapq.heappush(self._heap, (deadline, session_id))
+        if len(self._heap) > 2 * len(self._deadlines) + 64:
+            self._heap = [(d, sid) for sid, d in self._deadlines.items()]
+            heapq.heapify(self._heap)
+
+    def _pop_due(self, now: float) -> list[str]:
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now and len(due) < self.batch:
+                deadline, session_id = heapq.heappop(self._heap)
+                if self._deadlines.get(session_id) != deadline:
+                    continue
+                del self._deadlines[session_id]
+                due.append(session_id)
+        return due
+
+    def tick(self, now: float | None = None) -> int:
+        """Evict up to ``batch`` expired sessions; returns how many went."""
+        started = time.perf_counter()
+        now = now or time.time()
+        evicted = 0
+        for session_id in self._pop_due(now):
+            with self.store.lock(session_id):
+                session = self.store.get(session_id)
+                if session is None:
+                    continue
+                # Another worker may have touched it since it was scheduled.
+                kind, deadline = self.deadline(session, now)
+                if deadline is None or deadline > now:
+                    with self._lock:
+                        self._schedule(session_id, deadline)
+                    continue
+                try:
+                    self.store.delete(session_id, expected_version=session.get("version", 0))
+                except VersionConflict:
+                    # Saved since the re-check; schedule from what is stored now.
+                    session = self.store.get(session_id)
+                    with self._lock:
+                        self._schedule(session_id, self.deadline(session, now)[1] if session else None)
+                    continue
+            with self._lock:
+                self._live.discard(session_id)
+            self.evictions[kind] += 1
+            evicted += 1
+            if self.on_evict is not None:
+                self.on_evict(session_id)
+        self.ticks += 1
+        self._last_tick = now
+        self.last_tick_ms = (time.perf_counter() - started) * 1000
+        return evicted
+
+    def maybe_tick(self, now: float | None = None) -> int:
+        """``tick`` if ``interval`` has passed since the last one."""
+        now = now or time.time()
+        if now - self._last_tick < self.interval:
+            return 0
+        return self.tick(now)
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="session-gc", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.tick()
+            except Exception:
+                traceback.print_exc()
+
+    def stats(self) -> dict:
+        with self._lock:
+            # Drop stale entries off the top so the next deadline is a live one.
+            while self._heap and self._deadlines.get(self._heap[0][1]) != self._heap[0][0]:
+                heapq.heappop(self._heap)
+            next_due = self._heap[0][0] if self._heap else None
+            return {
+                "sessions": len(self._live),
+                "expiring": len(self._deadlines),
+                "heap_entries": len(self._heap),
+                "next_due_in_s": round(max(next_due - time.time(), 0.0), 1) if next_due is not None else None,
+                "evictions": dict(self.evictions),
+                "ticks": self.ticks,
+                "last_tick_ms": round(self.last_tick_ms, 3),
+                "ttl_s": dict(self.ttls),
+            }
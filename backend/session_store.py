@@ -0,0 +1,1148 @@
+import atexit
+import errno
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: locks only cover threads of one process
+    fcntl = None
+
+LOCK_STRIPES = 256
+
+# Session fields owned by history.py: the summary of turns rolled out of
+# ``history`` and the turns still waiting to be folded into it.
+SUMMARY_FIELD = "history_summary"
+ROLLUP_FIELD = "history_rollup"
+
+
+class VersionConflict(Exception):
+    """The stored session changed since the caller read it."""
+
+    def __init__(self, session_id: str, expected: int, actual: int):
+        super().__init__(f"session {session_id}: expected version {expected}, found {actual}")
+        self.session_id = session_id
+        self.expected = expected
+        self.actual = actual
+
+
+class SlotTaken(Exception):
+    """A booking's slot is already held by another booking (see ``set_claims``)."""
+
+    def __init__(self, session_id: str, slot: tuple, holder: str):
+        super().__init__(f"session {session_id}: slot {slot} is held by session {holder}")
+        self.session_id = session_id
+        self.slot = slot
+        self.holder = holder
+
+
+class StoreCorruptError(Exception):
+    """The store file exists but cannot be parsed."""
+
+
+def _version(session: dict | None) -> int:
+    return int((session or {}).get("version") or 0)
+
+
+def _check_version(session_id: str, expected: int | None, actual: int) -> None:
+    if expected is not None and expected != actual:
+        raise VersionConflict(session_id, expected, actual)
+
+
+def _encode(obj) -> str:
+    return json.dumps(obj, ensure_ascii=True, separators=(",", ":"))
+
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    # Readers only ever see the old file or the complete new one.
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+class SessionLocks:
+    """Striped per-session locks shared by threads and worker processes.
+
+    A session id hashes to one of ``stripes`` slots. Each slot is an RLock
+    for the threads of this process plus an ``fcntl`` record lock on the
+    matching byte of ``lock_path`` for other processes, so writers to
+    different sessions rarely wait on each other. ``all()`` takes every
+    slot, for whole-store rewrites. Without ``fcntl`` (or a ``lock_path``)
+    only the in-process half applies.
+    """
+
+    def __init__(self, lock_path: Path | str | None, stripes: int = LOCK_STRIPES):
+        self.lock_path = Path(lock_path) if lock_path else None
+        self.stripes = stripes
+        self._local = [threading.RLock() for _ in range(stripes)]
+        self._depth = [0] * stripes
+        self._all_depth = 0
+        self._held = threading.local()
+        self._fd = None
+        self._pid = None
+
+    def _file_lock(self, exclusive: bool, start: int, length: int) -> None:
+        if fcntl is None or self.lock_path is None:
+            return
+        if self._fd is None or self._pid != os.getpid():
+            self._fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+            self._pid = os.getpid()
+        if not exclusive:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, length, start, os.SEEK_SET)
+            return
+        # Record locks belong to the process, not the thread: a blocking wait
+        # while a sibling thread holds another stripe looks like a deadlock to
+        # the kernel (EDEADLK). Poll instead of blocking.
+        delay = 0.0005
+        while True:
+            try:
+                fcntl.lockf(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB, length, start, os.SEEK_SET)
+                return
+            except OSError as e:
+                if e.errno not in (errno.EACCES, errno.EAGAIN):
+                    raise
+            time.sleep(delay)
+            delay = min(delay * 2, 0.02)
+
+    def stripe(self, session_id: str) -> int:
+        return zlib.crc32(session_id.encode("utf-8")) % self.stripes
+
+    def held(self) -> bool:
+        """True if the calling thread holds any stripe."""
+        return getattr(self._held, "count", 0) > 0
+
+    def _enter(self) -> None:
+        self._held.count = getattr(self._held, "count", 0) + 1
+
+    def _exit(self) -> None:
+        self._held.count -= 1
+
+    @contextmanager
+    def session(self, session_id: str):
+        s = self.stripe(session_id)
+        with self._local[s]:
+            if self._depth[s] == 0 and self._all_depth == 0:
+                self._file_lock(True, s, 1)
+            self._depth[s] += 1
+            self._enter()
+            try:
+                yield
+            finally:
+                self._exit()
+                self._depth[s] -= 1
+                if self._depth[s] == 0 and self._all_depth == 0:
+                    self._file_lock(False, s, 1)
+
+    @contextmanager
+    def all(self):
+        # Never call this while holding a single stripe: two threads doing so
+        # would each wait for the stripe the other one holds.
+        with ExitStack() as stack:
+            for lock in self._local:
+                stack.enter_context(lock)
+            if self._all_depth == 0:
+                self._file_lock(True, 0, 0)
+            self._all_depth += 1
+            self._enter()
+            try:
+                yield
+            finally:
+                self._exit()
+                self._all_depth -= 1
+                if self._all_depth == 0:
+                    self._file_lock(False, 0, 0)
+
+
+def _lock_path(path: Path) -> Path:
+    return path.with_name(path.name + ".lock")
+
+
+class SessionStore:
+    """Storage engine for booking sessions keyed by session_id.
+
+    ``put`` stamps the session with a new ``version``. Passing the version the
+    caller read as ``expected_version`` makes the write conditional: it raises
+    ``VersionConflict`` if another request saved the session in between.
+    ``delete`` takes the same argument.
+
+    Listeners added with ``add_listener`` are called as ``fn(session_id,
+    session_or_None)`` after every change the engine sees, including other
+    workers' writes where the engine can observe them (see ``refresh``).
+    """
+
+    locks: SessionLocks
+    _listeners: tuple = ()
+    _claims = None
+    _sizes = threading.local()
+
+    def lock(self, session_id: str):
+        return self.locks.session(session_id)
+
+    def last_size(self) -> int | None:
+        """Encoded bytes of the session this thread last got or put.
+
+        Engines report the encoding they already read or wrote, so metrics
+        need not serialise the session again; None where an engine has no
+        per-session encoding (``JsonFileStore``).
+        """
+        return getattr(self._sizes, "value", None)
+
+    def _sized(self, size: int | None) -> None:
+        self._sizes.value = size
+
+    def get(self, session_id: str) -> dict | None:
+        raise NotImplementedError
+
+    def put(self, session_id: str, session: dict, expected_version: int | None = None) -> int:
+        raise NotImplementedError
+
+    def delete(self, session_id: str, expected_version: int | None = None) -> None:
+        raise NotImplementedError
+
+    def load_all(self) -> dict:
+        raise NotImplementedError
+
+    def save_all(self, store: dict) -> None:
+        raise NotImplementedError
+
+    def version(self, session_id: str) -> int:
+        return _version(self.get(session_id))
+
+    def write_batch(self, changes: dict[str, str | None]) -> None:
+        """Persist encoded, already-versioned sessions (None deletes) with one sync."""
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {"durability": "sync"}
+
+    def add_listener(self, fn) -> None:
+        self._listeners = (*self._listeners, fn)
+
+    def _notify(self, session_id: str, session: dict | None) -> None:
+        for fn in self._listeners:
+            fn(session_id, session)
+
+    def refresh(self) -> None:
+        """Pick up writes made by other workers, notifying listeners."""
+
+    def set_claims(self, fn) -> None:
+        """Make booking writes claim their slots durably, where the engine can.
+
+        ``fn(booking)`` returns the ``(location, iso_date, minute)`` slots a
+        booking holds. The sqlite and key-value engines store one claim per
+        slot in the same transaction as the booking; a write that would take
+        a slot held by another booking raises ``SlotTaken`` and changes
+        nothing. The file engines only have the in-process availability index.
+        """
+        self._claims = fn
+
+    def _slots(self, booking: dict) -> list:
+        return list(self._claims(booking)) if self._claims is not None else []
+
+    # Booking-level operations. Engines with real indexes override these;
+    # the defaults go through the whole session under its lock.
+
+    def exists(self, session_id: str) -> bool:
+        return self.get(session_id) is not None
+
+    def list_bookings(self, session_id: str) -> list:
+        session = self.get(session_id) or {}
+        return session.get("bookings") or []
+
+    def get_booking(self, session_id: str, booking_id: str) -> dict | None:
+        for b in self.list_bookings(session_id):
+            if b.get("id") == booking_id:
+                return b
+        return None
+
+    def put_booking(self, session_id: str, booking: dict) -> bool:
+        with self.lock(session_id):
+            session = self.get(session_id)
+            if not session:
+                return False
+            bookings = session.get("bookings") or []
+            for i, b in enumerate(bookings):
+                if b.get("id") == booking.get("id"):
+                    bookings[i] = booking
+                    session["bookings"] = bookings
+                    self.put(session_id, session)
+                    return True
+            return False
+
+    def delete_booking(self, session_id: str, booking_id: str) -> bool:
+        with self.lock(session_id):
+            session = self.get(session_id)
+            if not session:
+                return False
+            bookings = session.get("bookings") or []
+            new_bookings = [b for b in bookings if b.get("id") != booking_id]
+            if len(new_bookings) == len(bookings):
+                return False
+            session["bookings"] = new_bookings
+            self.put(session_id, session)
+            return True
+
+    def clear_history(self, session_id: str) -> bool:
+        with self.lock(session_id):
+            session = self.get(session_id)
+            if not session:
+                return False
+            session["history"] = []
+            session.pop(SUMMARY_FIELD, None)
+            session.pop(ROLLUP_FIELD, None)
+            self.put(session_id, session)
+            return True
+
+
+class JsonFileStore(SessionStore):
+    """Legacy engine: the whole store is one pretty-printed JSON document.
+
+    Every write rewrites the document, so every writer takes all lock stripes.
+    """
+
+    def __init__(self, path: Path | str):
+        self.path = Path(path)
+        self.locks = SessionLocks(_lock_path(self.path))
+
+    def lock(self, session_id: str):
+        return self.locks.all()
+
+    def load_all(self) -> dict:
+        if not self.path.exists():
+            return {}
+        try:
+            return json.loads(self.path.read_text(encoding="utf-8"))
+        except ValueError as e:
+            # Writes are atomic, so this is real damage; refuse to treat it as empty.
+            raise StoreCorruptError(f"{self.path}: {e}") from e
+
+    def save_all(self, store: dict) -> None:
+        with self.locks.all():
+            _atomic_write(self.path, json.dumps(store, indent=2, ensure_ascii=True).encode("utf-8"))
+
+    def get(self, session_id: str) -> dict | None:
+        self._sized(None)
+        return self.load_all().get(session_id)
+
+    def put(self, session_id: str, session: dict, expected_version: int | None = None) -> int:
+        self._sized(None)
+        with self.locks.all():
+            store = self.load_all()
+            current = _version(store.get(session_id))
+            _check_version(session_id, expected_version, current)
+            store[session_id] = {**session, "version": current + 1}
+            self.save_all(store)
+            self._notify(session_id, store[session_id])
+        session["version"] = current + 1
+        return current + 1
+
+    def delete(self, session_id: str, expected_version: int | None = None) -> None:
+        with self.locks.all():
+            store = self.load_all()
+            _check_version(session_id, expected_version, _version(store.get(session_id)))
+            if store.pop(session_id, None) is not None:
+                self.save_all(store)
+                self._notify(session_id, None)
+
+    def write_batch(self, changes: dict[str, str | None]) -> None:
+        with self.locks.all():
+            store = self.load_all()
+            for session_id, raw in changes.items():
+                if raw is None:
+                    store.pop(session_id, None)
+                else:
+                    store[session_id] = json.loads(raw)
+            self.save_all(store)
+            for session_id in changes:
+                self._notify(session_id, store.get(session_id))
+
+
+class AppendLogStore(SessionStore):
+    """Append-only log of per-session records with an in-memory index.
+
+    Every mutation appends one compact line for the touched session only.
+    The index maps session_id to the encoded session, so reads hand out a
+    fresh copy and writes reuse the encoding for the log line. Once dead
+    records outnumber live ones by ``compact_ratio`` the log is rewritten
+    with a single record per live session.
+
+    Writers hold the session's lock stripe while they catch up, check the
+    version and append, so workers sharing the log serialise per session.
+    Compaction and ``save_all`` hold every stripe and replace the file
+    atomically; other workers notice the new inode and reload.
+    """
+
+    def __init__(
+        self,
+        path: Path | str,
+        seed_path: Path | str | None = None,
+        compact_ratio: float = 4.0,
+        compact_min_records: int = 256,
+        fsync: bool = True,
+    ):
+        self.path = Path(path)
+        self.compact_ratio = compact_ratio
+        self.compact_min_records = compact_min_records
+        self.fsync = fsync
+        self.locks = SessionLocks(_lock_path(self.path))
+        self._lock = threading.RLock()
+        self._index: dict[str, str] = {}
+        self._versions: dict[str, int] = {}
+        self._records = 0
+        self._offset = 0
+        self._ident = None
+        self._fh = None
+        with self.locks.all():
+            if not self.path.exists() and seed_path and Path(seed_path).exists():
+                self.save_all(JsonFileStore(seed_path).load_all())
+            self._repair_tail()
+        self._reload()
+
+    def _repair_tail(self) -> None:
+        # A crash mid-append can leave a partial last line; drop it so the
+        # next record does not get glued onto it. Only safe with all stripes
+        # held, when no other worker can be mid-append.
+        if not self.path.exists():
+            return
+        with open(self.path, "rb+") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)
+
+    def _reload(self) -> None:
+        self._index = {}
+        self._versions = {}
+        self._records = 0
+        self._offset = 0
+        self._ident = None
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+        self._catch_up()
+
+    def _catch_up(self) -> None:
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return
+        ident = (st.st_dev, st.st_ino)
+        if self._fh is not None and (ident != self._ident or st.st_size < self._offset):
+            # Another process compacted the log; start over from the new file.
+            self._reload()
+            return
+        if self._fh is None:
+            # Keeping the log open pins its inode, so a later compaction can't
+            # reuse the number and make a replaced file look unchanged.
+            try:
+                self._fh = open(self.path, "rb")
+            except FileNotFoundError:
+                return
+            fst = os.fstat(self._fh.fileno())
+            self._ident = (fst.st_dev, fst.st_ino)
+        elif st.st_size == self._offset:
+            return
+        self._fh.seek(self._offset)
+        chunk = self._fh.read()
+        end = chunk.rfind(b"\n") + 1
+        for line in chunk[:end].splitlines():
+            self._apply(line)
+        self._offset += end
+
+    def _apply(self, line: bytes) -> None:
+        if not line.strip():
+            return
+        try:
+            rec = json.loads(line)
+        except ValueError:
+            return
+        self._records += 1
+        if rec.get("op") == "put":
+            self._index[rec["id"]] = _encode(rec["data"])
+            self._versions[rec["id"]] = _version(rec["data"])
+            self._notify(rec["id"], rec["data"])
+        elif rec.get("op") == "del":
+            self._index.pop(rec["id"], None)
+            self._versions.pop(rec["id"], None)
+            self._notify(rec["id"], None)
+
+    def _append(self, lines: list[str]) -> None:
+        # One O_APPEND write per call, so concurrent writers never interleave.
+        payload = "".join(line + "\n" for line in lines).encode("utf-8")
+        with open(self.path, "ab") as f:
+            f.write(payload)
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        self._catch_up()
+
+    def _maybe_compact(self) -> None:
+        if self.locks.held():
+            return
+        with self._lock:
+            due = self._records >= self.compact_min_records and self._records > self.compact_ratio * max(len(self._index), 1)
+        if due:
+            self.compact()
+
+    def get(self, session_id: str) -> dict | None:
+        with self._lock:
+            self._catch_up()
+            raw = self._index.get(session_id)
+        self._sized(len(raw) if raw is not None else 0)
+        return json.loads(raw) if raw is not None else None
+
+    def put(self, session_id: str, session: dict, expected_version: int | None = None) -> int:
+        with self.lock(session_id):
+            with self._lock:
+                self._catch_up()
+                current = self._versions.get(session_id, 0)
+            _check_version(session_id, expected_version, current)
+            data = _encode({**session, "version": current + 1})
+            line = '{"op":"put","id":' + _encode(session_id) + ',"data":' + data + "}"
+            with self._lock:
+                self._append([line])
+        self._sized(len(data))
+        session["version"] = current + 1
+        self._maybe_compact()
+        return current + 1
+
+    def delete(self, session_id: str, expected_version: int | None = None) -> None:
+        with self.lock(session_id):
+            with self._lock:
+                self._catch_up()
+                _check_version(session_id, expected_version, self._versions.get(session_id, 0))
+                if session_id not in self._index:
+                    return
+                self._append([_encode({"op": "del", "id": session_id})])
+        self._maybe_compact()
+
+    def version(self, session_id: str) -> int:
+        with self._lock:
+            self._catch_up()
+            return self._versions.get(session_id, 0)
+
+    def refresh(self) -> None:
+        # Every record, ours or another worker's, reaches listeners via _apply.
+        with self._lock:
+            self._catch_up()
+
+    def write_batch(self, changes: dict[str, str | None]) -> None:
+        with self._lock:
+            self._catch_up()
+            lines = []
+            for session_id, raw in changes.items():
+                if raw is not None:
+                    lines.append('{"op":"put","id":' + _encode(session_id) + ',"data":' + raw + "}")
+                elif session_id in self._index:
+                    lines.append(_encode({"op": "del", "id": session_id}))
+            if lines:
+                self._append(lines)
+        self._maybe_compact()
+
+    def load_all(self) -> dict:
+        with self._lock:
+            self._catch_up()
+            return {sid: json.loads(raw) for sid, raw in self._index.items()}
+
+    def save_all(self, store: dict) -> None:
+        with self.locks.all(), self._lock:
+            self._write_snapshot({sid: _encode(s) for sid, s in store.items()})
+
+    def compact(self) -> None:
+        with self.locks.all(), self._lock:
+            self._catch_up()
+            self._write_snapshot(dict(self._index))
+
+    def _write_snapshot(self, encoded: dict[str, str]) -> None:
+        lines = ['{"op":"put","id":' + _encode(sid) + ',"data":' + raw + "}\n" for sid, raw in encoded.items()]
+        if self._fh is not None:
+            # Windows refuses to replace a file that is still open.
+            self._fh.close()
+            self._fh = None
+        _atomic_write(self.path, "".join(lines).encode("utf-8"))
+        self._reload()
+
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    extra TEXT NOT NULL DEFAULT '{}'
+);
+CREATE TABLE IF NOT EXISTS drafts (
+    session_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS bookings (
+    session_id TEXT NOT NULL,
+    booking_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (session_id, booking_id)
+);
+CREATE INDEX IF NOT EXISTS bookings_by_session ON bookings (session_id, seq);
+CREATE TABLE IF NOT EXISTS history (
+    session_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (session_id, seq)
+);
+CREATE TABLE IF NOT EXISTS slots (
+    location TEXT NOT NULL,
+    date TEXT NOT NULL,
+    slot INTEGER NOT NULL,
+    session_id TEXT NOT NULL,
+    booking_id TEXT NOT NULL,
+    PRIMARY KEY (location, date, slot)
+);
+CREATE INDEX IF NOT EXISTS slots_by_booking ON slots (session_id, booking_id);
+"""
+
+
+class SqliteStore(SessionStore):
+    """SQLite engine with one row per session, draft, booking and history turn.
+
+    Uses WAL mode and a single connection per worker process; threads in the
+    same worker share it under a lock. Booking endpoints run as one indexed
+    query on ``(session_id, booking_id)`` instead of touching the session.
+    Version checks run inside ``BEGIN IMMEDIATE``, which already serialises
+    writers across processes. Slot claims (``set_claims``) are rows of
+    ``slots``, whose primary key lets one booking at a time hold a slot.
+    """
+
+    def __init__(self, path: Path | str, synchronous: str = "FULL"):
+        self.path = Path(path)
+        self.synchronous = synchronous
+        self.locks = SessionLocks(_lock_path(self.path))
+        self._lock = threading.RLock()
+        self._conn = None
+        self._pid = None
+        with self._lock:
+            self._db().executescript(_SQLITE_SCHEMA)
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(f"PRAGMA synchronous={self.synchronous}")
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def exists(self, session_id: str) -> bool:
+        with self._lock:
+            row = self._db().execute("SELECT 1 FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return row is not None
+
+    def get(self, session_id: str) -> dict | None:
+        with self._lock:
+            db = self._db()
+            row = db.execute("SELECT extra FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            if row is None:
+                self._sized(0)
+                return None
+            draft = db.execute("SELECT data FROM drafts WHERE session_id = ?", (session_id,)).fetchone()
+            bookings = db.execute(
+                "SELECT data FROM bookings WHERE session_id = ? ORDER BY seq", (session_id,)
+            ).fetchall()
+            history = db.execute(
+                "SELECT data FROM history WHERE session_id = ? ORDER BY seq", (session_id,)
+            ).fetchall()
+        self._sized(sum(len(r[0]) for r in (row, draft, *bookings, *history) if r is not None))
+        session = json.loads(row[0])
+        if draft is not None:
+            session["draft"] = json.loads(draft[0])
+        session["bookings"] = [json.loads(r[0]) for r in bookings]
+        session["history"] = [json.loads(r[0]) for r in history]
+        return session
+
+    def _claim(self, db: sqlite3.Connection, session_id: str, booking: dict, strict: bool = True) -> None:
+        for slot in self._slots(booking):
+            try:
+                db.execute(
+                    "INSERT INTO slots (location, date, slot, session_id, booking_id) VALUES (?, ?, ?, ?, ?)",
+                    (*slot, session_id, booking.get("id") or ""),
+                )
+            except sqlite3.IntegrityError:
+                if not strict:
+                    continue
+                row = db.execute(
+                    "SELECT session_id FROM slots WHERE location = ? AND date = ? AND slot = ?", slot
+                ).fetchone()
+                raise SlotTaken(session_id, tuple(slot), row[0] if row else session_id) from None
+
+    def set_claims(self, fn) -> None:
+        super().set_claims(fn)
+        with self._lock:
+            db = self._db()
+            with _transaction(db):
+                if db.execute("SELECT 1 FROM slots LIMIT 1").fetchone() is None:
+                    # Claim the bookings written before claims were on.
+                    for session_id, data in db.execute("SELECT session_id, data FROM bookings").fetchall():
+                        self._claim(db, session_id, json.loads(data), strict=False)
+
+    def _write_session(self, db: sqlite3.Connection, session_id: str, session: dict, strict: bool = True) -> int:
+        """Write ``session``'s rows; returns their encoded size."""
+        extra = _encode({k: v for k, v in session.items() if k not in ("draft", "bookings", "history")})
+        db.execute(
+            "INSERT INTO sessions (session_id, extra) VALUES (?, ?) "
+            "ON CONFLICT(session_id) DO UPDATE SET extra = excluded.extra",
+            (session_id, extra),
+        )
+        size = len(extra)
+        if "draft" in session:
+            draft = _encode(session["draft"])
+            db.execute(
+                "INSERT INTO drafts (session_id, data) VALUES (?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET data = excluded.data",
+                (session_id, draft),
+            )
+            size += len(draft)
+        bookings = [
+            (session_id, b.get("id") or f"#{i}", i, _encode(b)) for i, b in enumerate(session.get("bookings") or [])
+        ]
+        db.execute("DELETE FROM bookings WHERE session_id = ?", (session_id,))
+        db.executemany("INSERT INTO bookings (session_id, booking_id, seq, data) VALUES (?, ?, ?, ?)", bookings)
+        db.execute("DELETE FROM slots WHERE session_id = ?", (session_id,))
+        for b in session.get("bookings") or []:
+            self._claim(db, session_id, b, strict)
+        history = [(session_id, i, _encode(h)) for i, h in enumerate(session.get("history") or [])]
+        db.execute("DELETE FROM history WHERE session_id = ?", (session_id,))
+        db.executemany("INSERT INTO history (session_id, seq, data) VALUES (?, ?, ?)", history)
+        return size + sum(len(r[-1]) for r in bookings) + sum(len(r[-1]) for r in history)
+
+    def _delete_session(self, db: sqlite3.Connection, session_id: str) -> None:
+        for table in ("sessions", "drafts", "bookings", "history", "slots"):
+            db.execute(f"DELETE FROM {table} WHERE session_id = ?", (session_id,))
+
+    def _current_version(self, db: sqlite3.Connection, session_id: str) -> int:
+        row = db.execute("SELECT extra FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        return _version(json.loads(row[0])) if row else 0
+
+    def _bump_version(self, db: sqlite3.Connection, session_id: str, drop: tuple = ()) -> None:
+        row = db.execute("SELECT extra FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+        if row is None:
+            return
+        extra = json.loads(row[0])
+        for key in drop:
+            extra.pop(key, None)
+        extra["version"] = _version(extra) + 1
+        db.execute("UPDATE sessions SET extra = ? WHERE session_id = ?", (_encode(extra), session_id))
+
+    def put(self, session_id: str, session: dict, expected_version: int | None = None) -> int:
+        with self._lock:
+            db = self._db()
+            with _transaction(db):
+                current = self._current_version(db, session_id)
+                _check_version(session_id, expected_version, current)
+                size = self._write_session(db, session_id, {**session, "version": current + 1})
+        self._sized(size)
+        session["version"] = current + 1
+        self._notify(session_id, session)
+        return current + 1
+
+    def delete(self, session_id: str, expected_version: int | None = None) -> None:
+        with self._lock:
+            db = self._db()
+            with _transaction(db):
+                _check_version(session_id, expected_version, self._current_version(db, session_id))
+                self._delete_session(db, session_id)
+        self._notify(session_id, None)
+
+    def _notify_stored(self, session_id: str) -> None:
+        # Booking-level writes never load the session; only do so for listeners.
+        if self._listeners:
+            self._notify(session_id, self.get(session_id))
+
+    def version(self, session_id: str) -> int:
+        with self._lock:
+            return self._current_version(self._db(), session_id)
+
+    def write_batch(self, changes: dict[str, str | None]) -> None:
+        with self._lock:
+            db = self._db()
+            with _transaction(db):
+                for session_id, raw in changes.items():
+                    if raw is None:
+                        self._delete_session(db, session_id)
+                    else:
+                        self._write_session(db, session_id, json.loads(raw))
+        for session_id, raw in changes.items():
+            self._notify(session_id, json.loads(raw) if raw is not None else None)
+
+    def load_all(self) -> dict:
+        with self._lock:
+            ids = [r[0] for r in self._db().execute("SELECT session_id FROM sessions").fetchall()]
+        return {sid: self.get(sid) for sid in ids}
+
+    def save_all(self, store: dict) -> None:
+        with self._lock:
+            db = self._db()
+            with _transaction(db):
+                dropped = {r[0] for r in db.execute("SELECT session_id FROM sessions").fetchall()} - store.keys()
+                for table in ("sessions", "drafts", "bookings", "history", "slots"):
+                    db.execute(f"DELETE FROM {table}")
+                for sid, session in store.items():
+                    # An import keeps what was booked, overlaps included.
+                    self._write_session(db, sid, session, strict=False)
+        for sid in dropped:
+            self._notify(sid, None)
+        for sid, session in store.items():
+            self._notify(sid, session)
+
+    def list_bookings(self, session_id: str) -> list:
+        with self._lock:
+            rows = self._db().execute(
+                "SELECT data FROM bookings WHERE session_id = ? ORDER BY seq", (session_id,)
+            ).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def get_booking(self, session_id: str, booking_id: str) -> dict | None:
+        with self._lock:
+            row = self._db().execute(
+                "SELECT data FROM bookings WHERE session_id = ? AND booking_id = ?", (session_id, booking_id)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_booking(self, session_id: str, booking: dict) -> bool:
+        with self._lock:
+            db = self._db()
+            with _transaction(db):
+                cur = db.execute(
+                    "UPDATE bookings SET data = ? WHERE session_id = ? AND booking_id = ?",
+                    (_encode(booking), session_id, booking.get("id")),
+                )
+                if cur.rowcount > 0:
+                    db.execute("DELETE FROM slots WHERE session_id = ? AND booking_id = ?", (session_id, booking.get("id")))
+                    self._claim(db, session_id, booking)
+                    self._bump_version(db, session_id)
+        if cur.rowcount > 0:
+            self._notify_stored(session_id)
+        return cur.rowcount > 0
+
+    def delete_booking(self, session_id: str, booking_id: str) -> bool:
+        with self._lock:
+            db = self._db()
+            with _transaction(db):
+                cur = db.execute(
+                    "DELETE FROM bookings WHERE session_id = ? AND booking_id = ?", (session_id, booking_id)
+                )
+                if cur.rowcount > 0:
+                    db.execute("DELETE FROM slots WHERE session_id = ? AND booking_id = ?", (session_id, booking_id))
+                    self._bump_version(db, session_id)
+        if cur.rowcount > 0:
+            self._notify_stored(session_id)
+        return cur.rowcount > 0
+
+    def clear_history(self, session_id: str) -> bool:
+        with self._lock:
+            db = self._db()
+            with _transaction(db):
+                if db.execute("SELECT 1 FROM sessions WHERE session_id = ?", (session_id,)).fetchone() is None:
+                    return False
+                db.execute("DELETE FROM history WHERE session_id = ?", (session_id,))
+                self._bump_version(db, session_id, drop=(SUMMARY_FIELD, ROLLUP_FIELD))
+        self._notify_stored(session_id)
+        return True
+
+
+class _transaction:
+    def __init__(self, db: sqlite3.Connection):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute("BEGIN IMMEDIATE")
+        return self.db
+
+    def __exit__(self, exc_type, exc, tb):
+        self.db.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+class GroupCommitStore(SessionStore):
+    """Write-behind wrapper that batches writes to another engine.
+
+    ``put`` and ``delete`` land in an in-memory overlay that reads consult
+    before the inner engine. A background thread hands the overlay to
+    ``inner.write_batch`` once ``max_batch`` sessions are dirty or
+    ``flush_ms`` after the first one, so a batch costs one fsync.
+
+    * ``group``: ``put`` returns once the batch holding its write is durable;
+      concurrent writers share the fsync.
+    * ``async``: ``put`` returns at once; a crash loses everything not yet
+      durable: the writes of up to one ``flush_ms`` window plus the batch in
+      flight, and every write since while the inner engine keeps failing.
+
+    Session locks and version checks cover this worker's overlay plus
+    whatever other workers have flushed, so across workers they are only as
+    fresh as the last batch. Use ``sync`` when several workers write to the
+    same sessions. ``refresh`` asks the inner engine for other workers'
+    writes and passes them on to listeners, except for sessions this worker
+    has in its overlay or in flight, whose copy is newer.
+
+    A write the inner engine refuses with ``SlotTaken`` can never land, so it
+    is dropped from the overlay; a ``group`` writer gets the error, an
+    ``async`` one only sees listeners told the stored state.
+    """
+
+    def __init__(self, inner: SessionStore, durability: str = "group", flush_ms: float = 5.0, max_batch: int = 64):
+        if durability not in ("group", "async"):
+            raise ValueError(f"unknown durability level: {durability}")
+        self.inner = inner
+        # Own in-process locks: a group-mode put can wait for the flusher
+        # while its caller holds a session lock, and the flusher may need
+        # every inner stripe (log compaction).
+        self.locks = SessionLocks(None)
+        self.durability = durability
+        self.flush_ms = flush_ms
+        self.max_batch = max_batch
+        self._cond = threading.Condition()
+        self._pending: dict[str, str | None] = {}
+        self._pending_versions: dict[str, int] = {}
+        self._inflight: dict[str, str | None] = {}
+        self._rejected: dict[str, SlotTaken] = {}
+        self._seq = 0
+        self._durable = 0
+        self._urgent = False
+        self._closed = False
+        self._error: Exception | None = None
+        self._thread = None
+        self._pid = None
+        self.batches = 0
+        self.flushed = 0
+        inner.add_listener(self._inner_changed)
+        atexit.register(self.close)
+
+    def _ensure_flusher(self) -> None:
+        if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name="store-flusher", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending and not self._closed:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                # Give concurrent writers flush_ms to join this batch.
+                deadline = time.monotonic() + self.flush_ms / 1000.0
+                while len(self._pending) < self.max_batch and not (self._urgent or self._closed):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = dict(self._pending)
+                upto = self._seq
+                self._urgent = False
+                self._inflight = batch
+            try:
+                self.inner.write_batch(batch)
+            except SlotTaken as e:
+                with self._cond:
+                    self._inflight = {}
+                    if e.session_id in self._pending and self._pending[e.session_id] is batch.get(e.session_id):
+                        del self._pending[e.session_id]
+                        self._pending_versions.pop(e.session_id, None)
+                    if self.durability == "group":
+                        self._rejected[e.session_id] = e
+                    if not self._pending:
+                        self._durable = upto
+                    self._cond.notify_all()
+                self._notify(e.session_id, self.inner.get(e.session_id))
+                continue
+            except Exception as e:
+                # Keep the overlay and retry; group-mode writers see the error.
+                with self._cond:
+                    self._inflight = {}
+                    self._error = e
+                    self._cond.notify_all()
+                    if self._closed:
+                        return
+                time.sleep(max(self.flush_ms, 50.0) / 1000.0)
+                continue
+            with self._cond:
+                self._inflight = {}
+                for session_id, raw in batch.items():
+                    # Leave entries rewritten while the batch was in flight.
+                    if session_id in self._pending and self._pending[session_id] is raw:
+                        del self._pending[session_id]
+                        self._pending_versions.pop(session_id, None)
+                self._durable = upto
+                self._error = None
+                self.batches += 1
+                self.flushed += len(batch)
+                self._cond.notify_all()
+
+    def _inner_changed(self, session_id: str, session: dict | None) -> None:
+        # Our own batches echo back here too; listeners already saw those.
+        with self._cond:
+            if session_id in self._pending or session_id in self._inflight:
+                return
+        self._notify(session_id, session)
+
+    def refresh(self) -> None:
+        self.inner.refresh()
+
+    def set_claims(self, fn) -> None:
+        self.inner.set_claims(fn)
+
+    def _enqueue(self, session_id: str, raw: str | None, version: int) -> int:
+        with self._cond:
+            self._pending[session_id] = raw
+            self._pending_versions[session_id] = version
+            self._seq += 1
+            self._ensure_flusher()
+            self._cond.notify_all()
+            return self._seq
+
+    def _wait_durable(self, ticket: int) -> None:
+        with self._cond:
+            while self._durable < ticket:
+                if self._error is not None:
+                    raise self._error
+                self._cond.wait()
+
+    def flush(self) -> None:
+        """Block until everything written so far is durable."""
+        with self._cond:
+            if not self._pending:
+                return
+            ticket = self._seq
+            self._urgent = True
+            self._ensure_flusher()
+            self._cond.notify_all()
+        self._wait_durable(ticket)
+
+    def close(self) -> None:
+        self.flush()
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join()
+        self.inner.close()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "durability": self.durability,
+                "pending": len(self._pending),
+                "batches": self.batches,
+                "flushed": self.flushed,
+                "avg_batch": round(self.flushed / self.batches, 2) if self.batches else 0.0,
+            }
+
+    def version(self, session_id: str) -> int:
+        with self._cond:
+            if session_id in self._pending_versions:
+                return self._pending_versions[session_id]
+        return self.inner.version(session_id)
+
+    def get(self, session_id: str) -> dict | None:
+        with self._cond:
+            if session_id in self._pending:
+                raw = self._pending[session_id]
+                self._sized(len(raw) if raw is not None else 0)
+                return json.loads(raw) if raw is not None else None
+        return self.inner.get(session_id)
+
+    def put(self, session_id: str, session: dict, expected_version: int | None = None) -> int:
+        with self.lock(session_id):
+            current = self.version(session_id)
+            _check_version(session_id, expected_version, current)
+            data = _encode({**session, "version": current + 1})
+            ticket = self._enqueue(session_id, data, current + 1)
+        self._sized(len(data))
+        session["version"] = current + 1
+        self._notify(session_id, session)
+        if self.durability == "group":
+            self._wait_durable(ticket)
+            with self._cond:
+                rejected = self._rejected.pop(session_id, None)
+            if rejected is not None:
+                raise rejected
+        return current + 1
+
+    def delete(self, session_id: str, expected_version: int | None = None) -> None:
+        with self.lock(session_id):
+            _check_version(session_id, expected_version, self.version(session_id))
+            ticket = self._enqueue(session_id, None, 0)
+        self._notify(session_id, None)
+        if self.durability == "group":
+            self._wait_durable(ticket)
+
+    def load_all(self) -> dict:
+        self.flush()
+        return self.inner.load_all()
+
+    def save_all(self, store: dict) -> None:
+        self.flush()
+        self.inner.save_all(store)
+
+    def write_batch(self, changes: dict[str, str | None]) -> None:
+        self.flush()
+        self.inner.write_batch(changes)
+
+
+def open_store(json_path: Path | str, engine: str | None = None, durability: str | None = None) -> SessionStore:
+    """Build the engine selected by ``BOOKING_STORE_ENGINE`` (default: log).
+
+    The log engine keeps its records next to the legacy JSON file
+    (``booking_store.jsonl``) and seeds itself from that file on first use.
+    The sqlite engine uses ``booking_store.db``; import existing data into it
+    with ``migrate_store.py``. ``dynamodb`` stores sessions in the DynamoDB
+    table named by ``BOOKING_TABLE`` (the default engine when that is set);
+    ``kv`` is its local stand-in in ``booking_store.kv.db`` (see ``kv_store``).
+
+    ``BOOKING_STORE_DURABILITY`` picks ``sync`` (default: every write is
+    fsynced before it returns), ``group`` or ``async`` (see
+    ``GroupCommitStore``; tuned by ``BOOKING_STORE_FLUSH_MS`` and
+    ``BOOKING_STORE_FLUSH_BATCH``).
+    """
+    table = os.environ.get("BOOKING_TABLE")
+    engine = (engine or os.environ.get("BOOKING_STORE_ENGINE") or ("dynamodb" if table else "log")).strip().lower()
+    durability = (durability or os.environ.get("BOOKING_STORE_DURABILITY") or "sync").strip().lower()
+    json_path = Path(json_path)
+    if engine == "json":
+        store = JsonFileStore(json_path)
+    elif engine == "log":
+        store = AppendLogStore(json_path.with_suffix(".jsonl"), seed_path=json_path)
+    elif engine == "sqlite":
+        store = SqliteStore(json_path.with_suffix(".db"))
+    elif engine in ("kv", "dynamodb"):
+        from kv_store import DynamoTable, KeyValueStore, LocalTable
+
+        if engine == "dynamodb":
+            if not table:
+                raise ValueError("BOOKING_TABLE must name the DynamoDB table")
+            store = KeyValueStore(DynamoTable(table))
+        else:
+            store = KeyValueStore(LocalTable(json_path.with_suffix(".kv.db")))
+    else:
+        raise ValueError(f"unknown store engine: {engine}")
+    if durability == "sync":
+        return store
+    return GroupCommitStore(
+        store,
+        durability=durability,
+        flush_ms=float(os.environ.get("BOOKING_STORE_FLUSH_MS", "5")),
+        max_batch=int(os.environ.get("BOOKING_STORE_FLUSH_BATCH", "64")),
+    )
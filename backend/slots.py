@@ -0,0 +1,165 @@
+"""Booking fields read out of free text, shared by the backend and the Lambda.
+
+``extract_slots`` takes every field one message settles ("physio at Orchard
+on 21 Dec 3pm, John 91234567"); ``extract_time_text`` and ``hours_error``
+also serve single-field answers and booking edits.
+"""
+import re
+
+from dates import find_date, horizon_days, parse_date, policy_error
+from fuzzy import best_fuzzy_match
+from kb_index import compile_kb, day_type
+from tracing import traced
+
+REQUIRED_FIELDS = ["service", "date", "time", "location", "contact"]
+OUTSIDE_HOURS = "That time is outside the location's operating hours."
+
+_EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+_PHONE_RE = re.compile(r"\+?\d[\d -]{6,}\d")
+_WORD_RE = re.compile(r"[A-Za-z][A-Za-z'.-]*")
+_CONTACT_STOPWORDS = {
+    "a", "am", "an", "and", "at", "book", "by", "call", "contact", "email", "for", "i", "in", "is", "me", "my",
+    "name", "number", "on", "or", "phone", "please", "pm", "reach", "tel", "the", "to", "via", "with",
+}
+
+
+def parse_time_to_minutes(value: str) -> int | None:
+    v = value.strip().lower()
+    m = re.search(r"\b([01]?\d|2[0-3]):([0-5]\d)\b", v)
+    if m:
+        return int(m.group(1)) * 60 + int(m.group(2))
+    m = re.search(r"\b(\d{1,2})(?::([0-5]\d))?\s*(am|pm)\b", v)
+    if m:
+        hour = int(m.group(1)) % 12
+        minute = int(m.group(2) or 0)
+        if m.group(3) == "pm":
+            hour += 12
+        return hour * 60 + minute
+    return None
+
+
+def extract_time_text(value: str) -> str | None:
+    v = value.strip().lower()
+    m = re.search(r"\b([01]?\d|2[0-3]):[0-5]\d\b", v)
+    if m:
+        return m.group(0)
+    m = re.search(r"\b\d{1,2}(:\d{2})?\s*(am|pm)\b", v)
+    if m:
+        return m.group(0)
+    return None
+
+
+def hours_error(time_value: str, details: dict, kb: dict, availability=None) -> str | None:
+    """Why a booking for ``details`` can't start at ``time_value``, or None.
+
+    Given the ``AvailabilityIndex`` this is the rule ``reserve`` applies
+    (slot grid, and the service's whole run inside that date's hours);
+    without a date only the weekday window is known.
+    """
+    minutes = parse_time_to_minutes(time_value)
+    if minutes is None:
+        return OUTSIDE_HOURS
+    location_name = details.get("location") or ""
+    compiled = compile_kb(kb)
+    if not compiled.has_location(location_name):
+        return None
+    day = parse_date(str(details.get("date") or ""))
+    if availability is not None:
+        availability.set_kb(kb)
+        reason = availability.hours_error({**details, "time": time_value})
+        if reason is not None or day is not None:
+            return reason
+    if day is None:
+        # Date not known yet; validate against the weekday window.
+        window = compiled.window(location_name, "mon_fri")
+        return None if not window or window[0] <= minutes < window[1] else OUTSIDE_HOURS
+    window = compiled.window(location_name, day_type(day.weekday()))
+    return None if window and window[0] <= minutes < window[1] else OUTSIDE_HOURS
+
+
+def is_time_within_hours(time_value: str, details: dict, kb: dict, availability=None) -> bool:
+    return hours_error(time_value, details, kb, availability) is None
+
+
+def extract_service_from_text(text: str, kb: dict) -> str | None:
+    t = text.lower()
+    compiled = compile_kb(kb)
+    for n, needle in compiled.service_needles:
+        if needle in t:
+            return n
+    return best_fuzzy_match(text, compiled.service_names)
+
+
+def _blank(text: str, start: int, end: int) -> str:
+    return text[:start] + " " * (end - start) + text[end:]
+
+
+# Matches are blanked out of the working text as they are taken, so a date's
+# digits can't be read as a phone number.
+@traced("match.slots")
+def extract_slots(text: str, kb: dict, availability=None) -> dict:
+    compiled = compile_kb(kb)
+    work = text
+    found = {}
+
+    m = _EMAIL_RE.search(work)
+    contact_span = None
+    if m:
+        contact_span = (m.start(), m.group(0))
+        work = _blank(work, m.start(), m.end())
+    hit = find_date(work)
+    if hit:
+        day, start, end = hit
+        if policy_error(day, horizon_days(kb)) is None:
+            found["date"] = day.isoformat()
+        work = _blank(work, start, end)
+    time_text = extract_time_text(work)
+    if time_text:
+        m = re.search(re.escape(time_text), work, re.I)
+        found["time"] = time_text
+        work = _blank(work, m.start(), m.end())
+    if contact_span is None:
+        m = _PHONE_RE.search(work)
+        if m:
+            contact_span = (m.start(), m.group(0).strip())
+            work = _blank(work, m.start(), m.end())
+
+    lowered = work.lower()
+    for name, needle in compiled.location_needles:
+        i = lowered.find(needle)
+        if i >= 0:
+            found["location"] = name
+            work = _blank(work, i, i + len(needle))
+            break
+    else:
+        for m in _WORD_RE.finditer(work):
+            alias = compiled.location_alias(m.group(0))
+            if alias:
+                found["location"] = alias
+                work = _blank(work, m.start(), m.end())
+                break
+
+    service = extract_service_from_text(text, kb)
+    if not service:
+        for m in _WORD_RE.finditer(work):
+            service = compiled.service_alias(m.group(0))
+            if service:
+                break
+    if service:
+        found["service"] = service
+
+    if contact_span is not None:
+        # Name = the words right before the phone/email in the same clause.
+        start, value = contact_span
+        clause = re.split(r"[,;\n]", work[:start])[-1]
+        names = []
+        for word in reversed(_WORD_RE.findall(clause)):
+            w = word.lower().strip(".'-")
+            if w in _CONTACT_STOPWORDS or compiled.service_alias(w) or len(names) == 3:
+                break
+            names.append(word)
+        found["contact"] = " ".join(list(reversed(names)) + [value])
+
+    if "time" in found and "location" in found and not is_time_within_hours(found["time"], found, kb, availability):
+        del found["time"]
+    return {f: found[f] for f in REQUIRED_FIELDS if f in found}
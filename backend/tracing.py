@@ -0,0 +1,221 @@
+"""Per-request span trees.
+
+``Tracer.trace`` opens the root span of a request and makes it current;
+``span(name, **attrs)`` nests a child under whatever span is current and is a
+no-op outside a trace, so helpers can be instrumented unconditionally. Spans
+follow the context into ``run_in_threadpool`` calls and SSE bodies.
+
+Finished traces go to a ring buffer (``Tracer.recent``) and, when they took
+at least ``slow_ms``, to the slow-request log as one JSON line holding the
+whole tree. A trace is correlated by session id, taken from the
+``x-session-id`` header or set later with ``set_session`` once the handler
+knows it; each trace also gets its own id, returned as ``X-Trace-Id``.
+"""
+import json
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from functools import wraps
+from uuid import uuid4
+
+DEFAULT_BUFFER_SIZE = 200
+DEFAULT_SLOW_MS = 1000.0
+
+_SPAN: ContextVar["Span | None"] = ContextVar("trace_span", default=None)
+_TRACE: ContextVar["Trace | None"] = ContextVar("trace", default=None)
+
+
+class Span:
+    __slots__ = ("name", "attrs", "start", "end", "children")
+
+    def __init__(self, name: str, attrs: dict | None = None):
+        self.name = name
+        self.attrs = attrs or {}
+        self.start = time.perf_counter()
+        self.end = None
+        self.children: list[Span] = []
+
+    def to_dict(self, origin: float) -> dict:
+        end = self.end if self.end is not None else time.perf_counter()
+        out = {
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round((end - self.start) * 1000, 3),
+        }
+        if self.attrs:
+            out["attrs"] = self.attrs
+        if self.children:
+            out["children"] = [c.to_dict(origin) for c in self.children]
+        return out
+
+
+class Trace:
+    def __init__(self, name: str, session_id: str | None = None):
+        self.trace_id = uuid4().hex[:16]
+        self.session_id = session_id
+        self.started_at = datetime.now(timezone.utc).isoformat()
+        self.root = Span(name)
+        self.status = None
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.root.end if self.root.end is not None else time.perf_counter()
+        return (end - self.root.start) * 1000
+
+    def to_dict(self) -> dict:
+        return {
+            "trace_id": self.trace_id,
+            "session_id": self.session_id,
+            "name": self.root.name,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration_ms, 3),
+            "status": self.status,
+            "spans": self.root.to_dict(self.root.start),
+        }
+
+
+@contextmanager
+def span(name: str, **attrs):
+    parent = _SPAN.get()
+    if parent is None:
+        yield None
+        return
+    child = Span(name, attrs)
+    parent.children.append(child)
+    token = _SPAN.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.attrs["error"] = type(e).__name__
+        raise
+    finally:
+        child.end = time.perf_counter()
+        _SPAN.reset(token)
+
+
+def traced(name: str):
+    """Decorator form of ``span`` for plain functions."""
+    def wrap(fn):
+        @wraps(fn)
+        def inner(*args, **kwargs):
+            if _SPAN.get() is None:
+                return fn(*args, **kwargs)
+            with span(name):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def current_trace() -> Trace | None:
+    return _TRACE.get()
+
+
+def set_session(session_id: str | None) -> None:
+    trace = _TRACE.get()
+    if trace is not None and session_id and not trace.session_id:
+        trace.session_id = session_id
+
+
+class Tracer:
+    """Collects finished traces in a ring buffer and logs the slow ones.
+
+    ``slow_log`` is a file to append the slow-request lines to; without one
+    they go to stderr. ``slow_ms=0`` turns the log off, ``buffer_size=0``
+    the buffer.
+    """
+
+    def __init__(self, buffer_size: int = DEFAULT_BUFFER_SIZE, slow_ms: float = DEFAULT_SLOW_MS, slow_log: str | None = None):
+        self.slow_ms = slow_ms
+        self.slow_log = slow_log
+        self._buffer: deque = deque(maxlen=max(buffer_size, 0))
+        self._log_lock = threading.Lock()
+        self.traces = 0
+        self.slow = 0
+
+    @contextmanager
+    def trace(self, name: str, session_id: str | None = None):
+        trace = Trace(name, session_id)
+        trace_token = _TRACE.set(trace)
+        span_token = _SPAN.set(trace.root)
+        try:
+            yield trace
+        finally:
+            trace.root.end = time.perf_counter()
+            _SPAN.reset(span_token)
+            _TRACE.reset(trace_token)
+            self._finish(trace)
+
+    def _finish(self, trace: Trace) -> None:
+        self.traces += 1
+        if self._buffer.maxlen:
+            self._buffer.append(trace)
+        if self.slow_ms and trace.duration_ms >= self.slow_ms:
+            self.slow += 1
+            self._log(trace)
+
+    def _log(self, trace: Trace) -> None:
+        line = json.dumps({"slow_request": trace.to_dict()}, ensure_ascii=False, default=str)
+        with self._log_lock:
+            if self.slow_log:
+                with open(self.slow_log, "a", encoding="utf-8") as f:
+                    f.write(line + "\n")
+            else:
+                print(line, file=sys.stderr, flush=True)
+
+    def recent(self, limit: int = 50, min_ms: float = 0.0, session_id: str | None = None) -> list[dict]:
+        """Newest first, optionally only those at least ``min_ms`` long or for one session."""
+        out = []
+        for trace in reversed(list(self._buffer)):
+            if trace.duration_ms < min_ms or (session_id and trace.session_id != session_id):
+                continue
+            out.append(trace.to_dict())
+            if len(out) >= limit:
+                break
+        return out
+
+    def stats(self) -> dict:
+        return {
+            "traces": self.traces,
+            "slow": self.slow,
+            "buffered": len(self._buffer),
+            "buffer_size": self._buffer.maxlen,
+            "slow_ms": self.slow_ms,
+        }
+
+
+class TraceMiddleware:
+    """ASGI middleware that wraps each HTTP request in a trace.
+
+    Streaming responses are traced until their last chunk is sent.
+    """
+
+    def __init__(self, app, tracer: Tracer, exclude: tuple = ()):
+        self.app = app
+        self.tracer = tracer
+        self.exclude = frozenset(exclude)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude:
+            await self.app(scope, receive, send)
+            return
+        session_id = None
+        for key, value in scope.get("headers") or ():
+            if key == b"x-session-id":
+                session_id = value.decode("latin-1") or None
+                break
+        with self.tracer.trace(f"{scope['method']} {scope['path']}", session_id) as trace:
+            async def send_traced(message):
+                if message["type"] == "http.response.start":
+                    trace.status = message["status"]
+                    message = {**message, "headers": [*message.get("headers", ()), (b"x-trace-id", trace.trace_id.encode("ascii"))]}
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_traced)
+            except Exception:
+                trace.status = trace.status or 500
+                raise
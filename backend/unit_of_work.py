@@ -0,0 +1,88 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from metrics import observe_store
+from tracing import span
+
+_CURRENT: ContextVar["UnitOfWork | None"] = ContextVar("unit_of_work", default=None)
+
+
+class WriteStats:
+    """Process-wide counters: session saves requested vs. store writes done."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.units = 0
+        self.saves = 0
+        self.writes = 0
+
+    def record(self, saves: int, writes: int) -> None:
+        with self._lock:
+            self.units += 1
+            self.saves += saves
+            self.writes += writes
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "units": self.units,
+                "saves": self.saves,
+                "writes": self.writes,
+                "writes_saved": self.saves - self.writes,
+            }
+
+
+WRITE_STATS = WriteStats()
+
+
+class UnitOfWork:
+    """Collects the sessions a request saves and writes each one once.
+
+    ``mark`` only remembers the session; ``flush`` writes every dirty
+    session with a version check against what the request loaded, so a
+    turn that saves the same session three times costs one store write.
+    """
+
+    def __init__(self, store, stats: WriteStats | None = WRITE_STATS):
+        self.store = store
+        self.stats = stats
+        self._dirty: dict[str, dict] = {}
+        self.saves = 0
+
+    def mark(self, session_id: str, session: dict) -> None:
+        self._dirty[session_id] = session
+        self.saves += 1
+
+    def flush(self) -> int:
+        writes = 0
+        dirty, self._dirty = self._dirty, {}
+        for session_id, session in dirty.items():
+            started = time.perf_counter()
+            with span("store.save"):
+                self.store.put(session_id, session, expected_version=session.get("version", 0))
+            observe_store("save", time.perf_counter() - started, self.store.last_size())
+            writes += 1
+        if self.stats is not None:
+            self.stats.record(self.saves, writes)
+        self.saves = 0
+        return writes
+
+
+def current_unit_of_work() -> UnitOfWork | None:
+    return _CURRENT.get()
+
+
+@contextmanager
+def unit_of_work(store, stats: WriteStats | None = WRITE_STATS):
+    """Make a new UnitOfWork current for the enclosed block.
+
+    Flushing is left to the caller, which knows when the response is ready.
+    """
+    uow = UnitOfWork(store, stats)
+    token = _CURRENT.set(uow)
+    try:
+        yield uow
+    finally:
+        _CURRENT.reset(token)
@@ -60,6 +60,7 @@ const editLocation = document.getElementById("editLocation");
 const editContact = document.getElementById("editContact");
 let activeBookingId = null;
 
+// Fallback for when /clinic/info can't be reached; the live list comes from the API.
 const SERVICE_CATALOG = [
   { name: "General Consultation", duration_minutes: 30, price_sgd: 60 },
   { name: "Dental Cleaning", duration_minutes: 45, price_sgd: 120 },
@@ -79,9 +80,13 @@ function formatServiceList(services) {
 function addMsg(who, text) {
   const div = document.createElement("div");
   div.className = "msg " + (who === "You" ? "you" : "bot");
-  const rendered = renderText(text);
-  div.innerHTML = `<b>${who}:</b> ${rendered}`;
   chat.appendChild(div);
+  setMsgText(div, who, text);
+  return div;
+}
+
+function setMsgText(div, who, text) {
+  div.innerHTML = `<b>${who}:</b> ${renderText(text)}`;
   chat.scrollTop = chat.scrollHeight;
 }
 
@@ -145,6 +150,56 @@ async function sendToBot(message) {
   return data.reply || "(no reply)";
 }
 
+function parseSseEvent(raw) {
+  let event = "message";
+  const data = [];
+  for (const line of raw.split("\n")) {
+    if (line.startsWith("event:")) event = line.slice(6).trim();
+    else if (line.startsWith("data:")) data.push(line.slice(5).trimStart());
+  }
+  return { event, data: data.length ? JSON.parse(data.join("\n")) : {} };
+}
+
+// Stream the reply over SSE; calls onDelta with each token as it arrives.
+// Returns null when the API has no /chat/stream so the caller can fall back.
+async function streamFromBot(message, onDelta) {
+  const sessionId = getSessionId();
+  const payload = { message };
+  if (sessionId) payload.session_id = sessionId;
+
+  const res = await fetch(apiUrl("/chat/stream"), {
+    method: "POST",
+    headers: {
+      "Content-Type": "application/json",
+      ...sessionHeaders()
+    },
+    body: JSON.stringify(payload)
+  });
+  const type = res.headers.get("content-type") || "";
+  if (!res.ok || !res.body || !type.includes("text/event-stream")) return null;
+
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = "";
+  let final = null;
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let idx;
+    while ((idx = buffer.indexOf("\n\n")) !== -1) {
+      const evt = parseSseEvent(buffer.slice(0, idx));
+      buffer = buffer.slice(idx + 2);
+      if (evt.event === "token") onDelta(evt.data.delta || "");
+      else if (evt.event === "done") final = evt.data;
+      else if (evt.event === "error") throw new Error(evt.data.error || "stream failed");
+    }
+  }
+  if (!final) throw new Error("stream ended early");
+  if (final.session_id) setSessionId(final.session_id);
+  return final.reply || "(no reply)";
+}
+
 async function fetchBookings() {
   const sessionId = getSessionId();
   if (!sessionId) {
@@ -269,9 +324,23 @@ async function clearHistory() {
   addMsg("Bot", "Chat history cleared. Happy now?");
 }
 
-function showAvailableServices() {
-  if (!SERVICE_CATALOG.length) return;
-  const services = formatServiceList(SERVICE_CATALOG);
+async function loadServiceCatalog() {
+  // The endpoint sends Cache-Control and an ETag, so the browser serves this
+  // from its cache or revalidates it with a 304.
+  try {
+    const data = await fetchJson(apiUrl("/clinic/info"));
+    const services = data.clinic && data.clinic.services;
+    if (Array.isArray(services) && services.length) return services;
+  } catch (e) {
+    console.warn("Using built-in service list:", e.message);
+  }
+  return SERVICE_CATALOG;
+}
+
+async function showAvailableServices() {
+  const catalog = await loadServiceCatalog();
+  if (!catalog.length) return;
+  const services = formatServiceList(catalog);
   addMsg("Bot", "Services available:\n- " + services.join("\n- "));
 }
 
@@ -281,18 +350,22 @@ async function onSend() {
 
   input.value = "";
   addMsg("You", text);
-  addMsg("Bot", "Typing...");
-
-  const typing = chat.lastChild;
+  const bubble = addMsg("Bot", "Typing...");
 
   try {
-    const reply = await sendToBot(text);
-    typing.remove();
-    addMsg("Bot", reply);
+    let partial = "";
+    let reply = await streamFromBot(text, (delta) => {
+      partial += delta;
+      setMsgText(bubble, "Bot", partial);
+    }).catch((e) => {
+      if (partial) throw e;
+      return null;
+    });
+    if (reply === null) reply = await sendToBot(text);
+    setMsgText(bubble, "Bot", reply);
     await fetchBookings();
   } catch (e) {
-    typing.remove();
-    addMsg("Bot", "Error: " + e.message);
+    setMsgText(bubble, "Bot", "Error: " + e.message);
     console.error(e);
   }
 }
@@ -4,5 +4,27 @@ New-Item -ItemType Directory package | Out-Null
 pip install -r requirements.txt -t package
 Copy-Item lambda_function.py package\
 
+# Modules shared with the FastAPI backend
+$shared = @(
+  "session_store.py",
+  "kb_provider.py",
+  "kb_index.py",
+  "fuzzy.py",
+  "intents.py",
+  "unit_of_work.py",
+  "availability.py",
+  "dates.py",
+  "kv_store.py",
+  "pagination.py",
+  "history.py",
+  "session_gc.py",
+  "metrics.py",
+  "tracing.py",
+  "slots.py"
+)
+foreach ($m in $shared) {
+  Copy-Item (Join-Path ..\backend $m) package\
+}
+
 Compress-Archive -Path package\* -DestinationPath openai_lambda.zip -Force
 Write-Output "Created openai_lambda.zip"
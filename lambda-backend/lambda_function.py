@@ -1,16 +1,52 @@
 import os
+import sys
 import json
-import re
+import time
 from uuid import uuid4
 from datetime import datetime, timezone
-from difflib import SequenceMatcher
-from openai import OpenAI
 
-client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
+# Shared modules live in backend/ in the repo and next to this file in the zip.
+_BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+if os.path.isdir(_BACKEND_DIR) and _BACKEND_DIR not in sys.path:
+    sys.path.append(_BACKEND_DIR)
 
-STORE_PATH = "/tmp/booking_store.json"
+from session_store import SlotTaken, VersionConflict, open_store
+from kb_provider import freeze_kb
+from kb_index import compile_kb
+from fuzzy import best_fuzzy_match
+from intents import classify
+from unit_of_work import WRITE_STATS, current_unit_of_work, unit_of_work
+from availability import AvailabilityIndex
+from dates import horizon_days, normalize_date, parse_date
+from pagination import InvalidCursor, bookings_etag, etag_matches, page_bookings
+from slots import REQUIRED_FIELDS, extract_slots, extract_time_text, hours_error, is_time_within_hours
+from history import fold_rollup, record_turn
+from session_gc import SessionSweeper
+from metrics import EMF_NAMESPACE, chat_turn, llm_call, mark_branch, observe_store, record_kb_load, record_usage
+from tracing import Tracer, set_session, span, traced
 
-CLINIC_KB = {
+_client = None
+
+
+def _openai():
+    # The SDK (and httpx under it) is a large import. Requests that never
+    # reach the model (clinic info, bookings, most booking turns) shouldn't
+    # pay for it on a cold start, so build the client on first use.
+    global _client
+    if _client is None:
+        from openai import OpenAI
+
+        _client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
+    return _client
+
+
+# Provisioned-concurrency containers can opt back into paying at init.
+if os.environ.get("OPENAI_EAGER_INIT", "").strip().lower() in ("1", "true", "yes"):
+    _openai()
+
+STORE_PATH = os.environ.get("BOOKING_STORE_PATH") or "/tmp/booking_store.json"
+
+CLINIC_KB = freeze_kb({
     "clinic_name": "BookBot Clinic",
     "services": [
         {"name": "General Consultation", "duration_minutes": 30, "price_sgd": 60},
@@ -37,43 +73,122 @@ CLINIC_KB = {
     ],
     "time_policy": "Appointments are scheduled in 15-minute increments within location hours.",
     "date_policy": "Bookings allowed up to 60 days in advance.",
-}
-
-REQUIRED_FIELDS = ["service", "date", "time", "location", "contact"]
-
-
-def _resp(status_code: int, body: dict):
+})
+
+
+# The KB is fixed for the life of the container: encode /clinic/info once.
+_info_body, CLINIC_INFO_ETAG = CLINIC_KB.info_payload()
+CLINIC_INFO_BODY = _info_body.decode("utf-8")
+CLINIC_INFO_CACHE_CONTROL = f"public, max-age={int(os.environ.get('CLINIC_INFO_MAX_AGE', '300'))}"
+
+HISTORY_MAX_TURNS = int(os.environ.get("HISTORY_MAX_TURNS", "20"))
+HISTORY_ROLLUP_BATCH = int(os.environ.get("HISTORY_ROLLUP_BATCH", "10"))
+METRICS_NAMESPACE = os.environ.get("METRICS_NAMESPACE", EMF_NAMESPACE)
+# No endpoint can reach a container's buffer, so only the slow-request log
+# is kept; its lines land in CloudWatch Logs.
+TRACER = Tracer(
+    buffer_size=0,
+    slow_ms=float(os.environ.get("TRACE_SLOW_MS", "1000")),
+    slow_log=os.environ.get("TRACE_SLOW_LOG") or None,
+)
+
+
+def _resp(status_code: int, body: dict | str | None, headers: dict | None = None):
+    # A str body is already-encoded JSON and is passed through as is.
+    if body is None:
+        body = ""
+    elif not isinstance(body, str):
+        body = json.dumps(body)
     return {
         "statusCode": status_code,
         "headers": {
             "Content-Type": "application/json",
             "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Headers": "Content-Type,X-Session-Id",
+            "Access-Control-Allow-Headers": "Content-Type,X-Session-Id,If-None-Match",
             "Access-Control-Allow-Methods": "OPTIONS,GET,POST,PATCH,DELETE",
+            "Access-Control-Expose-Headers": "ETag,X-Trace-Id",
+            **(headers or {}),
         },
-        "body": json.dumps(body),
+        "body": body,
     }
 
 
-def _load_store() -> dict:
-    if not os.path.exists(STORE_PATH):
-        return {}
-    try:
-        with open(STORE_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return {}
+STORE = open_store(STORE_PATH)
+
+# Slot occupancy across every session, kept current by the store's change feed.
+AVAILABILITY = AvailabilityIndex(CLINIC_KB)
+STORE.add_listener(AVAILABILITY.sync_session)
+# Each container's index only sees its own writes; the store's slot claims
+# are what keep two containers from booking the same slot.
+STORE.set_claims(AVAILABILITY.claim_keys)
+_availability_loaded = False
+
+
+def _availability() -> AvailabilityIndex:
+    # Loading every session is a full table scan on the DynamoDB engine;
+    # only pay it on a container's first request that needs free slots.
+    global _availability_loaded
+    if not _availability_loaded:
+        AVAILABILITY.rebuild(STORE.load_all())
+        _availability_loaded = True
+    return AVAILABILITY
+
+
+def _resync_availability(*session_ids) -> None:
+    # After a refused write: drop what the attempt claimed in the index and
+    # learn whichever booking beat it to the slot.
+    for sid in dict.fromkeys(sid for sid in session_ids if sid):
+        AVAILABILITY.sync_session(sid, STORE.get(sid))
 
 
-def _save_store(store: dict) -> None:
-    with open(STORE_PATH, "w", encoding="utf-8") as f:
-        json.dump(store, f, indent=2, ensure_ascii=True)
+SWEEPER = SessionSweeper(
+    STORE,
+    draft_ttl=float(os.environ.get("SESSION_DRAFT_TTL", str(7 * 24 * 3600))),
+    empty_ttl=float(os.environ.get("SESSION_EMPTY_TTL", str(24 * 3600))),
+    batch=int(os.environ.get("SESSION_GC_BATCH", "100")),
+    interval=float(os.environ.get("SESSION_GC_INTERVAL", "60")),
+)
+STORE.add_listener(SWEEPER.on_change)
+
+
+def _sweep() -> None:
+    # No background threads between invocations: run a bounded pass at most
+    # once per interval after a chat turn. The sweeper is never seeded with a
+    # full load (a table scan per container on DynamoDB); it tracks the
+    # sessions this container writes, through the store's change listener.
+    SWEEPER.maybe_tick()
+
+
+def _load_session(session_id: str) -> dict:
+    started = time.perf_counter()
+    with span("store.load"):
+        session = STORE.get(session_id)
+    observe_store("load", time.perf_counter() - started, STORE.last_size())
+    return session or {"draft": _new_draft(), "bookings": [], "history": []}
+
+
+def _save_session(session_id: str, session: dict) -> None:
+    # Inside a chat turn this only marks the session; the turn flushes once.
+    uow = current_unit_of_work()
+    if uow is not None:
+        uow.mark(session_id, session)
+        return
+    started = time.perf_counter()
+    with span("store.save"):
+        STORE.put(session_id, session, expected_version=session.get("version", 0))
+    observe_store("save", time.perf_counter() - started, STORE.last_size())
 
 
 def _now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
 
+def _record_turn(session: dict, user_msg: str, reply: str) -> None:
+    record_turn(session, {"at": _now_iso(), "user": user_msg, "assistant": reply}, HISTORY_MAX_TURNS)
+    # Nothing runs between invocations, so the rollup rides on this write.
+    fold_rollup(session, HISTORY_ROLLUP_BATCH)
+
+
 def _format_booking(booking: dict) -> str:
     if not booking:
         return "No booking found yet."
@@ -111,26 +226,40 @@ def _missing_fields(draft: dict) -> list:
     return [f for f in REQUIRED_FIELDS if not str(details.get(f, "")).strip()]
 
 
-def _question_for(field: str, kb: dict) -> str:
+def _question_for(field: str, kb: dict, details: dict | None = None) -> str:
     if field == "service":
-        services = [s.get("name") for s in (kb.get("services") or []) if s.get("name")]
+        services = compile_kb(kb).service_names
         if services:
             return "What service would you like to book? Options: " + ", ".join(services)
         return "What service would you like to book?"
     if field == "location":
-        locations = [l.get("name") for l in (kb.get("locations") or []) if l.get("name")]
+        locations = compile_kb(kb).location_names
         if locations:
             return "Which location do you prefer? Options: " + ", ".join(locations)
         return "Which location do you prefer?"
     if field == "date":
-        return "What date would you like? (e.g., 21 Dec)"
+        return "What date would you like? (e.g., tomorrow, next Tue or 21 Dec)"
     if field == "time":
+        offers = _time_offers(details or {}, kb)
+        if offers:
+            return "What time works for you? Free slots: " + ", ".join(offers)
         return "What time works for you? (e.g., 10:30 AM)"
     if field == "contact":
         return "What contact should we use? (name and phone/email)"
     return "Please provide " + field + "."
 
 
+# Offer times once the date is known, so the user picks one that fits
+# instead of being told afterwards that it doesn't.
+def _time_offers(details: dict, kb: dict) -> list:
+    day = parse_date(str(details.get("date") or ""))
+    if day is None:
+        return []
+    location = details.get("location")
+    locations = [location] if location else compile_kb(kb).location_names
+    return _availability().suggest(details.get("service") or "", locations, day)
+
+
 def _kb_summary(kb: dict) -> str:
     services = kb.get("services") or []
     locations = kb.get("locations") or []
@@ -167,126 +296,44 @@ def _kb_summary(kb: dict) -> str:
     return "\n".join(lines) if lines else "No clinic info available."
 
 
-def _is_info_request(text: str) -> bool:
-    return re.search(
-        r"\b(services|service list|opening hours|hours|locations|price|pricing|clinic info|clinic information)\b",
-        text.lower(),
-    ) is not None
-
-
-def _is_booking_related(text: str) -> bool:
-    return re.search(r"\b(book|booking|appointment|schedule|reschedule|cancel|change|edit)\b", text.lower()) is not None
-
-
-def _is_confirm_intent(text: str) -> bool:
-    return re.search(r"\b(confirm|confirmed|yes|okay|ok|sure)\b", text.lower()) is not None
-
-
+@traced("match.service")
 def _find_service(name: str, kb: dict) -> str | None:
-    name = name.strip().lower()
-    for s in kb.get("services") or []:
-        n = (s.get("name") or "").strip()
-        if n.lower() == name:
-            return n
-    return None
+    return compile_kb(kb).find_service(name)
 
 
 def _best_fuzzy_match(value: str, options: list[str], threshold: float = 0.78) -> str | None:
-    best = None
-    best_score = 0.0
-    for opt in options:
-        score = SequenceMatcher(None, value.lower(), opt.lower()).ratio()
-        if score > best_score:
-            best_score = score
-            best = opt
-    if best_score >= threshold:
-        return best
-    return None
-
-
-def _extract_service_from_text(text: str, kb: dict) -> str | None:
-    t = text.lower()
-    services = [s.get("name") for s in (kb.get("services") or []) if s.get("name")]
-    for n in services:
-        if n and n.lower() in t:
-            return n
-    return _best_fuzzy_match(text, services)
+    return best_fuzzy_match(value, options, threshold)
 
 
+@traced("match.location")
 def _find_location(name: str, kb: dict) -> str | None:
-    name = name.strip().lower()
-    for l in kb.get("locations") or []:
-        n = (l.get("name") or "").strip()
-        if n.lower() == name:
-            return n
-    return None
+    return compile_kb(kb).find_location(name)
 
 
+@traced("match.fuzzy_service")
 def _fuzzy_service(value: str, kb: dict) -> str | None:
-    services = [s.get("name") for s in (kb.get("services") or []) if s.get("name")]
-    return _best_fuzzy_match(value, services)
+    return _best_fuzzy_match(value, compile_kb(kb).service_names)
 
 
+@traced("match.fuzzy_location")
 def _fuzzy_location(value: str, kb: dict) -> str | None:
-    locations = [l.get("name") for l in (kb.get("locations") or []) if l.get("name")]
-    return _best_fuzzy_match(value, locations)
-
-
-def _valid_time(value: str) -> bool:
-    v = value.strip().lower()
-    return re.search(r"\b([01]?\d|2[0-3]):[0-5]\d\b", v) is not None or re.search(
-        r"\b\d{1,2}(:\d{2})?\s*(am|pm)\b", v
-    ) is not None
-
-
-def _valid_date(value: str) -> bool:
-    v = value.strip().lower()
-    return re.search(r"\b\d{4}-\d{2}-\d{2}\b", v) is not None or re.search(
-        r"\b\d{1,2}\s*[a-z]{3,9}\b", v
-    ) is not None
-
-
-def _parse_time_to_minutes(value: str) -> int | None:
-    v = value.strip().lower()
-    m = re.search(r"\b([01]?\d|2[0-3]):([0-5]\d)\b", v)
-    if m:
-        return int(m.group(1)) * 60 + int(m.group(2))
-    m = re.search(r"\b(\d{1,2})(?::([0-5]\d))?\s*(am|pm)\b", v)
-    if m:
-        hour = int(m.group(1)) % 12
-        minute = int(m.group(2) or 0)
-        if m.group(3) == "pm":
-            hour += 12
-        return hour * 60 + minute
-    return None
-
-
-def _extract_time_text(value: str) -> str | None:
-    v = value.strip().lower()
-    m = re.search(r"\b([01]?\d|2[0-3]):[0-5]\d\b", v)
-    if m:
-        return m.group(0)
-    m = re.search(r"\b\d{1,2}(:\d{2})?\s*(am|pm)\b", v)
-    if m:
-        return m.group(0)
-    return None
-
-
-def _is_time_within_hours(time_value: str, location_name: str, kb: dict) -> bool:
-    minutes = _parse_time_to_minutes(time_value)
-    if minutes is None:
-        return False
-    for loc in kb.get("locations") or []:
-        if (loc.get("name") or "").strip().lower() == location_name.strip().lower():
-            hours = loc.get("hours") or {}
-            window = hours.get("mon_fri") or ""
-            m = re.search(r"(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})", window)
-            if not m:
-                return True
-            start = int(m.group(1)) * 60 + int(m.group(2))
-            end = int(m.group(3)) * 60 + int(m.group(4))
-            return start <= minutes <= end
-    return True
+    return _best_fuzzy_match(value, compile_kb(kb).location_names)
+
+
+# (ISO date, None) for a bookable date, else (None, reply explaining why).
+def _normalize_date(value: str, kb: dict) -> tuple:
+    return normalize_date(value, horizon_days(kb))
+
+
+# Copy extracted fields the draft doesn't have yet; return the ones added.
+def _merge_slots(draft: dict, slots: dict) -> dict:
+    details = draft.setdefault("details", {})
+    added = {}
+    for field, value in slots.items():
+        if not str(details.get(field, "")).strip():
+            details[field] = value
+            added[field] = value
+    return added
 
 
 def _finalize_booking(draft: dict, confirmation_summary: str) -> dict:
@@ -305,28 +352,37 @@ def _finalize_booking(draft: dict, confirmation_summary: str) -> dict:
 def _handle_chat(event, session_id: str, body: dict):
     user_msg = (body.get("message") or "").strip()
     if not user_msg:
+        mark_branch("empty_message")
         return _resp(400, {"error": "message is required"})
 
-    store = _load_store()
-    session = store.get(session_id) or {"draft": _new_draft(), "bookings": [], "history": []}
+    session = _load_session(session_id)
+    record_kb_load()
     kb = CLINIC_KB
+    with span("match.intents"):
+        intents = classify(user_msg)
     draft = session.get("draft") or _new_draft()
 
-    # infer service from free text
+    # infer service from free text, plus any other field the message settles
     if not (draft.get("details") or {}).get("service"):
-        inferred = _extract_service_from_text(user_msg, kb)
+        slots = extract_slots(user_msg, kb, AVAILABILITY)
+        inferred = slots.pop("service", None)
         if inferred:
+            mark_branch("service_inference")
+            noted = _merge_slots(draft, slots)
             draft["pending_field"] = "service"
             draft["pending_value"] = inferred
             draft["last_field"] = ""
             session["draft"] = draft
-            store[session_id] = session
-            _save_store(store)
-            return _resp(200, {"reply": f"Did you want to book **{inferred}**? (yes/no)", "session_id": session_id})
+            _save_session(session_id, session)
+            reply = f"Did you want to book **{inferred}**? (yes/no)"
+            if noted:
+                reply += "\nI also noted " + ", ".join(f"{k}: {v}" for k, v in noted.items()) + "."
+            return _resp(200, {"reply": reply, "session_id": session_id})
 
     # per-field confirmation
     if draft.get("pending_field"):
-        if re.search(r"\b(yes|confirm|ok|okay|sure)\b", user_msg.lower()):
+        if "yes" in intents:
+            mark_branch("pending_confirm")
             field = draft["pending_field"]
             value = draft["pending_value"]
             draft["details"][field] = value
@@ -335,37 +391,35 @@ def _handle_chat(event, session_id: str, body: dict):
             draft["updated_at"] = _now_iso()
             draft["missing_fields"] = _missing_fields(draft)
             session["draft"] = draft
-            store[session_id] = session
-            _save_store(store)
+            _save_session(session_id, session)
             missing = _missing_fields(draft)
             if missing:
                 draft["last_field"] = missing[0]
                 session["draft"] = draft
-                store[session_id] = session
-                _save_store(store)
-                return _resp(200, {"reply": _question_for(missing[0], kb), "session_id": session_id})
+                _save_session(session_id, session)
+                return _resp(200, {"reply": _question_for(missing[0], kb, draft.get("details")), "session_id": session_id})
             draft["awaiting_confirmation"] = True
             draft["confirmation_summary"] = _format_booking(draft)
             session["draft"] = draft
-            store[session_id] = session
-            _save_store(store)
+            _save_session(session_id, session)
             return _resp(
                 200,
                 {"reply": "Please confirm your booking details (yes/no):\n" + draft["confirmation_summary"], "session_id": session_id},
             )
-        if re.search(r"\b(no|change|edit|wrong)\b", user_msg.lower()):
+        if "no" in intents:
+            mark_branch("pending_reject")
             field = draft["pending_field"]
             draft["pending_field"] = ""
             draft["pending_value"] = ""
             draft["last_field"] = field
             session["draft"] = draft
-            store[session_id] = session
-            _save_store(store)
-            return _resp(200, {"reply": _question_for(field, kb), "session_id": session_id})
+            _save_session(session_id, session)
+            return _resp(200, {"reply": _question_for(field, kb, draft.get("details")), "session_id": session_id})
 
     # last field capture
     last_field = (draft.get("last_field") or "").strip()
-    if last_field and not _is_info_request(user_msg):
+    if last_field and "info" not in intents:
+        mark_branch("field_capture")
         value = user_msg.strip()
         if last_field == "service":
             match = _find_service(value, kb)
@@ -376,8 +430,7 @@ def _handle_chat(event, session_id: str, body: dict):
                     draft["pending_value"] = suggestion
                     draft["last_field"] = ""
                     session["draft"] = draft
-                    store[session_id] = session
-                    _save_store(store)
+                    _save_session(session_id, session)
                     return _resp(200, {"reply": f"Did you mean {suggestion}? (yes/no)", "session_id": session_id})
                 return _resp(200, {"reply": "Invalid service. Please re-enter a valid service from the list.", "session_id": session_id})
             value = match
@@ -390,22 +443,23 @@ def _handle_chat(event, session_id: str, body: dict):
                     draft["pending_value"] = suggestion
                     draft["last_field"] = ""
                     session["draft"] = draft
-                    store[session_id] = session
-                    _save_store(store)
+                    _save_session(session_id, session)
                     return _resp(200, {"reply": f"Did you mean {suggestion}? (yes/no)", "session_id": session_id})
                 return _resp(200, {"reply": "Invalid location. Please re-enter a valid location from the list.", "session_id": session_id})
             value = match
         elif last_field == "time":
-            time_text = _extract_time_text(value)
+            time_text = extract_time_text(value)
             if not time_text:
                 return _resp(200, {"reply": "Invalid time format. Please re-enter (e.g., 10:30 AM).", "session_id": session_id})
             loc = (draft.get("details") or {}).get("location", "")
-            if loc and not _is_time_within_hours(time_text, loc, kb):
-                return _resp(200, {"reply": "That time is outside the location's operating hours. Please enter a time within hours.", "session_id": session_id})
+            reason = hours_error(time_text, draft.get("details") or {}, kb, AVAILABILITY) if loc else None
+            if reason:
+                return _resp(200, {"reply": f"{reason} Please enter another time.", "session_id": session_id})
             value = time_text
         elif last_field == "date":
-            if not _valid_date(value):
-                return _resp(200, {"reply": "Invalid date format. Please re-enter (e.g., 21 Dec or 2026-02-10).", "session_id": session_id})
+            value, error = _normalize_date(value, kb)
+            if error:
+                return _resp(200, {"reply": error, "session_id": session_id})
         elif last_field == "contact":
             if len(value) < 3:
                 return _resp(200, {"reply": "Invalid contact. Please re-enter your name and phone/email.", "session_id": session_id})
@@ -415,12 +469,12 @@ def _handle_chat(event, session_id: str, body: dict):
         draft["last_field"] = ""
         draft["updated_at"] = _now_iso()
         session["draft"] = draft
-        store[session_id] = session
-        _save_store(store)
+        _save_session(session_id, session)
         return _resp(200, {"reply": f"Got it. Please confirm {last_field}: {value} (yes/no)", "session_id": session_id})
 
     # status lookup
-    if re.search(r"\b(my booking|booking details|booking status|what did i book)\b", user_msg.lower()):
+    if "status" in intents:
+        mark_branch("status")
         bookings = session.get("bookings") or []
         if not bookings:
             return _resp(200, {"reply": "No bookings yet. Want to make one?", "session_id": session_id})
@@ -429,54 +483,72 @@ def _handle_chat(event, session_id: str, body: dict):
         return _resp(200, {"reply": summary, "session_id": session_id})
 
     # clinic info lookup
-    if _is_info_request(user_msg):
+    if "info" in intents:
+        mark_branch("info")
         info = _kb_summary(kb)
         return _resp(200, {"reply": info, "session_id": session_id})
 
     # free chat
-    if not _is_booking_related(user_msg) and not draft.get("last_field") and not draft.get("awaiting_confirmation") and not _is_confirm_intent(user_msg):
+    if "booking" not in intents and not draft.get("last_field") and not draft.get("awaiting_confirmation") and "confirm" not in intents:
+        mark_branch("free_chat")
         free_prompt = (
             "You are a helpful assistant. Answer the user's question. "
             "If they ask about the clinic or booking data, use the provided JSON.\n"
             "Be concise and clear."
         )
-        resp = client.chat.completions.create(
-            model="gpt-4o-mini",
-            temperature=0.3,
-            messages=[
-                {"role": "system", "content": free_prompt},
-                {"role": "user", "content": json.dumps({"user_message": user_msg, "clinic_kb": kb, "current_booking": draft})},
-            ],
-        )
+        with llm_call("free_chat"), span("llm.chat", call="free_chat"):
+            resp = _openai().chat.completions.create(
+                model="gpt-4o-mini",
+                temperature=0.3,
+                messages=[
+                    {"role": "system", "content": free_prompt},
+                    {"role": "user", "content": json.dumps({"user_message": user_msg, "clinic_kb": kb, "current_booking": draft})},
+                ],
+            )
+        record_usage("free_chat", resp.usage)
         reply = resp.choices[0].message.content or "Sorry, I do not have that."
-        session["history"].append({"at": _now_iso(), "user": user_msg, "assistant": reply})
-        store[session_id] = session
-        _save_store(store)
+        _record_turn(session, user_msg, reply)
+        _save_session(session_id, session)
         return _resp(200, {"reply": reply, "session_id": session_id})
 
     # final confirmation
     if not _missing_fields(draft) and not draft.get("awaiting_confirmation"):
+        mark_branch("confirm_prompt")
         draft["awaiting_confirmation"] = True
         draft["confirmation_summary"] = _format_booking(draft)
         session["draft"] = draft
-        store[session_id] = session
-        _save_store(store)
+        _save_session(session_id, session)
         return _resp(200, {"reply": "Please confirm your booking details (yes/no):\n" + draft["confirmation_summary"], "session_id": session_id})
 
     if draft.get("details") and not draft.get("awaiting_confirmation"):
         missing = _missing_fields(draft)
         draft["missing_fields"] = missing
         if missing:
+            mark_branch("next_question")
             draft["last_field"] = missing[0]
             session["draft"] = draft
-            store[session_id] = session
-            _save_store(store)
-            return _resp(200, {"reply": _question_for(missing[0], kb), "session_id": session_id})
+            _save_session(session_id, session)
+            return _resp(200, {"reply": _question_for(missing[0], kb, draft.get("details")), "session_id": session_id})
+
+    # fields parsed locally; ask for the rest one at a time
+    slots = extract_slots(user_msg, kb, AVAILABILITY)
+    if slots:
+        mark_branch("slot_capture")
+        _merge_slots(draft, slots)
+        draft["updated_at"] = _now_iso()
+        missing = _missing_fields(draft)
+        draft["missing_fields"] = missing
+        if missing:
+            draft["last_field"] = missing[0]
+            session["draft"] = draft
+            _save_session(session_id, session)
+            return _resp(200, {"reply": "Got it. " + _question_for(missing[0], kb, draft.get("details")), "session_id": session_id})
 
+    mark_branch("fallback_question")
     return _resp(200, {"reply": "What service would you like to book?", "session_id": session_id})
 
 
-def lambda_handler(event, context):
+def _route(event):
     method = event.get("requestContext", {}).get("http", {}).get("method", "")
     path = event.get("requestContext", {}).get("http", {}).get("path", "")
     if method == "OPTIONS":
@@ -487,24 +559,49 @@ def lambda_handler(event, context):
     session_id = query.get("session_id") or headers.get("x-session-id")
 
     if method == "GET" and path == "/clinic/info":
-        return _resp(200, {"clinic": CLINIC_KB})
+        cache = {"ETag": CLINIC_INFO_ETAG, "Cache-Control": CLINIC_INFO_CACHE_CONTROL}
+        if etag_matches(headers.get("if-none-match"), CLINIC_INFO_ETAG):
+            return _resp(304, None, cache)
+        return _resp(200, CLINIC_INFO_BODY, cache)
+
+    if method == "GET" and path == "/availability":
+        STORE.refresh()
+        try:
+            return _resp(200, _availability().search(
+                query.get("service") or "", query.get("location"), query.get("date_from"), query.get("date_to")
+            ))
+        except ValueError as e:
+            return _resp(400, {"error": str(e)})
+
+    if method == "GET" and path == "/store/stats":
+        return _resp(200, {"unit_of_work": WRITE_STATS.snapshot(), "availability": AVAILABILITY.stats(), "gc": SWEEPER.stats()})
 
     if method == "GET" and path == "/bookings":
         if not session_id:
             return _resp(400, {"error": "session_id is required"})
-        store = _load_store()
-        session = store.get(session_id) or {"draft": _new_draft(), "bookings": [], "history": []}
-        return _resp(200, {"bookings": session.get("bookings") or []})
+        try:
+            limit = int(query["limit"]) if query.get("limit") else None
+        except ValueError:
+            return _resp(400, {"error": "invalid limit"})
+        cursor = query.get("cursor")
+        # Answer from the session version alone when the client is current.
+        etag = bookings_etag(session_id, STORE.version(session_id), limit, cursor)
+        cache = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if etag_matches(headers.get("if-none-match"), etag):
+            return _resp(304, None, cache)
+        try:
+            page, next_cursor = page_bookings(STORE.list_bookings(session_id), limit, cursor)
+        except InvalidCursor as e:
+            return _resp(400, {"error": str(e)})
+        return _resp(200, {"bookings": page, "next_cursor": next_cursor}, cache)
 
     if path.startswith("/bookings/") and method == "GET":
         if not session_id:
             return _resp(400, {"error": "session_id is required"})
         booking_id = path.split("/bookings/")[1]
-        store = _load_store()
-        session = store.get(session_id) or {"draft": _new_draft(), "bookings": [], "history": []}
-        for b in session.get("bookings") or []:
-            if b.get("id") == booking_id:
-                return _resp(200, {"booking": b})
+        b = STORE.get_booking(session_id, booking_id)
+        if b:
+            return _resp(200, {"booking": b})
         return _resp(404, {"error": "booking not found"})
 
     if path.startswith("/bookings/") and method == "PATCH":
@@ -514,75 +611,73 @@ def lambda_handler(event, context):
         body = event.get("body") or "{}"
         if isinstance(body, str):
             body = json.loads(body)
-        store = _load_store()
-        session = store.get(session_id)
-        if not session:
-            return _resp(404, {"error": "session not found"})
-        bookings = session.get("bookings") or []
+        b = STORE.get_booking(session_id, booking_id)
+        if not b:
+            if not STORE.exists(session_id):
+                return _resp(404, {"error": "session not found"})
+            return _resp(404, {"error": "booking not found"})
         updates = body.get("details") or {}
-        for b in bookings:
-            if b.get("id") == booking_id:
-                details = b.get("details") or {}
-                if "service" in updates and str(updates["service"]).strip():
-                    match = _find_service(str(updates["service"]), CLINIC_KB)
-                    if not match:
-                        return _resp(400, {"error": "invalid service"})
-                    details["service"] = match
-                if "location" in updates and str(updates["location"]).strip():
-                    match = _find_location(str(updates["location"]), CLINIC_KB)
-                    if not match:
-                        return _resp(400, {"error": "invalid location"})
-                    details["location"] = match
-                if "date" in updates and str(updates["date"]).strip():
-                    if not _valid_date(str(updates["date"])):
-                        return _resp(400, {"error": "invalid date"})
-                    details["date"] = str(updates["date"]).strip()
-                if "time" in updates and str(updates["time"]).strip():
-                    time_text = _extract_time_text(str(updates["time"]))
-                    if not time_text:
-                        return _resp(400, {"error": "invalid time"})
-                    loc = details.get("location", "")
-                    if loc and not _is_time_within_hours(time_text, loc, CLINIC_KB):
-                        return _resp(400, {"error": "time outside hours"})
-                    details["time"] = time_text
-                if "contact" in updates and str(updates["contact"]).strip():
-                    if len(str(updates["contact"]).strip()) < 3:
-                        return _resp(400, {"error": "invalid contact"})
-                    details["contact"] = str(updates["contact"]).strip()
-                b["details"] = details
-                b["updated_at"] = _now_iso()
-                store[session_id] = session
-                _save_store(store)
-                return _resp(200, {"ok": True, "booking": b})
-        return _resp(404, {"error": "booking not found"})
+        details = b.get("details") or {}
+        if "service" in updates and str(updates["service"]).strip():
+            match = _find_service(str(updates["service"]), CLINIC_KB)
+            if not match:
+                return _resp(400, {"error": "invalid service"})
+            details["service"] = match
+        if "location" in updates and str(updates["location"]).strip():
+            match = _find_location(str(updates["location"]), CLINIC_KB)
+            if not match:
+                return _resp(400, {"error": "invalid location"})
+            details["location"] = match
+        if "date" in updates and str(updates["date"]).strip():
+            iso, error = _normalize_date(str(updates["date"]), CLINIC_KB)
+            if error:
+                if parse_date(str(updates["date"])) is None:
+                    return _resp(400, {"error": "invalid date"})
+                return _resp(400, {"error": "date outside booking window"})
+            details["date"] = iso
+        if "time" in updates and str(updates["time"]).strip():
+            time_text = extract_time_text(str(updates["time"]))
+            if not time_text:
+                return _resp(400, {"error": "invalid time"})
+            loc = details.get("location", "")
+            if loc and not is_time_within_hours(time_text, details, CLINIC_KB, AVAILABILITY):
+                return _resp(400, {"error": "time outside hours"})
+            details["time"] = time_text
+        if "contact" in updates and str(updates["contact"]).strip():
+            if len(str(updates["contact"]).strip()) < 3:
+                return _resp(400, {"error": "invalid contact"})
+            details["contact"] = str(updates["contact"]).strip()
+        STORE.refresh()
+        if _availability().reserve(session_id, {**b, "details": details}):
+            return _resp(409, {"error": "slot unavailable"})
+        b["details"] = details
+        b["updated_at"] = _now_iso()
+        try:
+            stored = STORE.put_booking(session_id, b)
+        except SlotTaken as e:
+            _resync_availability(session_id, e.holder)
+            return _resp(409, {"error": "slot unavailable"})
+        if not stored:
+            # The booking went away after the claim; give back what it took.
+            _resync_availability(session_id)
+            return _resp(404, {"error": "booking not found"})
+        return _resp(200, {"ok": True, "booking": b})
 
     if path.startswith("/bookings/") and method == "DELETE":
         if not session_id:
             return _resp(400, {"error": "session_id is required"})
         booking_id = path.split("/bookings/")[1]
-        store = _load_store()
-        session = store.get(session_id)
-        if not session:
-            return _resp(404, {"error": "session not found"})
-        bookings = session.get("bookings") or []
-        new_bookings = [b for b in bookings if b.get("id") != booking_id]
-        if len(new_bookings) == len(bookings):
+        if not STORE.delete_booking(session_id, booking_id):
+            if not STORE.exists(session_id):
+                return _resp(404, {"error": "session not found"})
             return _resp(404, {"error": "booking not found"})
-        session["bookings"] = new_bookings
-        store[session_id] = session
-        _save_store(store)
         return _resp(200, {"ok": True})
 
     if method == "POST" and path == "/history/clear":
         if not session_id:
             return _resp(400, {"error": "session_id is required"})
-        store = _load_store()
-        session = store.get(session_id)
-        if not session:
+        if not STORE.clear_history(session_id):
             return _resp(404, {"error": "session not found"})
-        session["history"] = []
-        store[session_id] = session
-        _save_store(store)
         return _resp(200, {"ok": True})
 
     if method == "POST" and path == "/chat":
@@ -590,6 +685,34 @@ def lambda_handler(event, context):
         if isinstance(body, str):
             body = json.loads(body)
         sid = body.get("session_id") or session_id or str(uuid4())
-        return _handle_chat(event, sid, body)
+        set_session(sid)
+        turn = None
+        try:
+            with chat_turn() as turn:
+                try:
+                    with unit_of_work(STORE) as uow:
+                        resp = _handle_chat(event, sid, body)
+                    uow.flush()
+                except (VersionConflict, SlotTaken) as e:
+                    _resync_availability(sid, getattr(e, "holder", None))
+                    mark_branch("conflict")
+                    resp = _resp(409, {"error": "session was updated concurrently, please retry", "session_id": sid})
+        finally:
+            # CloudWatch turns this log line into metrics (Embedded Metric
+            # Format); failed turns are logged too, under their branch.
+            if turn is not None:
+                print(turn.emf(METRICS_NAMESPACE))
+        _sweep()
+        return resp
 
     return _resp(404, {"error": "not found"})
+
+
+def lambda_handler(event, context):
+    http = event.get("requestContext", {}).get("http", {})
+    headers = {k.lower(): v for k, v in (event.get("headers") or {}).items()}
+    with TRACER.trace(f"{http.get('method', '')} {http.get('path', '')}", headers.get("x-session-id")) as trace:
+        resp = _route(event)
+        trace.status = resp.get("statusCode")
+    resp["headers"]["X-Trace-Id"] = trace.trace_id
+    return resp
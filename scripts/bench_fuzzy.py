@@ -0,0 +1,114 @@
+"""Benchmark the indexed fuzzy matcher against the original SequenceMatcher scan.
+
+Usage:
+    python scripts/bench_fuzzy.py [--sizes 4 100 500] [--queries 2000]
+
+For each catalogue size it checks that both implementations return the
+same answer for every query, then reports the mean time per lookup.
+"""
+import argparse
+import json
+import random
+import string
+import sys
+import time
+from difflib import SequenceMatcher
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+from fuzzy import FuzzyIndex  # noqa: E402
+
+WORDS = [
+    "general", "consultation", "dental", "cleaning", "physiotherapy", "vaccination", "screening",
+    "orchard", "raffles", "place", "tampines", "jurong", "east", "west", "health", "check",
+    "eye", "skin", "women", "child", "sports", "massage", "xray", "blood", "test", "review",
+]
+
+
+def scan_match(value: str, options, threshold: float = 0.78):
+    best = None
+    best_score = 0.0
+    for opt in options:
+        score = SequenceMatcher(None, value.lower(), opt.lower()).ratio()
+        if score > best_score:
+            best_score = score
+            best = opt
+    if best_score >= threshold:
+        return best
+    return None
+
+
+def typo(text: str, rng: random.Random) -> str:
+    chars = list(text)
+    for _ in range(rng.randint(0, 2)):
+        i = rng.randrange(len(chars))
+        op = rng.choice("dsi")
+        if op == "d" and len(chars) > 1:
+            del chars[i]
+        elif op == "s":
+            chars[i] = rng.choice(string.ascii_lowercase)
+        else:
+            chars.insert(i, rng.choice(string.ascii_lowercase))
+    return "".join(chars)
+
+
+def catalogue(size: int, rng: random.Random) -> list[str]:
+    kb = json.loads((BACKEND_DIR / "clinic_kb.json").read_text(encoding="utf-8"))
+    names = [s["name"] for s in kb["services"]] + [l["name"] for l in kb["locations"]]
+    seen = set(names)
+    while len(names) < size:
+        name = " ".join(w.capitalize() for w in rng.sample(WORDS, rng.randint(1, 3)))
+        if name not in seen:
+            seen.add(name)
+            names.append(name)
+    return names[:size]
+
+
+def queries(options: list[str], count: int, rng: random.Random) -> list[str]:
+    out = []
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.6:
+            out.append(typo(rng.choice(options).lower(), rng))
+        elif kind < 0.8:
+            out.append(" ".join(rng.sample(WORDS, rng.randint(1, 2))))
+        else:
+            # free-text chat messages, as passed by _extract_service_from_text
+            out.append(f"hi, can I book a {rng.choice(options).lower()} for next week at 3pm please?")
+    return out
+
+
+def timed(fn, qs) -> float:
+    start = time.perf_counter()
+    for q in qs:
+        fn(q)
+    return (time.perf_counter() - start) / len(qs)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[7, 100, 300, 1000])
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'options':>8} {'scan us':>10} {'index us':>10} {'speedup':>8}")
+    for size in args.sizes:
+        options = catalogue(size, rng)
+        qs = queries(options, args.queries, rng)
+        index = FuzzyIndex(options)
+        for q in qs:
+            expected = scan_match(q, options)
+            got = index.best(q)
+            if expected != got:
+                raise SystemExit(f"mismatch for {q!r}: scan={expected!r} index={got!r}")
+        scan = timed(lambda q: scan_match(q, options), qs)
+        fast = timed(index.best, qs)
+        print(f"{size:>8} {scan * 1e6:>10.1f} {fast * 1e6:>10.1f} {scan / fast:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
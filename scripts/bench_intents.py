@@ -0,0 +1,65 @@
+"""Micro-benchmark: single-pass intent classifier vs. one regex per intent.
+
+Usage:
+    python scripts/bench_intents.py [--messages 20000]
+
+Checks both approaches agree on every message, then reports throughput in
+messages per second.
+"""
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from intents import INTENT_KEYWORDS, classify  # noqa: E402
+
+SAMPLES = [
+    "yes", "no", "ok sure", "not correct", "looks good to me", "hi there", "what are your opening hours?",
+    "I want to book a dental cleaning", "can I reschedule my booking", "what did i book last week",
+    "booking status please", "How much is the price for vaccination", "tell me a joke",
+    "change the time to 3pm", "okay, confirmed!", "Which locations do you have near Orchard?",
+    "i'd like an appointment tomorrow morning, is that ok", "wrong date, edit it", "nope",
+    "please show me the service list and clinic information", "bookings", "Thanks, that's all",
+]
+
+
+def per_intent_regex(text: str) -> frozenset:
+    # How chat() checked intents before: lower() and re.search per intent.
+    found = set()
+    for intent, kws in INTENT_KEYWORDS.items():
+        if re.search(r"\b(" + "|".join(kws) + r")\b", text.lower()) is not None:
+            found.add(intent)
+    return frozenset(found)
+
+
+def rate(fn, messages) -> float:
+    start = time.perf_counter()
+    for m in messages:
+        fn(m)
+    return len(messages) / (time.perf_counter() - start)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    messages = [rng.choice(SAMPLES) for _ in range(args.messages)]
+    for m in SAMPLES:
+        if per_intent_regex(m) != classify(m):
+            raise SystemExit(f"mismatch for {m!r}: {sorted(per_intent_regex(m))} vs {sorted(classify(m))}")
+
+    before = rate(per_intent_regex, messages)
+    after = rate(classify, messages)
+    print(f"per-intent regex: {before:>10,.0f} msg/s")
+    print(f"single pass:      {after:>10,.0f} msg/s  ({after / before:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
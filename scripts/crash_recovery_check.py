@@ -0,0 +1,128 @@
+"""Crash-recovery check for the booking store durability levels.
+
+Usage:
+    python scripts/crash_recovery_check.py [--engines log sqlite] [--rounds 3]
+
+For each engine and durability level a child process runs several writer
+threads, each bumping a counter in its own session and printing an ack line
+once ``put`` has returned. The parent kills the child at a random moment
+(no clean shutdown), reopens the store and checks that:
+
+* the store still opens and every session parses;
+* with ``sync`` and ``group`` no acknowledged write is missing;
+* with ``async`` nothing newer than the last write exists (lost writes
+  are reported, not failed).
+
+Killing a process leaves the OS page cache intact, so this exercises the
+write path and log repair; it cannot show what fsync buys on power loss.
+"""
+import argparse
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+from session_store import open_store  # noqa: E402
+
+DURABILITY = ("sync", "group", "async")
+
+
+def child(args) -> None:
+    store = open_store(Path(args.dir) / "booking_store.json", args.engine, args.durability)
+    out_lock = threading.Lock()
+
+    def writer(n: int) -> None:
+        sid = f"w{n}"
+        count = 0
+        while True:
+            count += 1
+            store.put(sid, {"count": count, "draft": {}, "bookings": [], "history": [{"n": count}]})
+            with out_lock:
+                sys.stdout.write(f"{sid} {count}\n")
+                sys.stdout.flush()
+
+    for n in range(args.writers):
+        threading.Thread(target=writer, args=(n,), daemon=True).start()
+    while True:
+        time.sleep(1)
+
+
+def run_round(engine: str, durability: str, writers: int, rng: random.Random) -> tuple[bool, str]:
+    workdir = Path(tempfile.mkdtemp(prefix="store-crash-"))
+    try:
+        proc = subprocess.Popen(
+            [sys.executable, __file__, "--child", "--engine", engine, "--durability", durability,
+             "--dir", str(workdir), "--writers", str(writers)],
+            stdout=subprocess.PIPE,
+            text=True,
+        )
+        acked: dict[str, int] = {}
+        reader = threading.Thread(target=_collect, args=(proc.stdout, acked), daemon=True)
+        reader.start()
+        time.sleep(rng.uniform(0.3, 1.2))
+        proc.kill()
+        proc.wait()
+        reader.join()
+
+        store = open_store(workdir / "booking_store.json", engine, "sync")
+        stored = {sid: s["count"] for sid, s in store.load_all().items()}
+        store.close()
+        problems, lost = [], 0
+        for sid, count in acked.items():
+            got = stored.get(sid, 0)
+            if got < count:
+                lost += count - got
+                if durability != "async":
+                    problems.append(f"{sid}: acked {count}, recovered {got}")
+            if got > count + 1:
+                problems.append(f"{sid}: recovered {got}, only {count} acked")
+        detail = f"acked={sum(acked.values()):>6} lost={lost:>4}"
+        return not problems, detail + ("  " + "; ".join(problems[:3]) if problems else "")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _collect(stream, acked: dict) -> None:
+    for line in stream:
+        parts = line.split()
+        if len(parts) == 2:
+            acked[parts[0]] = int(parts[1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--engines", nargs="+", default=["log", "sqlite"])
+    parser.add_argument("--durability", nargs="+", default=list(DURABILITY))
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--engine", help=argparse.SUPPRESS)
+    parser.add_argument("--dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        args.durability = args.durability[0]
+        child(args)
+        return
+
+    rng = random.Random(args.seed)
+    failed = False
+    for engine in args.engines:
+        for durability in args.durability:
+            for i in range(args.rounds):
+                ok, detail = run_round(engine, durability, args.writers, rng)
+                failed |= not ok
+                print(f"{engine:>7} {durability:>6} round {i + 1}: {'ok  ' if ok else 'FAIL'} {detail}")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Cold-start profile of the Lambda handler module.
+
+Usage:
+    python scripts/lambda_import_profile.py [--runs 5] [--top 12] [--event /clinic/info]
+
+Each run starts a fresh interpreter with ``-X importtime``, imports
+``lambda_function`` and handles one request that needs no model call
+(``GET /clinic/info`` by default), like a cold container would. Runs
+alternate between lazy client creation (the default) and
+``OPENAI_EAGER_INIT=1``. For each mode the script reports the median
+wall time of the import and of the first request, and whether ``openai``
+was loaded. It also lists the slowest top-level imports by cumulative
+time, taken from the importtime trace.
+
+Run it with the Lambda's dependencies installed (``pip install -r
+lambda-backend/requirements.txt``); absolute numbers depend on the
+machine and the disk cache, so compare modes within one run.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+LAMBDA_DIR = Path(__file__).resolve().parent.parent / "lambda-backend"
+
+CHILD = r"""
+import json, sys, time
+sys.path.insert(0, {lambda_dir!r})
+t0 = time.perf_counter()
+import lambda_function
+t1 = time.perf_counter()
+event = {{"requestContext": {{"http": {{"method": "GET", "path": {path!r}}}}}, "headers": {{}}}}
+lambda_function.lambda_handler(event, None)
+t2 = time.perf_counter()
+print(json.dumps({{"import_ms": (t1 - t0) * 1000, "first_request_ms": (t2 - t1) * 1000,
+                  "openai_loaded": "openai" in sys.modules}}))
+"""
+
+
+def run_once(eager: bool, path: str) -> tuple[dict, list[tuple[int, int, str]]]:
+    env = dict(os.environ)
+    env.setdefault("OPENAI_API_KEY", "sk-profile")
+    env["OPENAI_EAGER_INIT"] = "1" if eager else "0"
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    code = CHILD.format(lambda_dir=str(LAMBDA_DIR), path=path)
+    with tempfile.TemporaryDirectory() as cwd:
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            cwd=cwd, env=env, capture_output=True, text=True, check=True,
+        )
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    return result, _parse_importtime(proc.stderr)
+
+
+def _parse_importtime(stderr: str) -> list[tuple[int, int, str]]:
+    # Lines look like "import time:  1234 |  5678 |   package.sub".
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cum_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((int(cum_us), depth, name.strip()))
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=12)
+    parser.add_argument("--event", default="/clinic/info", help="GET path handled after import")
+    args = parser.parse_args()
+
+    for eager in (False, True):
+        results, trace = [], []
+        for _ in range(args.runs):
+            result, trace = run_once(eager, args.event)
+            results.append(result)
+        imp = statistics.median(r["import_ms"] for r in results)
+        first = statistics.median(r["first_request_ms"] for r in results)
+        print(f"{'eager' if eager else 'lazy':>5}: import {imp:7.1f} ms  first request {first:6.2f} ms  "
+              f"openai loaded: {results[-1]['openai_loaded']}")
+        # Top-level imports (depth 1 under the -c module) from the last run.
+        top = sorted((r for r in trace if r[1] <= 1), reverse=True)[: args.top]
+        for cum_us, _, name in top:
+            print(f"        {cum_us / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,301 @@
+"""End-to-end load test of /chat against a local mock model.
+
+Usage:
+    python scripts/load_test.py [--target app|lambda|both] [--conversations 60]
+                                [--concurrency 8] [--engine log] [--json out.json]
+                                [--latency lognormal:400,0.5] [--tokens-per-s 80]
+                                [--error-rate 0.01] [--timeout-rate 0] [--seed 1]
+
+Starts ``scripts/mock_openai.py`` in a subprocess (the latency, token-rate
+and failure options are passed through to it) and points the OpenAI SDK at
+it with ``OPENAI_BASE_URL``. It then replays scripted multi-turn booking
+conversations, each with its own session and a slot no other conversation
+uses. Conversations alternate between a one-message booking ("physio at
+Orchard on <date> 10:00, <name> <phone>", then yes/yes) and a
+field-by-field one that starts on the model's JSON collect path. At most
+``--concurrency`` conversations run at once; turns within one are sequential.
+
+* ``app``: ``backend/app.py`` in-process through ``httpx.ASGITransport``
+  (no network between client and app), or a running server with ``--url``.
+* ``lambda``: ``lambda_handler`` called from ``--concurrency`` threads, i.e.
+  one warm container taking overlapping requests; real Lambda runs one
+  request per container, so read this as an upper bound on contention.
+
+For each target it reports turn latency p50/p95/p99, throughput, errors,
+model calls, and the bytes handed to the session store per turn (encoded
+session records; the legacy ``json`` engine also rewrites the rest of the
+document on every write). Each target gets a fresh store in a temp dir
+(``--engine`` picks the engine), so the repo's store is never touched.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+BACKEND_DIR = ROOT / "backend"
+LAMBDA_DIR = ROOT / "lambda-backend"
+MOCK = Path(__file__).resolve().parent / "mock_openai.py"
+
+SERVICES = ("General Consultation", "Dental Cleaning", "Physiotherapy", "Vaccination")
+LOCATIONS = ("Raffles Place", "Orchard", "Tampines")
+HORIZON_DAYS = 55
+MOCK_OPTIONS = ("latency", "tokens_per_s", "reply_words", "error_rate", "timeout_rate", "hang_s", "seed")
+
+
+def conversations(count: int) -> list[list[str]]:
+    """Scripted conversations; every one books a different (location, day, hour)."""
+    sys.path.insert(0, str(BACKEND_DIR))
+    from dates import clinic_today
+
+    today = clinic_today()
+    days = [today + timedelta(days=n) for n in range(1, HORIZON_DAYS) if (today + timedelta(days=n)).weekday() < 5]
+    out = []
+    for i in range(count):
+        location = LOCATIONS[i % len(LOCATIONS)]
+        day = days[(i // len(LOCATIONS)) % len(days)]
+        hour = 10 + (i // (len(LOCATIONS) * len(days))) % 7
+        service = SERVICES[i % len(SERVICES)]
+        contact = f"Patient {i} 9{i:07d}"
+        if i % 2 == 0:
+            out.append([
+                f"hi, I'm patient {i}. what can you help me with?",
+                f"{service} at {location} on {day.isoformat()} {hour}:00, {contact}",
+                "yes",
+                "yes",
+                "what are your opening hours?",
+            ])
+        else:
+            out.append([
+                "I need an appointment please",
+                service, "yes",
+                day.isoformat(), "yes",
+                f"{hour}:00", "yes",
+                location, "yes",
+                contact, "yes",
+                "yes",
+            ])
+    return out
+
+
+class StoreMeter:
+    """Counts writes and encoded bytes handed to a store instance."""
+
+    def __init__(self, store):
+        self.writes = 0
+        self.bytes = 0
+        self._lock = threading.Lock()
+        put, write_batch = store.put, store.write_batch
+
+        def metered_put(session_id, session, expected_version=None):
+            self._add(1, len(json.dumps(session, separators=(",", ":"))))
+            return put(session_id, session, expected_version)
+
+        def metered_write_batch(changes):
+            self._add(len(changes), sum(len(raw) for raw in changes.values() if raw))
+            return write_batch(changes)
+
+        store.put = metered_put
+        store.write_batch = metered_write_batch
+
+    def _add(self, writes: int, size: int) -> None:
+        with self._lock:
+            self.writes += writes
+            self.bytes += size
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: list[float] = []
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float, ok: bool) -> None:
+        with self._lock:
+            self.latencies.append(seconds)
+            if not ok:
+                self.errors += 1
+
+
+def percentile(values: list[float], p: float) -> float:
+    # Nearest rank, so p99 of 100 samples is the 99th value.
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(int(-(-p * len(ordered) // 100)) - 1, 0)]
+
+
+def start_mock(args) -> tuple[subprocess.Popen, str]:
+    cmd = [sys.executable, str(MOCK), "--port", "0"]
+    for name in MOCK_OPTIONS:
+        value = getattr(args, name)
+        if value is not None:
+            cmd += ["--" + name.replace("_", "-"), str(value)]
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+    line = proc.stdout.readline().strip()
+    if not line:
+        proc.kill()
+        raise SystemExit("mock server did not start")
+    return proc, line.rsplit(" ", 1)[-1]
+
+
+def mock_stats(base_url: str) -> dict:
+    with urllib.request.urlopen(base_url.rsplit("/v1", 1)[0] + "/stats", timeout=5) as r:
+        return json.loads(r.read())
+
+
+def _fresh_store_env(workdir: Path, name: str) -> None:
+    # Read by app.py / lambda_function.py at import time.
+    os.environ["BOOKING_STORE_PATH"] = str(workdir / name / "booking_store.json")
+    (workdir / name).mkdir(parents=True, exist_ok=True)
+
+
+def run_app(scripts: list[list[str]], concurrency: int, workdir: Path, url: str | None) -> tuple[Recorder, StoreMeter | None, float]:
+    import httpx
+
+    meter = None
+    if url:
+        transport, base = None, url.rstrip("/")
+    else:
+        _fresh_store_env(workdir, "app")
+        sys.path.insert(0, str(BACKEND_DIR))
+        import app
+
+        meter = StoreMeter(app.STORE)
+        transport, base = httpx.ASGITransport(app=app.app, raise_app_exceptions=False), "http://app"
+    rec = Recorder()
+
+    async def main() -> None:
+        sem = asyncio.Semaphore(concurrency)
+        async with httpx.AsyncClient(transport=transport, base_url=base, timeout=120.0) as http:
+            async def one(i: int, script: list[str]) -> None:
+                async with sem:
+                    for message in script:
+                        started = time.perf_counter()
+                        try:
+                            r = await http.post("/chat", json={"message": message, "session_id": f"load-app-{i}"})
+                            ok = r.status_code == 200 and "reply" in r.json()
+                        except Exception:
+                            ok = False
+                        rec.add(time.perf_counter() - started, ok)
+
+            await asyncio.gather(*(one(i, s) for i, s in enumerate(scripts)))
+
+    started = time.perf_counter()
+    asyncio.run(main())
+    return rec, meter, time.perf_counter() - started
+
+
+def run_lambda(scripts: list[list[str]], concurrency: int, workdir: Path) -> tuple[Recorder, StoreMeter, float]:
+    _fresh_store_env(workdir, "lambda")
+    sys.path.insert(0, str(LAMBDA_DIR))
+    import lambda_function
+
+    meter = StoreMeter(lambda_function.STORE)
+    rec = Recorder()
+
+    def one(i: int, script: list[str]) -> None:
+        for message in script:
+            event = {
+                "requestContext": {"http": {"method": "POST", "path": "/chat"}},
+                "headers": {"content-type": "application/json"},
+                "body": json.dumps({"message": message, "session_id": f"load-lambda-{i}"}),
+            }
+            started = time.perf_counter()
+            try:
+                resp = lambda_function.lambda_handler(event, None)
+                ok = resp.get("statusCode") == 200
+            except Exception:
+                ok = False
+            rec.add(time.perf_counter() - started, ok)
+
+    started = time.perf_counter()
+    # The handler logs one EMF metrics line per chat turn.
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for f in [pool.submit(one, i, s) for i, s in enumerate(scripts)]:
+                f.result()
+    return rec, meter, time.perf_counter() - started
+
+
+def summarize(target: str, rec: Recorder, meter: StoreMeter | None, wall: float, model: dict) -> dict:
+    turns = len(rec.latencies)
+    return {
+        "target": target,
+        "turns": turns,
+        "errors": rec.errors,
+        "p50_ms": round(percentile(rec.latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(rec.latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(rec.latencies, 99) * 1000, 1),
+        "turns_per_s": round(turns / wall, 1) if wall else 0.0,
+        "model_calls": model["requests"],
+        "model_json_calls": model["json_mode"],
+        "model_errors": model["errors"],
+        "model_timeouts": model["timeouts"],
+        "store_writes": meter.writes if meter else None,
+        "store_bytes_per_turn": round(meter.bytes / turns) if meter and turns else None,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=("app", "lambda", "both"), default="both")
+    parser.add_argument("--conversations", type=int, default=60)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--engine", help="BOOKING_STORE_ENGINE for the fresh stores")
+    parser.add_argument("--url", help="benchmark a running backend instead of the in-process app")
+    parser.add_argument("--json", help="also write the results to this file")
+    mock = parser.add_argument_group("mock model (see scripts/mock_openai.py)")
+    mock.add_argument("--latency", default="lognormal:400,0.5")
+    mock.add_argument("--tokens-per-s", type=float)
+    mock.add_argument("--reply-words", type=int)
+    mock.add_argument("--error-rate", type=float)
+    mock.add_argument("--timeout-rate", type=float)
+    mock.add_argument("--hang-s", type=float)
+    mock.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    proc, base_url = start_mock(args)
+    os.environ["OPENAI_BASE_URL"] = base_url
+    os.environ.setdefault("OPENAI_API_KEY", "sk-mock")
+    if args.engine:
+        os.environ["BOOKING_STORE_ENGINE"] = args.engine
+    scripts = conversations(args.conversations)
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            workdir = Path(tmp)
+            for target in (("app", "lambda") if args.target == "both" else (args.target,)):
+                before = mock_stats(base_url)
+                if target == "app":
+                    rec, meter, wall = run_app(scripts, args.concurrency, workdir, args.url)
+                else:
+                    rec, meter, wall = run_lambda(scripts, args.concurrency, workdir)
+                after = mock_stats(base_url)
+                model = {k: after[k] - before[k] for k in after}
+                results.append(summarize(target, rec, meter, wall, model))
+    finally:
+        proc.terminate()
+        proc.wait()
+
+    print(f"{len(scripts)} conversations, concurrency {args.concurrency}, model latency {args.latency}")
+    header = ("target", "turns", "errors", "p50_ms", "p95_ms", "p99_ms", "turns_per_s", "model_calls", "store_bytes_per_turn")
+    print("  ".join(f"{h:>20}" if i == len(header) - 1 else f"{h:>11}" for i, h in enumerate(header)))
+    for r in results:
+        print("  ".join(f"{str(r[h]):>20}" if i == len(header) - 1 else f"{str(r[h]):>11}" for i, h in enumerate(header)))
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
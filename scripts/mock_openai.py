@@ -0,0 +1,234 @@
+"""Local stand-in for the OpenAI chat completions endpoint.
+
+Usage:
+    python scripts/mock_openai.py [--port 8100] [--latency lognormal:400,0.5]
+                                  [--tokens-per-s 80] [--error-rate 0.01]
+                                  [--timeout-rate 0.005] [--hang-s 20]
+
+Serves ``POST /v1/chat/completions`` (plain and ``stream=true``) so the
+backend and the Lambda can be benchmarked without API calls: point them at
+it with ``OPENAI_BASE_URL=http://127.0.0.1:8100/v1``. Each call waits for
+a time drawn from ``--latency`` (time to first token), then emits the reply
+at ``--tokens-per-s``. Requests whose system prompt asks for a JSON object
+(the booking collect path) get a JSON-mode reply; the rest get prose.
+
+``--error-rate`` answers that fraction of calls with HTTP 500 and
+``--timeout-rate`` holds the connection for ``--hang-s`` seconds and then
+drops it without a response. ``GET /stats`` returns call counters.
+
+Latency specs: ``fixed:MS``, ``uniform:LO_MS,HI_MS``, ``normal:MEAN_MS,SD_MS``
+or ``lognormal:MEDIAN_MS,SIGMA``.
+"""
+import argparse
+import json
+import math
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = (
+    "sure happy to help our clinic offers consultations dental cleaning physiotherapy and vaccinations "
+    "at three locations you can book any weekday or saturday morning just tell me what suits you"
+).split()
+
+
+def parse_latency(spec: str):
+    """Return ``fn(rng) -> seconds`` for a latency spec (see module docstring)."""
+    kind, _, args = spec.partition(":")
+    try:
+        values = [float(v) for v in args.split(",")] if args else []
+        if kind == "fixed" and len(values) == 1:
+            return lambda rng: values[0] / 1000
+        if kind == "uniform" and len(values) == 2:
+            return lambda rng: rng.uniform(values[0], values[1]) / 1000
+        if kind == "normal" and len(values) == 2:
+            return lambda rng: max(rng.gauss(values[0], values[1]), 0.0) / 1000
+        if kind == "lognormal" and len(values) == 2:
+            mu = math.log(values[0])
+            return lambda rng: rng.lognormvariate(mu, values[1]) / 1000
+    except ValueError:
+        pass
+    raise ValueError(f"bad latency spec: {spec!r}")
+
+
+class MockState:
+    def __init__(self, args: argparse.Namespace):
+        self.latency = parse_latency(args.latency)
+        self.tokens_per_s = args.tokens_per_s
+        self.reply_words = args.reply_words
+        self.error_rate = args.error_rate
+        self.timeout_rate = args.timeout_rate
+        self.hang_s = args.hang_s
+        self._rng = random.Random(args.seed)
+        self._lock = threading.Lock()
+        self.counts = {"requests": 0, "json_mode": 0, "streamed": 0, "errors": 0, "timeouts": 0, "prompt_bytes": 0}
+
+    def draw(self) -> tuple[str, float]:
+        # One lock-protected draw per call keeps a seeded run reproducible
+        # in aggregate whatever the thread interleaving.
+        with self._lock:
+            roll = self._rng.random()
+            delay = self.latency(self._rng)
+        if roll < self.error_rate:
+            return "error", delay
+        if roll < self.error_rate + self.timeout_rate:
+            return "timeout", delay
+        return "ok", delay
+
+    def count(self, **increments) -> None:
+        with self._lock:
+            for key, n in increments.items():
+                self.counts[key] += n
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return dict(self.counts)
+
+
+def _wants_json(body: dict) -> bool:
+    if (body.get("response_format") or {}).get("type") == "json_object":
+        return True
+    # The collect prompt demands "a single JSON object"; free chat only
+    # mentions the JSON context it is given.
+    system = next((m.get("content") or "" for m in body.get("messages") or [] if m.get("role") == "system"), "")
+    return "JSON object" in system
+
+
+def _reply_text(body: dict, words: int) -> str:
+    if _wants_json(body):
+        return json.dumps({
+            "intent": "collect",
+            "reply": "Sure. Which service would you like to book?",
+            "booking_type": "appointment",
+            "details": {},
+            "missing_fields": [],
+            "is_complete": False,
+            "confirmation_summary": "",
+        })
+    return " ".join(WORDS[i % len(WORDS)] for i in range(words)).capitalize() + "."
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "MockOpenAI/1.0"
+    state: MockState
+
+    def log_message(self, format, *args):
+        pass
+
+    def _json(self, status: int, payload: dict) -> None:
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/stats":
+            return self._json(200, self.state.snapshot())
+        self._json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        raw = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if self.path.rstrip("/") not in ("/v1/chat/completions", "/chat/completions"):
+            return self._json(404, {"error": {"message": "not found"}})
+        body = json.loads(raw or b"{}")
+        state = self.state
+        outcome, delay = state.draw()
+        state.count(requests=1, prompt_bytes=len(raw), json_mode=int(_wants_json(body)), streamed=int(bool(body.get("stream"))))
+        if outcome == "timeout":
+            state.count(timeouts=1)
+            time.sleep(state.hang_s)
+            self.close_connection = True
+            return
+        time.sleep(delay)
+        if outcome == "error":
+            state.count(errors=1)
+            return self._json(500, {"error": {"message": "injected failure", "type": "server_error"}})
+
+        text = _reply_text(body, state.reply_words)
+        tokens = text.split(" ")
+        per_token = 1.0 / state.tokens_per_s if state.tokens_per_s > 0 else 0.0
+        base = {"id": f"chatcmpl-mock-{time.monotonic_ns()}", "created": int(time.time()), "model": body.get("model") or "mock"}
+        # Roughly four bytes per token, like the real tokenizer on English.
+        prompt_tokens = len(raw) // 4
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens), "total_tokens": prompt_tokens + len(tokens)}
+        if body.get("stream"):
+            include_usage = (body.get("stream_options") or {}).get("include_usage")
+            return self._stream(base, tokens, per_token, usage if include_usage else None)
+        time.sleep(per_token * len(tokens))
+        self._json(200, {
+            **base,
+            "object": "chat.completion",
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": usage,
+        })
+
+    def _stream(self, base: dict, tokens: list[str], per_token: float, usage: dict | None = None) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def event(delta: dict, finish: str | None = None) -> None:
+            chunk = {**base, "object": "chat.completion.chunk", "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        for i, token in enumerate(tokens):
+            event({"role": "assistant", "content": token} if i == 0 else {"content": " " + token})
+            time.sleep(per_token)
+        event({}, "stop")
+        if usage is not None:
+            chunk = {**base, "object": "chat.completion.chunk", "choices": [], "usage": usage}
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100, help="0 picks a free port")
+    parser.add_argument("--latency", default="lognormal:400,0.5", help="time to first token")
+    parser.add_argument("--tokens-per-s", type=float, default=80.0, help="0 sends the reply at once")
+    parser.add_argument("--reply-words", type=int, default=40)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--timeout-rate", type=float, default=0.0)
+    parser.add_argument("--hang-s", type=float, default=20.0)
+    parser.add_argument("--seed", type=int, default=None)
+    return parser
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Benchmarks open many connections at once.
+    request_queue_size = 256
+
+
+def serve(args: argparse.Namespace) -> MockServer:
+    handler = type("BoundHandler", (Handler,), {"state": MockState(args)})
+    return MockServer((args.host, args.port), handler)
+
+
+def main() -> None:
+    args = build_parser().parse_args()
+    server = serve(args)
+    host, port = server.server_address[:2]
+    # load_test.py reads this line to find the port.
+    print(f"Mock OpenAI listening on http://{host}:{port}/v1", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    sys.exit(0)
+
+
+if __name__ == "__main__":
+    main()